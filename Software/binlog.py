@@ -0,0 +1,202 @@
+# binlog.py - Compact delta-encoded binary run log
+#
+# Drop-in alternative to RingLogger for run files: the same start/log/poll/
+# flush/stats interface, but records are packed straight into a preallocated
+# bytearray (no string formatting per sample) and most of them cost 5 bytes
+# on flash instead of a ~31 byte CSV line. host/logdecode.py turns a file
+# back into the CSV columns or NumPy arrays.
+#
+# File layout (little-endian):
+#   header  "<4sBBHHHHHH"  magic b"RFLG", version, flags, nominal period (ms),
+#                          four value scales, length of the meta text
+#   meta    run_header() text ("# key: value" lines and the column line)
+#   records key   0xFF, stage u8, t u32 (ms since start), 4 x int16 values
+#           delta dt u8 (ms, 0..254), 4 x int8 value deltas
+# Values are stored as round(value * scale). A key record is written on the
+# first sample, on a stage change, after a gap over 254 ms, when a delta
+# won't fit in int8 and after dropped records; everything else is a delta.
+
+import struct
+import utime
+
+MAGIC = b"RFLG"
+VERSION = 1
+HEADER_FMT = "<4sBBHHHHHH"
+KEY_FMT = "<BBIhhhh"
+KEY = 0xFF          # Marker byte; a delta's dt never reaches it
+KEY_SIZE = 14
+DELTA_SIZE = 5
+MAX_DT = 254
+NAN = -32768        # Stored for NaN (sensor fault); values clamp to +-32767
+SCALES = (10, 10, 10, 10)   # Temp, Setpoint, Output, RampRate: 0.1 resolution like the CSV
+
+class BinaryLogger:
+    EXT = ".rfl"    # Run file extension
+
+    def __init__(self, path, capacity=1024, flush_every=128, flush_ms=2000, decimate=1,
+                 period_ms=10, scales=SCALES, auto_flush=True):
+        self.path = path
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.flush_ms = flush_ms
+        self.decimate = max(1, decimate)
+        self.period_ms = period_ms
+        self.scales = scales
+        self.auto_flush = auto_flush
+
+        # Preallocated storage: encoded records waiting for flash, and the last stored values
+        self.buf = bytearray(capacity)
+        self.mv = memoryview(self.buf)
+        self.used = 0           # Bytes buffered
+        self.count = 0          # Records buffered
+        self.prev = [0, 0, 0, 0]
+        self.q = [0, 0, 0, 0]
+        self.last_t = 0
+        self.need_key = True
+        self.skip = 0
+        self.last_stage = -1
+        self.flush_pending = False
+        self.t0 = utime.ticks_ms()
+        self.last_flush = self.t0
+
+        # Counters
+        self.logged = 0
+        self.keys = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.written = 0        # Bytes on flash, header included
+        self.errors = 0
+
+    def start(self, header=None, path=None):
+        """Begin a new run (in a new file if path is given): truncate, write the header, reset the clock"""
+        if path is not None:
+            self.path = path
+        self.used = 0
+        self.count = 0
+        self.need_key = True
+        self.skip = 0
+        self.last_stage = -1
+        self.flush_pending = False
+        self.t0 = utime.ticks_ms()
+        self.last_flush = self.t0
+        meta = (header or "").encode()
+        s = self.scales
+        try:
+            with open(self.path, "wb") as f:
+                f.write(struct.pack(HEADER_FMT, MAGIC, VERSION, 0, self.period_ms,
+                                    s[0], s[1], s[2], s[3], len(meta)))
+                f.write(meta)
+            self.written = struct.calcsize(HEADER_FMT) + len(meta)
+        except:
+            self.errors += 1
+
+    def log(self, stage, a=0.0, b=0.0, c=0.0, d=0.0, now=None):
+        """Encode one record into the buffer. Returns True if it was kept after decimation."""
+        if now is None:
+            now = utime.ticks_ms()
+        stage_changed = stage != self.last_stage
+        if not stage_changed:
+            self.skip += 1
+            if self.skip < self.decimate:
+                if self.auto_flush:
+                    self.poll(now)
+                return False
+        self.skip = 0
+
+        q = self.q
+        s = self.scales
+        q[0] = _quantize(a, s[0])
+        q[1] = _quantize(b, s[1])
+        q[2] = _quantize(c, s[2])
+        q[3] = _quantize(d, s[3])
+        t = utime.ticks_diff(now, self.t0)
+        dt = t - self.last_t
+        prev = self.prev
+
+        key = self.need_key or stage_changed or dt < 0 or dt > MAX_DT
+        if not key:
+            for i in range(4):
+                if not -128 <= q[i] - prev[i] <= 127:
+                    key = True
+                    break
+
+        size = KEY_SIZE if key else DELTA_SIZE
+        if self.used + size > self.capacity:
+            # Buffer full (flash writes failing or falling behind): drop this record.
+            # The next one that fits restarts the delta chain with a key record.
+            self.dropped += 1
+            self.need_key = True
+            self.flush_pending = True
+            return True
+
+        buf = self.buf
+        n = self.used
+        if key:
+            struct.pack_into(KEY_FMT, buf, n, KEY, stage, t, q[0], q[1], q[2], q[3])
+            self.keys += 1
+            self.need_key = False
+        else:
+            buf[n] = dt
+            buf[n + 1] = (q[0] - prev[0]) & 0xFF
+            buf[n + 2] = (q[1] - prev[1]) & 0xFF
+            buf[n + 3] = (q[2] - prev[2]) & 0xFF
+            buf[n + 4] = (q[3] - prev[3]) & 0xFF
+        self.used = n + size
+        for i in range(4):
+            prev[i] = q[i]
+        self.last_t = t
+        self.count += 1
+        self.logged += 1
+
+        if stage_changed and self.last_stage >= 0:
+            self.flush_pending = True
+        self.last_stage = stage
+        if self.auto_flush:
+            self.poll(now)
+        return True
+
+    def poll(self, now=None):
+        """Flush if the record count, buffer fill or time policy says so"""
+        if self.count == 0:
+            return
+        if now is None:
+            now = utime.ticks_ms()
+        if (self.flush_pending or self.count >= self.flush_every
+                or self.used > self.capacity - 2 * KEY_SIZE
+                or utime.ticks_diff(now, self.last_flush) >= self.flush_ms):
+            self.flush()
+
+    def flush(self):
+        """Append the buffered bytes to flash in one write"""
+        self.last_flush = utime.ticks_ms()
+        self.flush_pending = False
+        if self.used == 0:
+            return
+        try:
+            with open(self.path, "ab") as f:
+                f.write(self.mv[:self.used])
+            self.written += self.used
+            self.flushed += self.count
+            self.used = 0
+            self.count = 0
+        except:
+            # Keep the buffer; it will be retried on the next flush
+            self.errors += 1
+
+    def stats(self):
+        return {
+            "logged": self.logged,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "buffered": self.count,
+            "keys": self.keys,
+            "bytes": self.written,
+            "errors": self.errors,
+        }
+
+def _quantize(v, scale):
+    if v != v:
+        return NAN
+    v = v * scale
+    v = int(v + 0.5) if v >= 0 else int(v - 0.5)
+    return 32767 if v > 32767 else -32767 if v < -32767 else v
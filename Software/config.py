@@ -0,0 +1,42 @@
+# config.py - Tuning values kept on flash as JSON
+#
+# tuning.json is written by AutotuneMode on the device, by host/sysid.py or
+# by host/tune.py, and read once at boot. Missing or unreadable files fall back to the
+# defaults compiled into main.py/modes.py.
+#
+#   {"P": 6.0, "I": 0.3, "D": 15.0, "feedforward": 40.0, "hold_feedforward": 0.28,
+#    "cutoff_k": 7, "compensation": {"Preheat": 0.5, ...}, "source": "autotune"}
+#   host/tune.py may add "max_ramp_rate" (C/s), "window_ms" and "min_on_ms" (SSR).
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+import os
+
+TUNING_FILE = "tuning.json"
+
+def load(path=TUNING_FILE):
+    """Tuning dict from flash, or {} when there is none"""
+    try:
+        with open(path) as f:
+            values = json.load(f)
+        return values if isinstance(values, dict) else {}
+    except:
+        return {}
+
+def save(values, path=TUNING_FILE):
+    """Write via a temp file and rename so a power cut never leaves half a file"""
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(values, f)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Filesystems that won't rename over an existing file
+            os.remove(path)
+            os.rename(tmp, path)
+        return True
+    except:
+        return False
@@ -0,0 +1,206 @@
+# controller.py - Heater output controllers
+#
+# PID runs on the estimator's filtered temperature: derivative on measurement
+# (so setpoint steps don't kick the output), clamped output with conditional
+# integration for anti-windup (frozen while saturated or far from setpoint), and feedforward from the setpoint slope so a
+# ramping stage doesn't have to wait for the integral to catch up.
+# Controller picks bang-bang, proportional or PID per stage and hands over
+# between them without a bump in the output.
+#
+# The *_q methods are the same controllers in the fixed-point units of
+# fixedpoint.py (quarter-degrees, centi-C/s, ms, per-mille output), with the
+# gains pre-scaled to ints when the controller is built.
+
+from fixedpoint import Q, RATE, DUTY
+
+CTRL_OFF  = 0   # Heater off
+CTRL_BANG = 1   # On below target - hysteresis, off at target
+CTRL_PROP = 2   # duty = prop_gain * error
+CTRL_PID  = 3
+
+CTRL_NAMES = ("Off", "Bang", "Prop", "PID")
+
+class PID:
+    def __init__(self, kp, ki, kd, kff=0.0, k_hold=0.0, ambient=25.0, i_band=0.0,
+                 out_min=0.0, out_max=100.0):
+        self.kp = kp            # % per C
+        self.ki = ki            # % per C*s
+        self.kd = kd            # % per C/s
+        self.kff = kff          # % per C/s of setpoint slope
+        self.k_hold = k_hold    # % per C of setpoint above ambient (steady-state losses)
+        self.ambient = ambient
+        self.i_band = i_band    # Only integrate within this many C of the setpoint (0: always)
+        self.out_min = out_min
+        self.out_max = out_max
+        self.scale_fixed()
+        self.reset()
+
+    def scale_fixed(self):
+        """Integer gains for the *_q methods: Q8 per-mille per unit, ki Q16 per quarter-degree ms"""
+        pm = DUTY / 100     # Per mille per %
+        self.kp_f = int(self.kp * pm / Q * 256 + 0.5)
+        self.ki_f = int(self.ki * pm / Q / 1000 * 65536 + 0.5)
+        self.kd_f = int(self.kd * pm / RATE * 256 + 0.5)
+        self.kff_f = int(self.kff * pm / RATE * 256 + 0.5)
+        self.k_hold_f = int(self.k_hold * pm / Q * 256 + 0.5)
+        self.ambient_q = int(self.ambient * Q)
+        self.i_band_q = int(self.i_band * Q)
+        self.out_min_pm = int(self.out_min * pm)
+        self.out_max_pm = int(self.out_max * pm)
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_meas = None
+        self.output = 0.0
+        self.integral_f = 0         # Per mille, Q16
+        self.last_meas_q = None
+        self.output_pm = 0
+
+    def track(self, output, setpoint, measurement, slope=0.0):
+        """Bumpless transfer: preload the integral so the next update continues from output"""
+        i = output - self.kp * (setpoint - measurement) - self.feedforward(setpoint, slope)
+        self.integral = self._clamp_integral(i)
+        self.last_meas = measurement
+        self.output = output
+
+    def _clamp_integral(self, i):
+        # Feedforward may overshoot the need, so the integral is allowed to pull down too
+        span = self.out_max - self.out_min
+        return min(span, max(-span, i))
+
+    def feedforward(self, setpoint, slope):
+        return self.kff * slope + self.k_hold * (setpoint - self.ambient)
+
+    def update(self, setpoint, measurement, dt_s, slope=0.0, rate=None):
+        """Output in out_min..out_max. slope is the setpoint's C/s, rate the measured C/s if known."""
+        error = setpoint - measurement
+        if rate is None:
+            if self.last_meas is not None and dt_s > 0:
+                rate = (measurement - self.last_meas) / dt_s
+            else:
+                rate = 0.0
+        self.last_meas = measurement
+
+        base = self.kp * error - self.kd * rate + self.feedforward(setpoint, slope)
+        integral = self.integral
+        if not self.i_band or -self.i_band <= error <= self.i_band:
+            integral += self.ki * error * dt_s
+        out = base + integral
+        # Anti-windup: stop integrating while saturated in the direction of the error
+        if out > self.out_max:
+            if error > 0:
+                integral = self.integral
+            out = self.out_max
+        elif out < self.out_min:
+            if error < 0:
+                integral = self.integral
+            out = self.out_min
+        self.integral = self._clamp_integral(integral)
+        self.output = out
+        return out
+
+    # ───── Fixed point ─────
+    def _clamp_integral_f(self, i):
+        span = (self.out_max_pm - self.out_min_pm) << 16
+        return span if i > span else -span if i < -span else i
+
+    def feedforward_q(self, setpoint_q, slope_r):
+        """Feedforward in per mille, Q8"""
+        return self.kff_f * slope_r + self.k_hold_f * (setpoint_q - self.ambient_q)
+
+    def track_q(self, output_pm, setpoint_q, measurement_q, slope_r=0):
+        base = self.kp_f * (setpoint_q - measurement_q) + self.feedforward_q(setpoint_q, slope_r)
+        self.integral_f = self._clamp_integral_f((output_pm << 16) - (base << 8))
+        self.last_meas_q = measurement_q
+        self.output_pm = output_pm
+
+    def update_q(self, setpoint_q, measurement_q, dt_ms, slope_r=0, rate_r=None):
+        """update() in integers: quarter-degrees, ms, centi-C/s in; per mille out"""
+        error = setpoint_q - measurement_q
+        if rate_r is None:
+            if self.last_meas_q is not None and dt_ms > 0:
+                rate_r = (measurement_q - self.last_meas_q) * (RATE * 1000 // Q) // dt_ms
+            else:
+                rate_r = 0
+        self.last_meas_q = measurement_q
+        if dt_ms > 1000:
+            dt_ms = 1000    # Long gaps (pauses) would overflow the integral step
+
+        base = (self.kp_f * error - self.kd_f * rate_r + self.feedforward_q(setpoint_q, slope_r)) >> 8
+        integral = self.integral_f
+        if not self.i_band_q or -self.i_band_q <= error <= self.i_band_q:
+            integral += self.ki_f * error * dt_ms
+        out = base + (integral >> 16)
+        if out > self.out_max_pm:
+            if error > 0:
+                integral = self.integral_f
+            out = self.out_max_pm
+        elif out < self.out_min_pm:
+            if error < 0:
+                integral = self.integral_f
+            out = self.out_min_pm
+        self.integral_f = self._clamp_integral_f(integral)
+        self.output_pm = out
+        return out
+
+class Controller:
+    def __init__(self, pid, prop_gain=10.0, hysteresis=2.0):
+        self.pid = pid
+        self.prop_gain = prop_gain
+        self.hysteresis = hysteresis
+        self.mode = CTRL_OFF
+        self.output = 0.0
+        self.prop_f = int(prop_gain * DUTY / 100 / Q * 256 + 0.5)     # Per mille per quarter-degree, Q8
+        self.hysteresis_q = int(hysteresis * Q)
+        self.output_pm = 0
+
+    def select(self, mode, setpoint=0.0, measurement=0.0, slope=0.0):
+        """Switch control mode; entering PID from bang-bang or proportional picks up from the last output"""
+        if mode == CTRL_PID and self.mode != CTRL_PID and self.mode != CTRL_OFF:
+            self.pid.track(self.output, setpoint, measurement, slope)
+        self.mode = mode
+
+    def update(self, setpoint, measurement, dt_s, slope=0.0, rate=None):
+        """Duty in percent for the selected mode"""
+        mode = self.mode
+        if mode == CTRL_PID:
+            out = self.pid.update(setpoint, measurement, dt_s, slope, rate)
+        elif mode == CTRL_PROP:
+            out = min(100.0, max(0.0, (setpoint - measurement) * self.prop_gain))
+        elif mode == CTRL_BANG:
+            if measurement < setpoint - self.hysteresis:
+                out = 100.0
+            elif measurement >= setpoint:
+                out = 0.0
+            else:
+                out = self.output
+        else:
+            out = 0.0
+        self.output = out
+        return out
+
+    def select_q(self, mode, setpoint_q=0, measurement_q=0, slope_r=0):
+        """select() in fixed-point units"""
+        if mode == CTRL_PID and self.mode != CTRL_PID and self.mode != CTRL_OFF:
+            self.pid.track_q(self.output_pm, setpoint_q, measurement_q, slope_r)
+        self.mode = mode
+
+    def update_q(self, setpoint_q, measurement_q, dt_ms, slope_r=0, rate_r=None):
+        """Duty in per mille for the selected mode"""
+        mode = self.mode
+        if mode == CTRL_PID:
+            out = self.pid.update_q(setpoint_q, measurement_q, dt_ms, slope_r, rate_r)
+        elif mode == CTRL_PROP:
+            out = ((setpoint_q - measurement_q) * self.prop_f) >> 8
+            out = DUTY if out > DUTY else 0 if out < 0 else out
+        elif mode == CTRL_BANG:
+            if measurement_q < setpoint_q - self.hysteresis_q:
+                out = DUTY
+            elif measurement_q >= setpoint_q:
+                out = 0
+            else:
+                out = self.output_pm
+        else:
+            out = 0
+        self.output_pm = out
+        return out
@@ -1,26 +1,55 @@
 # display.py
 from machine import Pin, I2C
 from ssd1309 import SSD1309  # Assuming ssd1309.py is uploaded to the Pico
+from screen import Screen, Label, Field, NumberField
 
 class Display:
     def __init__(self, scl_pin=1, sda_pin=0, i2c_addr=0x3C):
         self.i2c = I2C(0, scl=Pin(scl_pin), sda=Pin(sda_pin), freq=400000)
         self.oled = SSD1309(self.i2c, 128, 64)
+        self.screen = None
+        self.defer_show = False     # When set, render() leaves the I2C transfer to the caller
+
+        # Template used by show_temp
+        self.temp_field = NumberField(48, 0, 8, 1, " C")
+        self.setpoint_field = NumberField(80, 20, 5, 0, "C")
+        self.status_field = Field(64, 40, "{}", 8)
+        self.temp_screen = Screen([
+            Label(0, 0, "Temp:"), self.temp_field,
+            Label(0, 20, "Setpoint:"), self.setpoint_field,
+            Label(0, 40, "Status:"), self.status_field,
+        ])
+
+    def use(self, screen):
+        """Switch to a screen template; static parts are drawn only on a switch"""
+        if screen is not self.screen:
+            self.screen = screen
+            screen.attach(self.oled)
+
+    def render(self):
+        """Redraw changed fields of the current screen and push dirty pages"""
+        if self.screen is not None:
+            self.screen.draw(self.oled)
+            if not self.defer_show:
+                self.oled.show()
 
     def clear(self):
+        self.screen = None
         self.oled.fill(0)
         self.oled.show()
 
     def show_startup(self):
+        self.screen = None
         self.oled.fill(0)
         self.oled.text("Reflow Hotplate", 0, 0)
         self.oled.text("Starting...", 0, 16)
         self.oled.show()
 
-    def show_temp(self, temp_c, setpoint):
-        self.oled.fill(0)
-        self.oled.text("Temp: {:.1f} C".format(temp_c), 0, 0)
-        self.oled.text("Setpoint: {}C".format(setpoint), 0, 20)
-        status = "HEATING" if temp_c < setpoint else "HOLD"
-        self.oled.text("Status: {}".format(status), 0, 40)
-        self.oled.show()
+    def show_temp(self, temp_c, setpoint, status=None):
+        self.use(self.temp_screen)
+        self.temp_field.set(temp_c)
+        self.setpoint_field.set(setpoint)
+        if status is None:
+            status = "HEATING" if temp_c < setpoint else "HOLD"
+        self.status_field.set(status)
+        self.render()
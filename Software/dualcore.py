@@ -0,0 +1,278 @@
+# dualcore.py - Heater control on the RP2040's second core
+#
+# DualCoreRuntime starts a _thread on core 1 that samples the thermocouple
+# and runs control() of the control-core modes (Manual, Reflow) at a fixed
+# period. Core 0 keeps the uasyncio runtime: rendering, encoder input, flash
+# logging and the remaining modes. The cores share a ControlLink:
+#
+#   state      float array of the latest temp/rate/target/output/stage,
+#              written by core 1 after every step
+#   mailbox    (command, value) ring posted by core 0 (setpoint nudges, abort)
+#   heartbeat  counter core 1 bumps every step; core 0's watchdog locks the
+#              SSR off and stops the runtime when it stops moving
+#
+# Core 1 holds the lock for a whole control step, so core 0 waits at most a
+# step; core 0 holds it for a few word copies and never across a flash write
+# or an I2C transfer. Loggers fed from core 1 are wrapped in a LogQueue:
+# log() only copies numbers into a ring and core 0 moves them to flash.
+
+from array import array
+from runtime import Runtime, S_STEP_US, STATE_SIZE
+import _thread
+import sys
+import utime
+
+class ControlLink:
+    def __init__(self, mailbox=8):
+        self.lock = _thread.allocate_lock()
+        self.state = array('f', [0.0] * STATE_SIZE)
+
+        # Command mailbox: core 0 posts, core 1 drains (both under the lock)
+        self.size = mailbox
+        self.cmds = bytearray(mailbox)
+        self.args = array('f', [0.0] * mailbox)
+        self.head = 0
+        self.count = 0
+
+        self.mode = None        # Mode core 1 runs; only changed under the lock
+        self.switch_to = None   # Mode change requested by a core-1 mode
+        self.heartbeat = 0      # Written by core 1 only
+
+        # Counters
+        self.posted = 0
+        self.lost = 0
+
+    def post(self, cmd, value=0):
+        """Core 0: queue a command for the running control-core mode. False if the mailbox is full."""
+        with self.lock:
+            if self.count == self.size:
+                self.lost += 1
+                return False
+            i = (self.head + self.count) % self.size
+            self.cmds[i] = cmd
+            self.args[i] = value
+            self.count += 1
+            self.posted += 1
+        return True
+
+    def set_mode(self, mode):
+        """Core 0: hand a mode to core 1 (None parks it). Commands for the old mode are dropped."""
+        with self.lock:
+            self.mode = mode
+            self.count = 0
+
+    def request_switch(self, name):
+        """Core 1 (lock held): a control-core mode asked for a mode change"""
+        self.mode = None
+        self.switch_to = name
+
+    def take_switch(self):
+        """Core 0: the pending mode change from core 1, if any"""
+        with self.lock:
+            name = self.switch_to
+            self.switch_to = None
+        return name
+
+    def snapshot(self, out):
+        """Core 0: copy the shared state into out (an array('f') of STATE_SIZE)"""
+        with self.lock:
+            state = self.state
+            for i in range(STATE_SIZE):
+                out[i] = state[i]
+        return out
+
+class ControlCore:
+    """Core 1 loop: sample, apply mailbox commands, run the mode's control step, publish"""
+    def __init__(self, link, sampler, period_ms=10):
+        self.link = link
+        self.sampler = sampler
+        self.period_ms = period_ms
+        self.running = False
+        self.error = None
+
+        # Statistics
+        self.steps = 0
+        self.overruns = 0
+        self.max_us = 0
+
+    def step(self, now=None):
+        link = self.link
+        start = utime.ticks_us()
+        with link.lock:
+            self.sampler.poll(now)
+            mode = link.mode
+            if mode is not None:
+                while link.count and link.mode is mode:
+                    i = link.head
+                    link.head = (i + 1) % link.size
+                    link.count -= 1
+                    mode.command(link.cmds[i], link.args[i])
+                if link.mode is mode:
+                    mode.control()
+                mode.publish(link.state)
+            took = utime.ticks_diff(utime.ticks_us(), start)
+            link.state[S_STEP_US] = took
+            link.heartbeat = (link.heartbeat + 1) & 0x3FFFFFFF
+        self.steps += 1
+        if took > self.max_us:
+            self.max_us = took
+        return took
+
+    def run(self):
+        """Thread body on core 1"""
+        self.running = True
+        period_us = self.period_ms * 1000
+        try:
+            while self.running:
+                took = self.step()
+                if took < period_us:
+                    utime.sleep_us(period_us - took)
+                else:
+                    self.overruns += 1
+        except Exception as e:
+            self.error = e
+        self.running = False
+
+    def start(self):
+        _thread.start_new_thread(self.run, ())
+
+    def stop(self):
+        self.running = False
+
+class LogQueue:
+    """Core-1 face of a logger: log() copies into a ring, core 0's poll() hands records on"""
+    def __init__(self, logger, capacity=128):
+        self.logger = logger
+        self.EXT = logger.EXT
+        self.capacity = capacity
+        self.times = array('i', [0] * capacity)
+        self.stages = bytearray(capacity)
+        self.values = array('f', [0.0] * (capacity * 4))
+        # Single-writer indices counting modulo 2 * capacity: write by core 1, read by core 0
+        self.write = 0
+        self.read = 0
+        self.flush_requested = False
+        self.dropped = 0
+
+    def start(self, header=None, path=None):
+        """Core 0 (mode enter): discard queued records and start the logger's new run"""
+        self.read = self.write
+        self.flush_requested = False
+        self.logger.start(header, path)
+
+    def log(self, stage, a=0.0, b=0.0, c=0.0, d=0.0):
+        w = self.write
+        if (w - self.read) % (2 * self.capacity) >= self.capacity:
+            self.dropped += 1
+            return False
+        i = w % self.capacity
+        self.times[i] = utime.ticks_ms()
+        self.stages[i] = stage
+        j = i * 4
+        vals = self.values
+        vals[j] = a
+        vals[j + 1] = b
+        vals[j + 2] = c
+        vals[j + 3] = d
+        self.write = (w + 1) % (2 * self.capacity)
+        return True
+
+    def flush(self):
+        """Core 1: ask core 0 to write everything out on its next poll()"""
+        self.flush_requested = True
+
+    def poll(self, now=None):
+        """Core 0: move queued records into the logger, then flush per its policy (or on request)"""
+        logger = self.logger
+        vals = self.values
+        while self.read != self.write:
+            i = self.read % self.capacity
+            j = i * 4
+            logger.log(self.stages[i], vals[j], vals[j + 1], vals[j + 2], vals[j + 3], self.times[i])
+            self.read = (self.read + 1) % (2 * self.capacity)
+        if self.flush_requested:
+            self.flush_requested = False
+            logger.flush()
+        else:
+            logger.poll(now)
+
+    def stats(self):
+        stats = self.logger.stats()
+        stats["queue_dropped"] = self.dropped
+        return stats
+
+class DualCoreRuntime(Runtime):
+    """Runtime whose control-core modes run on core 1; everything else stays on core 0"""
+    def __init__(self, modes, initial, display, sampler, ssr, control_modes=(), period_ms=10,
+                 stall_ms=1000):
+        self.link = ControlLink()
+        self.core = ControlCore(self.link, sampler, period_ms)
+        self.ssr = ssr
+        self.control_modes = control_modes
+        # Flash erases pause core 1 too, for up to a few hundred ms; stall_ms allows for that
+        self.stall_ms = stall_ms
+        self.last_beat = -1
+        self.last_beat_at = utime.ticks_ms()
+        super().__init__(modes, initial, display)
+
+    def adopt(self, name, mode):
+        if name in self.control_modes:
+            mode.on_switch = self.link.request_switch
+            mode.mailbox = self.link
+        else:
+            super().adopt(name, mode)
+
+    def set_mode(self, name):
+        self.link.set_mode(None)
+        super().set_mode(name)      # enter() runs here on core 0 (file opens, compiling)
+        if name in self.control_modes:
+            self.link.set_mode(self.mode)
+
+    def control(self):
+        """Core 0 task body: pick up mode changes from core 1, then input or the core-0 mode's control"""
+        name = self.link.take_switch()
+        if name is not None:
+            self.request_mode(name)
+        if self.pending_mode is not None:
+            return
+        if self.mode_name in self.control_modes:
+            self.mode.input()
+        else:
+            self.mode.control()
+
+    def watchdog(self):
+        """Core 0 task body: SSR off and stop if core 1 stops stepping"""
+        now = utime.ticks_ms()
+        beat = self.link.heartbeat
+        if beat != self.last_beat:
+            self.last_beat = beat
+            self.last_beat_at = now
+            return
+        if utime.ticks_diff(now, self.last_beat_at) > self.stall_ms:
+            # No lock here: a stalled core 1 may be holding it
+            self.ssr.lockout()
+            self.core.stop()
+            raise RuntimeError("Core 1 stalled" if self.core.error is None else
+                               "Core 1: " + str(self.core.error))
+
+    def run(self):
+        self.last_beat_at = utime.ticks_ms()
+        self.core.start()
+        try:
+            super().run()
+        finally:
+            self.core.stop()
+
+    def publish(self, state):
+        self.link.snapshot(state)
+
+    def stats(self):
+        stats = super().stats()
+        stats["core1"] = (self.core.steps, self.core.overruns, self.core.max_us // 1000, 0)
+        return stats
+
+    def report(self, out=None):
+        super().report(out)
+        out = out or sys.stdout
+        out.write("core1: steps={} overruns={} max={}us mailbox lost={}\n".format(
+            self.core.steps, self.core.overruns, self.core.max_us, self.link.lost))
@@ -1,71 +1,126 @@
 from machine import Pin
 import utime
 
+# Quadrature transition table indexed by (previous_state << 2) | current_state,
+# where state = (clk << 1) | dt. +1 clockwise, -1 counterclockwise, 0 no change,
+# INVALID when both lines changed at once (an edge was lost, direction unknown).
+INVALID = 2
+_TRANSITIONS = (
+    0, -1, 1, INVALID,
+    1, 0, INVALID, -1,
+    -1, INVALID, 0, 1,
+    INVALID, 1, -1, 0,
+)
+DETENT_STATE = 3            # Both lines idle high (pull-ups) at a detent
+STEPS_PER_DETENT = 4
+
+BUTTON_DEBOUNCE_MS = 20
+
+# Velocity acceleration: detent interval (ms) -> step size
+ACCEL_FAST_MS = 25
+ACCEL_MEDIUM_MS = 60
+ACCEL_FAST_STEP = 10
+ACCEL_MEDIUM_STEP = 5
+
 class RotaryEncoder:
     def __init__(self, clk=10, dt=11, button=12, callback=None):
         self.clk = Pin(clk, Pin.IN, Pin.PULL_UP)
         self.dt = Pin(dt, Pin.IN, Pin.PULL_UP)
         self.button = Pin(button, Pin.IN, Pin.PULL_UP) if button is not None else None
 
-        self.last_clk = self.clk.value()
-        self.position = 0
+        self.state = (self.clk.value() << 1) | self.dt.value()
+        self.steps = 0              # Quarter-steps since the last detent
+        self.position = 0           # Detents since the last read
+        self.accel_position = 0     # Same movement with velocity acceleration applied
+        self.last_detent_time = utime.ticks_ms()
         self.callback = callback
-        
+
+        # Diagnostics
+        self.invalid = 0            # Both lines changed between interrupts
+        self.missed = 0             # Detent reached with quarter-steps missing
+        self.bounces = 0            # Interrupts that found no state change
+
         # Button state
         self.button_pressed = False
         self.button_press_time = None
         self.long_press_detected = False
         self.last_button = 1
-        
+        self.last_button_edge = utime.ticks_ms()
+
         # Setup button interrupt if button pin is provided
         if self.button is not None:
             self.button.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self._button_handler)
-        
-        # Setup encoder interrupts
-        self.clk.irq(trigger=Pin.IRQ_FALLING, handler=self._encoder_handler)
-        self.dt.irq(trigger=Pin.IRQ_FALLING, handler=self._encoder_handler)
+
+        # Setup encoder interrupts on every edge of both lines
+        self.clk.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self._encoder_handler)
+        self.dt.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self._encoder_handler)
 
     def _encoder_handler(self, pin):
-        # Debounce
-        utime.sleep_ms(2)
-        
-        # Read current state
-        current_clk = self.clk.value()
-        current_dt = self.dt.value()
-
-        # Check if this is a valid state change
-        if current_clk == 0 and self.last_clk == 1:
-            if current_dt == 1:
-                self.position += 1
-                direction = 1  # clockwise
-            else:
-                self.position -= 1
-                direction = -1  # counterclockwise
-            if self.callback:
-                self.callback(direction)
-
-        self.last_clk = current_clk
+        current = (self.clk.value() << 1) | self.dt.value()
+        move = _TRANSITIONS[(self.state << 2) | current]
+        self.state = current
+
+        if move == 0:
+            self.bounces += 1
+            return
+        if move == INVALID:
+            self.invalid += 1
+            return
+        self.steps += move
+
+        if current != DETENT_STATE:
+            return
+
+        # Back at a detent: count one click if we mostly moved one way
+        steps = self.steps
+        self.steps = 0
+        if steps >= 2:
+            direction = 1   # clockwise
+        elif steps <= -2:
+            direction = -1  # counterclockwise
+        else:
+            return
+        if steps != STEPS_PER_DETENT and steps != -STEPS_PER_DETENT:
+            self.missed += 1
+
+        now = utime.ticks_ms()
+        interval = utime.ticks_diff(now, self.last_detent_time)
+        self.last_detent_time = now
+        if interval < ACCEL_FAST_MS:
+            step = ACCEL_FAST_STEP
+        elif interval < ACCEL_MEDIUM_MS:
+            step = ACCEL_MEDIUM_STEP
+        else:
+            step = 1
+
+        self.position += direction
+        self.accel_position += direction * step
+        if self.callback:
+            self.callback(direction)
 
     def _button_handler(self, pin):
-        # Debounce
-        utime.sleep_ms(2)
-        
-            current_button = self.button.value()
         now = utime.ticks_ms()
-        
-        if current_button == 0 and self.last_button == 1:  # Button pressed
-                self.button_pressed = True
+        current_button = self.button.value()
+        if current_button == self.last_button:
+            return
+        # Debounce: ignore edges too close to the last accepted one
+        if utime.ticks_diff(now, self.last_button_edge) < BUTTON_DEBOUNCE_MS:
+            return
+        self.last_button_edge = now
+
+        if current_button == 0:  # Button pressed
+            self.button_pressed = True
             self.button_press_time = now
             self.long_press_detected = False
-        elif current_button == 1 and self.last_button == 0:  # Button released
+        else:  # Button released
             if self.button_pressed:
                 press_duration = utime.ticks_diff(now, self.button_press_time)
                 if press_duration >= 1000:  # Long press threshold
                     self.long_press_detected = True
                 self.button_pressed = False
                 self.button_press_time = None
-        
-            self.last_button = current_button
+
+        self.last_button = current_button
 
     def update(self):
         # This method is kept for compatibility but is now empty
@@ -73,23 +128,35 @@ class RotaryEncoder:
         pass
 
     def get_position(self):
+        """Detents moved since the last read, one per click"""
         pos = self.position
         self.position = 0  # Reset position after reading
+        self.accel_position = 0
+        return pos
+
+    def get_accelerated(self):
+        """Movement since the last read, scaled up when the knob is spun fast"""
+        pos = self.accel_position
+        self.position = 0
+        self.accel_position = 0
         return pos
 
     def was_pressed(self):
         if self.button_pressed and self.button_press_time is not None:
             press_duration = utime.ticks_diff(utime.ticks_ms(), self.button_press_time)
             if press_duration < 500 and not self.long_press_detected:  # Short press threshold
-            self.button_pressed = False
+                self.button_pressed = False
                 self.button_press_time = None
-            return True
+                return True
         return False
-    
+
     def was_held(self, duration_ms=1000):
         if self.long_press_detected:
             self.long_press_detected = False
             self.button_pressed = False
             self.button_press_time = None
-                return True
+            return True
         return False
+
+    def stats(self):
+        return {"invalid": self.invalid, "missed": self.missed, "bounces": self.bounces}
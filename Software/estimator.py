@@ -0,0 +1,176 @@
+# estimator.py - Temperature / ramp-rate state estimator
+#
+# Constant-velocity Kalman filter over [temperature, ramp rate]. It is updated
+# once per new thermocouple sample (see Sampler) and shared by every mode, so
+# control decisions use one filtered ramp rate instead of differencing two
+# consecutive 0.25 C-quantized readings.
+#
+# Both estimators also keep integer views for the fixed-point pipeline
+# (fixedpoint.py): temp_q, rate_r and rate_sd_r. FixedEstimator runs the same
+# filter with its gains frozen at their converged values for the sample
+# period, entirely in integers.
+
+from fixedpoint import Q, RATE, to_q, to_rate
+import math
+import utime
+
+GAIN_SHIFT = 10         # FixedEstimator gains are Q10
+MAX_INNOVATION = 64000  # m C; keeps the gain products inside small ints
+
+class ThermalEstimator:
+    def __init__(self, meas_var=0.0625, accel_var=0.05, reset_gap_ms=5000):
+        self.meas_var = meas_var        # Measurement noise, C^2 (quantization + pickup)
+        self.accel_var = accel_var      # Process noise: how fast the ramp rate may change, (C/s^2)^2
+        self.reset_gap_ms = reset_gap_ms
+        self.reset()
+
+    def reset(self):
+        self.temp = None
+        self.rate = 0.0
+        self.last_time = None
+        # Covariance [[p00, p01], [p01, p11]]
+        self.p00 = 0.0
+        self.p01 = 0.0
+        self.p11 = 0.0
+        self.temp_sd = 0.0
+        self.rate_sd = 0.0
+        self.updates = 0
+        self.temp_q = None
+        self.rate_r = 0
+        self.rate_sd_r = 0
+
+    def update(self, measured, t_ms=None):
+        """Fold in one new reading taken at t_ms"""
+        if t_ms is None:
+            t_ms = utime.ticks_ms()
+        if self.temp is None or utime.ticks_diff(t_ms, self.last_time) > self.reset_gap_ms:
+            # (Re)initialize from the measurement, ramp rate unknown
+            self.temp = measured
+            self.rate = 0.0
+            self.p00 = self.meas_var
+            self.p01 = 0.0
+            self.p11 = 1.0
+            self.last_time = t_ms
+            self._update_sd()
+            return
+
+        dt = utime.ticks_diff(t_ms, self.last_time) / 1000.0
+        self.last_time = t_ms
+        if dt <= 0:
+            return
+
+        # Predict
+        q = self.accel_var
+        dt2 = dt * dt
+        self.temp += self.rate * dt
+        p11 = self.p11
+        self.p00 += dt * (2 * self.p01 + dt * p11) + q * dt2 * dt2 / 4
+        self.p01 += dt * p11 + q * dt2 * dt / 2
+        self.p11 = p11 + q * dt2
+
+        # Correct
+        s = self.p00 + self.meas_var
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        innovation = measured - self.temp
+        self.temp += k0 * innovation
+        self.rate += k1 * innovation
+        p01 = self.p01
+        self.p11 -= k1 * p01
+        self.p01 = (1 - k0) * p01
+        self.p00 = (1 - k0) * self.p00
+        self.updates += 1
+        self._update_sd()
+
+    def update_q(self, q, t_ms=None):
+        """update() for a reading in quarter-degrees"""
+        self.update(q / Q, t_ms)
+
+    def _update_sd(self):
+        self.temp_sd = math.sqrt(self.p00)
+        self.rate_sd = math.sqrt(self.p11)
+        self.temp_q = to_q(self.temp)
+        self.rate_r = to_rate(self.rate)
+        self.rate_sd_r = to_rate(self.rate_sd)
+
+def steady_gains(period_ms, meas_var, accel_var):
+    """Converged (k0, k1 per s, temp sd, rate sd) of the filter for a fixed sample period"""
+    dt = period_ms / 1000.0
+    q = accel_var
+    p00, p01, p11 = meas_var, 0.0, 1.0
+    k0 = k1 = 0.0
+    for _ in range(1000):
+        dt2 = dt * dt
+        p00 += dt * (2 * p01 + dt * p11) + q * dt2 * dt2 / 4
+        p01 += dt * p11 + q * dt2 * dt / 2
+        p11 += q * dt2
+        s = p00 + meas_var
+        k0 = p00 / s
+        k1 = p01 / s
+        p11 -= k1 * p01
+        p01 = (1 - k0) * p01
+        p00 = (1 - k0) * p00
+    return k0, k1, math.sqrt(p00), math.sqrt(p11)
+
+class FixedEstimator:
+    """ThermalEstimator in integers, with the gains it converges to for period_ms.
+    Internally m C and m C/s; temp/rate/rate_sd are float views for the display and log."""
+    def __init__(self, period_ms=100, meas_var=0.0625, accel_var=0.05, reset_gap_ms=5000):
+        self.reset_gap_ms = reset_gap_ms
+        k0, k1, temp_sd, rate_sd = steady_gains(period_ms, meas_var, accel_var)
+        self.k0 = int(k0 * (1 << GAIN_SHIFT) + 0.5)
+        self.k1 = int(k1 * (1 << GAIN_SHIFT) + 0.5)
+        self.temp_sd = temp_sd
+        self.rate_sd = rate_sd
+        self.rate_sd_r = to_rate(rate_sd)
+        self.reset()
+
+    def reset(self):
+        self.temp_m = 0
+        self.rate_m = 0
+        self.last_time = None
+        self.temp_q = None
+        self.rate_r = 0
+        self.updates = 0
+
+    @property
+    def temp(self):
+        return None if self.temp_q is None else self.temp_m / 1000
+
+    @property
+    def rate(self):
+        return self.rate_m / 1000
+
+    def update(self, measured, t_ms=None):
+        self.update_q(to_q(measured), t_ms)
+
+    def update_q(self, q, t_ms=None):
+        """Fold in one reading in quarter-degrees taken at t_ms"""
+        if t_ms is None:
+            t_ms = utime.ticks_ms()
+        m = q * (1000 // Q)
+        if self.temp_q is None or utime.ticks_diff(t_ms, self.last_time) > self.reset_gap_ms:
+            self.temp_m = m
+            self.rate_m = 0
+            self.last_time = t_ms
+            self._publish()
+            return
+
+        dt = utime.ticks_diff(t_ms, self.last_time)
+        self.last_time = t_ms
+        if dt <= 0:
+            return
+        predicted = self.temp_m + self.rate_m * dt // 1000
+        innovation = m - predicted
+        if innovation > MAX_INNOVATION:
+            innovation = MAX_INNOVATION
+        elif innovation < -MAX_INNOVATION:
+            innovation = -MAX_INNOVATION
+        self.temp_m = predicted + ((self.k0 * innovation) >> GAIN_SHIFT)
+        self.rate_m += (self.k1 * innovation) >> GAIN_SHIFT
+        self.updates += 1
+        self._publish()
+
+    def _publish(self):
+        self.temp_q = (self.temp_m + 1000 // Q // 2) // (1000 // Q)
+        self.rate_r = self.rate_m // (1000 // RATE)
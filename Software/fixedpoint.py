@@ -0,0 +1,29 @@
+# fixedpoint.py - Units of the integer temperature pipeline
+#
+# With FIXED_POINT set in main.py, temperatures, setpoints, ramp rates and
+# duty cycles travel through the control path as scaled ints, so a control
+# step does no software-float math and allocates no boxed floats. Floats only
+# appear at the display and log boundary.
+#
+#   temperature  quarter-degrees C (the thermocouple chips' own resolution)
+#   ramp rate    centi-degrees C per second
+#   duty         per mille (0..1000)
+#   time         ms
+
+Q = 4           # Quarter-degrees per C
+RATE = 100      # Rate units per C/s
+DUTY = 1000     # Full duty
+
+def to_q(c):
+    """C -> quarter-degrees, rounded"""
+    return int(c * Q + (0.5 if c >= 0 else -0.5))
+
+def to_rate(c_per_s):
+    """C/s -> centi-degrees per second, rounded"""
+    return int(c_per_s * RATE + (0.5 if c_per_s >= 0 else -0.5))
+
+def from_q(q):
+    return q / Q
+
+def from_rate(r):
+    return r / RATE
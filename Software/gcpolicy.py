@@ -0,0 +1,100 @@
+# gcpolicy.py - Garbage collection at chosen moments instead of mid-window
+#
+# MicroPython collects when an allocation finds the heap full, which can land
+# anywhere, including just before an SSR edge whose timer callback then runs
+# late. GcPolicy runs as a low-priority runtime task and collects early, once
+# `budget` bytes have been allocated since the last collection, but only in an
+# idle slot: no SSR edge due within guard_ms (right after a window starts, or
+# with the duty driver stopped). gc.threshold() is raised to a backstop above
+# the budget, so the automatic collection only happens if the scheduled ones
+# can't keep up. Past `urgent` bytes it collects regardless of the SSR.
+# With several heater zones, pass the list of SSRs: a slot is idle only if
+# none of them has an edge due.
+#
+# alloc_check() measures what a function allocates per call, for checking
+# that the control path stays flat (see main.py ALLOC_CHECK).
+
+import gc
+import utime
+
+class GcPolicy:
+    def __init__(self, ssr=None, budget=None, guard_ms=20):
+        self.ssr = ssr
+        self.guard_ms = guard_ms
+        gc.collect()
+        heap = gc.mem_free() + gc.mem_alloc()
+        self.budget = budget or heap // 8       # Allocated bytes that make a collection due
+        self.urgent = 2 * self.budget           # ...and that make it due whatever the SSR is doing
+        gc.threshold(3 * self.budget)           # Automatic collection: backstop only
+        self.baseline = gc.mem_alloc()          # Live heap after the last collection
+
+        # Counters
+        self.collections = 0
+        self.forced = 0                         # Collected outside an idle slot
+        self.max_us = 0
+        self.last_us = 0
+
+    def idle(self, now):
+        """True if no SSR edge is due within guard_ms (on any of them, for a list of SSRs)"""
+        ssr = self.ssr
+        if isinstance(ssr, list):
+            for one in ssr:
+                if not self._idle(one, now):
+                    return False
+            return True
+        return self._idle(ssr, now)
+
+    def _idle(self, ssr, now):
+        if ssr is None or not ssr.active:
+            return True
+        since = utime.ticks_diff(now, ssr.window_at)
+        if ssr.on_at is not None and ssr.window_on_ms < ssr.window_ms:
+            to_edge = ssr.window_on_ms - since      # Off edge still to come
+        else:
+            to_edge = ssr.window_ms - since         # Next window start
+        return to_edge > self.guard_ms
+
+    def poll(self, now=None):
+        """Task body: collect if the budget is used up and this is a good moment"""
+        used = gc.mem_alloc() - self.baseline
+        if used < self.budget:
+            return
+        if now is None:
+            now = utime.ticks_ms()
+        if used < self.urgent and not self.idle(now):
+            return
+        if used >= self.urgent:
+            self.forced += 1
+        self.collect()
+
+    def collect(self):
+        t0 = utime.ticks_us()
+        gc.collect()
+        us = utime.ticks_diff(utime.ticks_us(), t0)
+        self.baseline = gc.mem_alloc()
+        self.collections += 1
+        self.last_us = us
+        if us > self.max_us:
+            self.max_us = us
+
+    def stats(self):
+        return {
+            "collections": self.collections,
+            "forced": self.forced,
+            "max_us": self.max_us,
+            "last_us": self.last_us,
+            "live": self.baseline,
+            "free": gc.mem_free(),
+        }
+
+def alloc_check(fn, n=200):
+    """Heap bytes allocated per call of fn, averaged over n calls (0: allocation-free)"""
+    gc.collect()
+    gc.disable()        # A collection in the middle would hide the allocations
+    try:
+        before = gc.mem_alloc()
+        for _ in range(n):
+            fn()
+        return (gc.mem_alloc() - before) // n
+    finally:
+        gc.enable()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# analyze.py - Per-stage metrics and a solder-paste pass/fail check for run logs
+#
+# Logs are streamed in fixed-size chunks (or memory-mapped from a .npy cache;
+# binary .rfl logs are decoded by logdecode.py),
+# and every metric is a running reduction updated with whole-array NumPy
+# operations per chunk, so a multi-hour manual-mode log costs no more memory
+# than a short reflow.
+#
+# The profile (--profile, else the run file's header, else main.py's) is
+# compiled with the firmware's own profile_compiler. A sample counts as "below bound" (the
+# Waiting / Below Bound states) when its stage waits for its lower bound, the
+# setpoint is that bound and the temperature is under it. Cooldown stages
+# don't count towards overshoot and tracking error.
+#
+#   python analyze.py log.csv                        # summary + spec check
+#   python analyze.py log.csv --json run.json --csv stages.csv --spec sac305
+#   python analyze.py big.csv --to-npy big.npy && python analyze.py big.npy
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import sys
+
+import numpy as np
+
+from firmware import FIRMWARE, main_constants
+if FIRMWARE not in sys.path:
+    sys.path.append(FIRMWARE)
+from profile_compiler import compile_profile, STAGE_COOLDOWN
+import logdecode
+
+COLUMNS = ("Time", "Stage", "Temp", "Setpoint", "Output", "RampRate")
+T, STAGE, TEMP, SET, OUT, RATE = range(len(COLUMNS))
+CHUNK_ROWS = 65536
+
+# Solder paste windows (typical datasheet values). Temperatures in C, times in s, rates in C/s.
+SPECS = {
+    "sn42bi58": {"liquidus": 138, "peak_min": 150, "peak_max": 185, "tal_min": 30, "tal_max": 90,
+                 "ramp_max": 3.0, "cool_max": 6.0, "overshoot_max": 10},
+    "sn63pb37": {"liquidus": 183, "peak_min": 205, "peak_max": 225, "tal_min": 30, "tal_max": 90,
+                 "ramp_max": 3.0, "cool_max": 6.0, "overshoot_max": 10},
+    "sac305":   {"liquidus": 217, "peak_min": 235, "peak_max": 250, "tal_min": 30, "tal_max": 90,
+                 "ramp_max": 3.0, "cool_max": 6.0, "overshoot_max": 10},
+}
+DEFAULT_SPEC = "sn42bi58"   # The stock profile in main.py is a low-temperature one
+
+# ───── Input ─────
+
+def read_header(path):
+    """'# key: value' lines at the top of a run file (see logger.run_header)"""
+    if path.endswith(".rfl"):
+        return logdecode.read_meta(path)
+    fields = {}
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            key, sep, value = line[1:].partition(":")
+            if sep:
+                fields[key.strip()] = value.strip()
+    return fields
+
+def _header(f):
+    """Column indexes for COLUMNS from the first non-comment line"""
+    for line in f:
+        if line.strip() and not line.startswith("#"):
+            names = [n.strip() for n in line.strip().split(",")]
+            return [names.index(c) for c in COLUMNS]
+    raise ValueError("no header line")
+
+def iter_chunks(path, rows=CHUNK_ROWS):
+    """Yield (n, 6) float arrays in COLUMNS order"""
+    if path.endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        for i in range(0, len(data), rows):
+            yield np.asarray(data[i:i + rows])
+        return
+    if path.endswith(".rfl"):
+        data = logdecode.decode(path)[2]
+        for i in range(0, len(data), rows):
+            yield data[i:i + rows]
+        return
+    with open(path) as f:
+        order = _header(f)
+        while True:
+            lines = list(itertools.islice(f, rows))
+            if not lines:
+                break
+            block = np.loadtxt(lines, delimiter=",", comments="#", ndmin=2)
+            if len(block):
+                yield block[:, order]
+
+def to_npy(path, out):
+    """Convert a CSV (or binary) log to a .npy array that later runs can memory-map"""
+    chunks = list(iter_chunks(path))
+    data = np.concatenate(chunks) if chunks else np.empty((0, len(COLUMNS)))
+    np.save(out, data)
+    return len(data)
+
+# ───── Metrics ─────
+
+class StageAcc:
+    """Running reductions for one stage"""
+    def __init__(self):
+        self.samples = 0
+        self.start = math.inf
+        self.end = -math.inf
+        self.seconds = 0.0
+        self.peak = -math.inf
+        self.overshoot = -math.inf
+        self.above_liquidus = 0.0
+        self.rate_max = -math.inf
+        self.rate_min = math.inf
+        self.rate_dt = 0.0          # Sum of rate*dt
+        self.sq_err_dt = 0.0        # Sum of (temp-set)^2*dt while tracking
+        self.track_s = 0.0
+        self.duty_dt = 0.0
+        self.below_s = 0.0
+
+    def add(self, c, dt, liquidus, below, tracking):
+        temp, err = c[:, TEMP], c[:, TEMP] - c[:, SET]
+        self.samples += len(c)
+        self.start = min(self.start, float(c[0, T]))
+        self.end = max(self.end, float(c[-1, T]))
+        self.seconds += float(dt.sum())
+        self.peak = max(self.peak, float(temp.max()))
+        if tracking.any():
+            self.overshoot = max(self.overshoot, float(err[tracking].max()))
+        self.above_liquidus += float(dt[temp >= liquidus].sum())
+        self.rate_max = max(self.rate_max, float(c[:, RATE].max()))
+        self.rate_min = min(self.rate_min, float(c[:, RATE].min()))
+        self.rate_dt += float(c[:, RATE] @ dt)
+        self.sq_err_dt += float((err * err * tracking) @ dt)
+        self.track_s += float(dt[tracking].sum())
+        self.duty_dt += float(c[:, OUT] @ dt) / 100.0
+        self.below_s += float(dt[below].sum())
+
+    def result(self):
+        s = self.seconds or math.nan
+        return {
+            "samples": self.samples,
+            "start_s": self.start,
+            "end_s": self.end,
+            "duration_s": self.seconds,
+            "peak_c": self.peak,
+            "overshoot_c": max(0.0, self.overshoot) if self.overshoot > -math.inf else None,
+            "above_liquidus_s": self.above_liquidus,
+            "ramp_max": self.rate_max,
+            "cool_max": max(0.0, -self.rate_min),
+            "ramp_mean": self.rate_dt / s,
+            "tracking_rmse": math.sqrt(self.sq_err_dt / self.track_s) if self.track_s else None,
+            "duty": self.duty_dt / s,
+            "below_bound_s": self.below_s,
+        }
+
+def analyze(path, liquidus, profile=None, rows=CHUNK_ROWS):
+    """Stream a log and return ({stage: metrics}, overall metrics)"""
+    # Per log stage number (1-based; index 0 unused): lower bound, waits for it, tracked
+    lower = wait = tracked = None
+    if profile is not None:
+        cp = compile_profile(profile)
+        lower = np.array([-math.inf] + [cp.lowers[i] for i in range(cp.count)])
+        wait = np.array([False] + [bool(cp.waits[i]) for i in range(cp.count)])
+        tracked = np.array([True] + [cp.types[i] != STAGE_COOLDOWN for i in range(cp.count)])
+    stages = {}
+    total = StageAcc()
+    last_t = None
+    for c in iter_chunks(path, rows):
+        t = c[:, T]
+        # Each sample is charged the interval since the previous one
+        prev = np.empty_like(t)
+        prev[0] = t[0] if last_t is None else last_t
+        prev[1:] = t[:-1]
+        dt = np.clip(t - prev, 0.0, None)
+        last_t = t[-1]
+
+        stage = c[:, STAGE].astype(int)
+        if lower is not None:
+            known = np.clip(stage, 0, len(lower) - 1) * (stage < len(lower))
+            bound = lower[known]
+            below = wait[known] & np.isclose(c[:, SET], bound, atol=0.05) & (c[:, TEMP] < bound)
+            tracking = tracked[known] & ~below
+        else:
+            below = np.zeros(len(c), dtype=bool)
+            tracking = ~below
+
+        total.add(c, dt, liquidus, below, tracking)
+        for s in np.unique(stage):
+            m = stage == s
+            stages.setdefault(int(s), StageAcc()).add(c[m], dt[m], liquidus, below[m], tracking[m])
+
+    if total.samples == 0:
+        raise ValueError("{} has no data rows".format(path))
+    return {s: acc.result() for s, acc in sorted(stages.items())}, total.result()
+
+def check(overall, spec):
+    """[(check, value, limit, ok)] against a paste spec"""
+    checks = [
+        ("peak_min", overall["peak_c"], spec["peak_min"], overall["peak_c"] >= spec["peak_min"]),
+        ("peak_max", overall["peak_c"], spec["peak_max"], overall["peak_c"] <= spec["peak_max"]),
+        ("tal_min", overall["above_liquidus_s"], spec["tal_min"], overall["above_liquidus_s"] >= spec["tal_min"]),
+        ("tal_max", overall["above_liquidus_s"], spec["tal_max"], overall["above_liquidus_s"] <= spec["tal_max"]),
+        ("ramp_max", overall["ramp_max"], spec["ramp_max"], overall["ramp_max"] <= spec["ramp_max"]),
+        ("cool_max", overall["cool_max"], spec["cool_max"], overall["cool_max"] <= spec["cool_max"]),
+    ]
+    if "overshoot_max" in spec and overall["overshoot_c"] is not None:
+        checks.append(("overshoot_max", overall["overshoot_c"], spec["overshoot_max"],
+                       overall["overshoot_c"] <= spec["overshoot_max"]))
+    return checks
+
+# ───── Output ─────
+
+def load_spec(name):
+    if name in SPECS:
+        return dict(SPECS[name], name=name)
+    with open(name) as f:
+        spec = json.load(f)
+    spec.setdefault("name", name)
+    return spec
+
+def load_profile(profile_path=None, header=None):
+    """Profile stages from a JSON file, the run file's header, or main.py's reflow_profile"""
+    if profile_path:
+        with open(profile_path) as f:
+            return json.load(f)
+    if header and "profile" in header:
+        profile = json.loads(header["profile"])
+        names = json.loads(header["stages"]) if "stages" in header else None
+    else:
+        consts = main_constants("reflow_profile", "stage_names")
+        profile = consts.get("reflow_profile")
+        names = consts.get("stage_names")
+    if not profile:
+        return None
+    # Resolve name-derived stage types (Preheat, Cooldown) the way ReflowMode does
+    cp = compile_profile(profile, names)
+    return [list(stage[:3]) + [cp.types[i]] for i, stage in enumerate(profile)]
+
+def write_csv(path, stages):
+    fields = ["stage"] + list(next(iter(stages.values())).keys())
+    with open(path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=fields)
+        w.writeheader()
+        for s, m in stages.items():
+            w.writerow(dict(m, stage=s))
+
+def _fmt(v):
+    if v is None:
+        return "-"
+    if isinstance(v, float):
+        return "{:.2f}".format(v)
+    return str(v)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Analyze a reflow/manual log.csv")
+    ap.add_argument("log", help="log.csv, a binary run_NNNN.rfl, or a .npy made with --to-npy")
+    ap.add_argument("--spec", default=DEFAULT_SPEC,
+                    help="paste spec: {} or a JSON file".format(", ".join(sorted(SPECS))))
+    ap.add_argument("--liquidus", type=float, help="override the spec's liquidus, C")
+    ap.add_argument("--profile", help="profile JSON ([[duration, lower, upper(, type)], ...]); "
+                                      "default: the log's header, else main.py's")
+    ap.add_argument("--json", help="write all metrics and checks here")
+    ap.add_argument("--csv", help="write per-stage metrics here")
+    ap.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="rows per chunk")
+    ap.add_argument("--to-npy", metavar="OUT", help="only convert the CSV to a memory-mappable .npy")
+    args = ap.parse_args(argv)
+
+    if args.to_npy:
+        print("wrote {} rows to {}".format(to_npy(args.log, args.to_npy), args.to_npy))
+        return 0
+
+    spec = load_spec(args.spec)
+    liquidus = args.liquidus if args.liquidus is not None else spec["liquidus"]
+    header = {} if args.log.endswith(".npy") else read_header(args.log)
+    stages, overall = analyze(args.log, liquidus, load_profile(args.profile, header), args.chunk)
+    checks = check(overall, spec)
+    passed = all(ok for _, _, _, ok in checks)
+
+    keys = list(overall.keys())
+    print("stage " + " ".join("{:>14}".format(k) for k in keys))
+    for s, m in stages.items():
+        print("{:>5} ".format(s) + " ".join("{:>14}".format(_fmt(m[k])) for k in keys))
+    print("  all " + " ".join("{:>14}".format(_fmt(overall[k])) for k in keys))
+    print("spec {} (liquidus {} C): {}".format(spec["name"], liquidus, "PASS" if passed else "FAIL"))
+    for name, value, limit, ok in checks:
+        print("  {:<14} {:>8} limit {:>6}  {}".format(name, _fmt(value), limit, "ok" if ok else "FAIL"))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"log": args.log, "spec": spec, "liquidus": liquidus, "passed": passed,
+                       "overall": overall, "stages": stages,
+                       "checks": [{"check": n, "value": v, "limit": l, "ok": ok} for n, v, l, ok in checks]},
+                      f, indent=1)
+    if args.csv:
+        write_csv(args.csv, stages)
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
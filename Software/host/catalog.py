@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# catalog.py - SQLite catalog of archived run files
+#
+# Each runs/run_NNNN.csv (or binary .rfl) copied off the Pico is analyzed once (analyze.py)
+# and stored as one row in `runs` plus one row per stage in `stages`, keyed
+# by the file's content hash so re-ingesting a folder only adds new runs.
+# Header fields (profile, gains, firmware, board) become indexed columns, so
+# trend queries never touch the CSVs again.
+#
+#   python catalog.py ingest runs.db archive/           # every *.csv / *.rfl below archive/
+#   python catalog.py list runs.db --profile default --last 20
+#   python catalog.py drift runs.db --profile default --metric peak_c --last 500
+#   python catalog.py sql runs.db "SELECT firmware, avg(peak_c) FROM runs GROUP BY firmware"
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from analyze import DEFAULT_SPEC, analyze, check, load_profile, load_spec, read_header
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    sha1 TEXT UNIQUE NOT NULL,
+    path TEXT NOT NULL,
+    run_no INTEGER,
+    started TEXT,               -- ISO 8601; file mtime when the board's clock wasn't set
+    firmware TEXT,
+    board TEXT,
+    profile_name TEXT,
+    profile_hash TEXT,          -- Identifies the exact stage list, whatever it was called
+    profile TEXT,
+    gains TEXT,
+    spec TEXT,
+    passed INTEGER,
+    samples INTEGER,
+    duration_s REAL,
+    peak_c REAL,
+    overshoot_c REAL,
+    above_liquidus_s REAL,
+    ramp_max REAL,
+    cool_max REAL,
+    ramp_mean REAL,
+    tracking_rmse REAL,
+    duty REAL,
+    below_bound_s REAL,
+    ingested TEXT
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    stage INTEGER NOT NULL,
+    name TEXT,
+    samples INTEGER,
+    start_s REAL,
+    end_s REAL,
+    duration_s REAL,
+    peak_c REAL,
+    overshoot_c REAL,
+    above_liquidus_s REAL,
+    ramp_max REAL,
+    cool_max REAL,
+    ramp_mean REAL,
+    tracking_rmse REAL,
+    duty REAL,
+    below_bound_s REAL,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE INDEX IF NOT EXISTS runs_profile_started ON runs(profile_hash, started);
+CREATE INDEX IF NOT EXISTS runs_profile_name_started ON runs(profile_name, started);
+CREATE INDEX IF NOT EXISTS runs_started ON runs(started);
+CREATE INDEX IF NOT EXISTS runs_board_started ON runs(board, started);
+CREATE INDEX IF NOT EXISTS runs_firmware ON runs(firmware);
+"""
+
+METRICS = ("samples", "duration_s", "peak_c", "overshoot_c", "above_liquidus_s", "ramp_max",
+           "cool_max", "ramp_mean", "tracking_rmse", "duty", "below_bound_s")
+STAGE_COLUMNS = ("start_s", "end_s") + METRICS
+RUN_FIELDS = ("sha1", "path", "run_no", "started", "firmware", "board", "profile_name",
+              "profile_hash", "profile", "gains", "spec", "passed") + METRICS + ("ingested",)
+
+def connect(path):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA foreign_keys=ON")
+    db.executescript(SCHEMA)
+    return db
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def profile_hash(profile_json):
+    """Stable id for a stage list: hash of its canonical JSON"""
+    if not profile_json:
+        return None
+    canonical = json.dumps(json.loads(profile_json), separators=(",", ":"))
+    return hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+def started_at(header, path):
+    started = header.get("started", "")
+    # An unset Pico RTC counts from 2021-01-01 (or 1970 on the host stand-ins)
+    if started[:4].isdigit() and int(started[:4]) >= 2022:
+        return started
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(os.path.getmtime(path)))
+
+def _number(v):
+    """SQLite-friendly metric value (NaN/inf become NULL)"""
+    if v is None:
+        return None
+    v = float(v)
+    return v if np.isfinite(v) else None
+
+def ingest_file(db, path, spec):
+    sha1 = file_sha1(path)
+    if db.execute("SELECT 1 FROM runs WHERE sha1 = ?", (sha1,)).fetchone():
+        return False
+    header = read_header(path)
+    stage_metrics, overall = analyze(path, spec["liquidus"], load_profile(None, header))
+    passed = all(ok for _, _, _, ok in check(overall, spec))
+    names = json.loads(header["stages"]) if "stages" in header else []
+    run_no = header.get("run")
+
+    row = {
+        "sha1": sha1,
+        "path": os.path.abspath(path),
+        "run_no": int(run_no) if run_no and run_no.isdigit() else None,
+        "started": started_at(header, path),
+        "firmware": header.get("firmware"),
+        "board": header.get("board"),
+        "profile_name": header.get("profile_name"),
+        "profile_hash": profile_hash(header.get("profile")),
+        "profile": header.get("profile"),
+        "gains": header.get("gains"),
+        "spec": spec["name"],
+        "passed": int(passed),
+        "ingested": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    for k in METRICS:
+        row[k] = _number(overall[k])
+    cur = db.execute("INSERT INTO runs ({}) VALUES ({})".format(
+        ",".join(RUN_FIELDS), ",".join("?" * len(RUN_FIELDS))), [row[k] for k in RUN_FIELDS])
+    run_id = cur.lastrowid
+    db.executemany(
+        "INSERT INTO stages (run_id, stage, name, {}) VALUES (?, ?, ?, {})".format(
+            ",".join(STAGE_COLUMNS), ",".join("?" * len(STAGE_COLUMNS))),
+        [[run_id, s, names[s - 1] if 0 < s <= len(names) else None] + [_number(m[k]) for k in STAGE_COLUMNS]
+         for s, m in stage_metrics.items()])
+    return True
+
+def find_logs(paths):
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _, files in os.walk(p):
+                for name in sorted(files):
+                    if name.endswith((".csv", ".rfl")):
+                        yield os.path.join(root, name)
+        else:
+            yield p
+
+def ingest(db, paths, spec):
+    """Add every new run under paths in one transaction. Returns (added, skipped, failed)."""
+    added = skipped = failed = 0
+    with db:
+        for path in find_logs(paths):
+            try:
+                if ingest_file(db, path, spec):
+                    added += 1
+                else:
+                    skipped += 1
+            except (ValueError, KeyError, OSError) as e:
+                failed += 1
+                print("skipping {}: {}".format(path, e), file=sys.stderr)
+    return added, skipped, failed
+
+def _profile_filter(profile):
+    """WHERE clause matching a profile name or a profile hash"""
+    if profile is None:
+        return "1", ()
+    return "(profile_name = ? OR profile_hash = ?)", (profile, profile)
+
+def recent(db, profile=None, last=20, columns=("id", "started", "board", "firmware", "profile_name",
+                                              "peak_c", "overshoot_c", "above_liquidus_s", "passed")):
+    where, args = _profile_filter(profile)
+    rows = db.execute("SELECT {} FROM runs WHERE {} ORDER BY started DESC, id DESC LIMIT ?".format(
+        ",".join(columns), where), args + (last,)).fetchall()
+    return columns, rows[::-1]
+
+def drift(db, metric, profile=None, last=500, board=None):
+    """(started, value) for the last runs, oldest first, and the trend per run"""
+    if metric not in METRICS:
+        raise ValueError("unknown metric {}; one of {}".format(metric, ", ".join(METRICS)))
+    where, args = _profile_filter(profile)
+    if board:
+        where += " AND board = ?"
+        args += (board,)
+    rows = db.execute("SELECT started, {} FROM runs WHERE {} AND {} IS NOT NULL "
+                      "ORDER BY started DESC, id DESC LIMIT ?".format(metric, where, metric),
+                      args + (last,)).fetchall()[::-1]
+    values = np.array([r[1] for r in rows], dtype=float)
+    slope = float(np.polyfit(np.arange(len(values)), values, 1)[0]) if len(values) > 1 else 0.0
+    return rows, slope
+
+def _print_table(columns, rows):
+    print("  ".join("{:>14}".format(c) for c in columns))
+    for r in rows:
+        print("  ".join("{:>14}".format("{:.2f}".format(v) if isinstance(v, float) else str(v)) for v in r))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Catalog archived run logs in SQLite")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("ingest", help="add run files (or folders of them)")
+    p.add_argument("db")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--spec", default=DEFAULT_SPEC, help="paste spec for the passed column")
+    p = sub.add_parser("list", help="most recent runs")
+    p.add_argument("db")
+    p.add_argument("--profile", help="profile name or hash")
+    p.add_argument("--last", type=int, default=20)
+    p = sub.add_parser("drift", help="a metric over the last N runs and its trend")
+    p.add_argument("db")
+    p.add_argument("--metric", default="peak_c", choices=METRICS)
+    p.add_argument("--profile", help="profile name or hash")
+    p.add_argument("--board")
+    p.add_argument("--last", type=int, default=500)
+    p = sub.add_parser("sql", help="run a query")
+    p.add_argument("db")
+    p.add_argument("query")
+    args = ap.parse_args(argv)
+
+    db = connect(args.db)
+    if args.cmd == "ingest":
+        added, skipped, failed = ingest(db, args.paths, load_spec(args.spec))
+        print("added {}, already cataloged {}, failed {}".format(added, skipped, failed))
+    elif args.cmd == "list":
+        _print_table(*recent(db, args.profile, args.last))
+    elif args.cmd == "drift":
+        t0 = time.perf_counter()
+        rows, slope = drift(db, args.metric, args.profile, args.last, args.board)
+        ms = (time.perf_counter() - t0) * 1000
+        _print_table(("started", args.metric), rows)
+        print("{} runs, trend {:+.4f} per run ({:.1f} ms)".format(len(rows), slope, ms))
+    else:
+        cur = db.execute(args.query)
+        _print_table([d[0] for d in cur.description or ()], cur.fetchall())
+    db.close()
+
+if __name__ == "__main__":
+    main()
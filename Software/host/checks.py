@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# checks.py - Pass/fail checks of firmware behaviour on the simulated board
+#
+# Each check runs the real firmware modules on sim.py's virtual clock and
+# returns a list of failures; the script exits 1 if any check fails, like
+# analyze.py on a spec failure, so it can gate a commit or CI job.
+#
+#   heap   no control step keeps memory it allocates
+#   wait   while Reflow waits for a stage's lower bound, each control step
+#          runs the stage controller once and writes no Below Bound records
+#
+# The heap check measures heap growth only. It compares tracemalloc snapshots,
+# filtered to allocations made from firmware source lines, before and after N
+# warmed-up steps (clock tick, sample task, control()) of the sampler and the
+# Menu, Manual and Reflow modes, float and fixed point. A step that appends to
+# a list, caches per call or keeps log records fails it (past HEAP_SLACK bytes,
+# which N steps of even one small object exceed), naming the line that grew. It cannot see the short-lived floats and boxed ints that fill the
+# MicroPython heap between collections: CPython frees those at once, mostly
+# from free lists that tracemalloc never sees. Measuring them needs the board:
+# main.py ALLOC_CHECK prints gcpolicy.alloc_check()'s bytes per step.
+#
+#   python checks.py                  # every check
+#   python checks.py heap --steps 2000
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+from sim import Simulation
+from firmware import HERE, FIRMWARE, main_constants
+from logger import RingLogger
+from modes import MenuMode, ManualMode, ReflowMode, VIEW_WAITING
+from controller import CTRL_PID
+
+HEAP_FRAMES = 25        # Traceback depth kept, so a growth is credited to the firmware line behind it
+# A step replaces its latest reading, counters and timestamps with new objects, so
+# the live total wobbles by a few of them; a leak grows with the step count instead
+HEAP_SLACK = 512
+
+# ───── Control steps ─────
+
+def _stepper(s, mode):
+    """One control period as the runtime runs it: time passes, the sampler polls, control() runs"""
+    def step():
+        s.clock.advance(s.control_ms)
+        s.samplers.poll()
+        mode.control()
+    return step
+
+def _warm(step, seconds, control_ms):
+    for _ in range(int(seconds * 1000 / control_ms)):
+        step()
+
+def control_steps(warmup_s):
+    """(name, fn) pairs, each fn one warmed-up control step"""
+    consts = main_constants("reflow_profile", "stage_names", "P", "I", "D")
+    for fixed in (False, True):
+        tag = " (fixed)" if fixed else ""
+        s = Simulation(fixed=fixed)
+        yield "sample" + tag, s.sampler.sample
+
+        s = Simulation(fixed=fixed)
+        menu = MenuMode(s.display, s.encoder, s.sampler, s.ssr)
+        step = _stepper(s, menu)
+        _warm(step, warmup_s, s.control_ms)
+        yield "MENU" + tag, step
+
+        s = Simulation(fixed=fixed)
+        manual = ManualMode(s.display, s.encoder, s.sampler, s.ssr, fixed=fixed)
+        manual.setpoint = 150
+        step = _stepper(s, manual)
+        _warm(step, warmup_s, s.control_ms)
+        yield "MANUAL" + tag, step
+
+        s = Simulation(fixed=fixed)
+        # Buffered without flushing, as main.py's log task does the writes
+        logger = RingLogger(s.log_path("log.csv"), auto_flush=False)
+        debug_logger = RingLogger(s.log_path("debug_soak.log"), auto_flush=False)
+        reflow = ReflowMode(s.display, s.encoder, s.sampler, s.ssr, consts["reflow_profile"],
+                            consts["stage_names"], logger=logger, debug_logger=debug_logger,
+                            gains=(consts["P"], consts["I"], consts["D"]), run_dir=None, fixed=fixed)
+        reflow.enter()
+        step = _stepper(s, reflow)
+        _warm(step, warmup_s, s.control_ms)
+        yield "REFLOW" + tag, step
+
+# ───── Heap growth ─────
+
+def _firmware_bytes():
+    """Live traced bytes per firmware (file, line): each allocation goes to the innermost
+    firmware frame behind it, so a growth inside the HAL is charged to the firmware call"""
+    gc.collect()
+    sizes = {}
+    for trace in tracemalloc.take_snapshot().traces:
+        for frame in trace.traceback:
+            if frame.filename.startswith(FIRMWARE) and not frame.filename.startswith(HERE):
+                key = (frame.filename, frame.lineno)
+                sizes[key] = sizes.get(key, 0) + trace.size
+                break
+    return sizes
+
+def heap_growth(fn, n):
+    """Bytes that n calls of fn leave allocated from firmware lines, and (bytes, file, line) per line that grew"""
+    tracemalloc.start(HEAP_FRAMES)
+    try:
+        # Objects from before tracing started are invisible to it: run once traced so
+        # the state the step replaces every call (readings, counters) is counted both times
+        for _ in range(n):
+            fn()
+        before = _firmware_bytes()
+        for _ in range(n):
+            fn()
+        after = _firmware_bytes()
+    finally:
+        tracemalloc.stop()
+    grown = sorted(((size - before.get(key, 0),) + key for key, size in after.items()
+                    if size > before.get(key, 0)), reverse=True)
+    return sum(g[0] for g in grown), grown
+
+def check_heap(args):
+    failures = []
+    for name, fn in control_steps(args.warmup_s):
+        size, grown = heap_growth(fn, args.steps)
+        print("  {:18s} {:7d} B kept over {} steps".format(name, size, args.steps))
+        if size > HEAP_SLACK:
+            failures.append("{} keeps {} B over {} steps, most from {}:{}".format(
+                name, size, args.steps, os.path.relpath(grown[0][1], FIRMWARE), grown[0][2]))
+    return failures
+
+# ───── Waiting for a bound ─────
+
+def _counted(calls, key, fn):
+    def wrapper(*args):
+        calls[key] += 1
+        return fn(*args)
+    return wrapper
+
+def check_wait(args):
+    """A full reflow, checking every step spent waiting for a stage's lower bound"""
+    consts = main_constants("reflow_profile", "stage_names", "P", "I", "D")
+    failures = []
+    for fixed in (False, True):
+        tag = " (fixed)" if fixed else ""
+        s = Simulation(fixed=fixed)
+        mode = ReflowMode(s.display, s.encoder, s.sampler, s.ssr, consts["reflow_profile"],
+                          consts["stage_names"], logger=RingLogger(s.log_path("log.csv"), auto_flush=False),
+                          debug_logger=RingLogger(s.log_path("debug_soak.log"), auto_flush=False),
+                          gains=(consts["P"], consts["I"], consts["D"]), run_dir=None, fixed=fixed)
+        mode.enter()
+        calls = {"update": 0, "debug": 0}
+        update = "update_q" if fixed else "update"
+        setattr(mode.controller, update, _counted(calls, "update", getattr(mode.controller, update)))
+        mode.debug_logger.log = _counted(calls, "debug", mode.debug_logger.log)
+        step = _stepper(s, mode)
+        waits = pid_waits = 0
+        bad = []
+        for _ in range(int(args.max_s * 1000 / s.control_ms)):
+            calls["update"] = calls["debug"] = 0
+            step()
+            if mode.next_mode is not None:
+                break
+            if mode.view != VIEW_WAITING or mode.stage_start_time is not None:
+                continue
+            waits += 1
+            pid = mode.compiled.controls[mode.reflow_stage] == CTRL_PID
+            pid_waits += pid
+            if calls["update"] != pid or calls["debug"]:
+                bad.append("{:.2f} s: {} controller updates, {} debug records".format(
+                    s.clock.ticks_ms() / 1000, calls["update"], calls["debug"]))
+        print("  {:18s} {} waiting steps ({} under PID), {} wrong".format("REFLOW" + tag, waits, pid_waits, len(bad)))
+        if bad:
+            failures.append("REFLOW{} waiting steps: {} (first at {})".format(tag, len(bad), bad[0]))
+        elif not pid_waits:
+            failures.append("REFLOW{}: no step waited for a bound under PID; nothing checked".format(tag))
+    return failures
+
+CHECKS = {
+    "heap": check_heap,
+    "wait": check_wait,
+}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Pass/fail checks of the firmware on the simulated board")
+    ap.add_argument("checks", nargs="*", choices=[[]] + list(CHECKS), help="checks to run (default: all)")
+    ap.add_argument("--steps", type=int, default=1000, help="control steps measured per heap check")
+    ap.add_argument("--warmup-s", type=float, default=30, help="simulated seconds run before measuring")
+    ap.add_argument("--max-s", type=float, default=900, help="wait: give up on the reflow after this long")
+    args = ap.parse_args(argv)
+
+    failures = []
+    for name in args.checks or CHECKS:
+        print(name)
+        found = CHECKS[name](args)
+        failures += found
+        print("  " + ("FAIL" if found else "ok"))
+    for f in failures:
+        print("FAIL " + f)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# deploy.py - Cross-compile the firmware to .mpy and copy it to the Pico
+#
+# On power-up MicroPython compiles every imported .py from source, which for
+# modes.py and friends is most of the boot time. mpy-cross does that once on
+# the computer: every firmware module except main.py (the entry point has to
+# stay a .py) becomes a .mpy for the RP2040's Cortex-M0+ (armv6m, so
+# @micropython.native functions compile too). The .mpy files go up with
+# mpremote and any .py copies of the same modules on the board are removed,
+# since MicroPython imports a .py ahead of a .mpy.
+#
+# --manifest writes a manifest.py instead, for freezing the same modules into
+# a custom MicroPython build. They then run straight from flash with no load
+# step at import (delete any copies on the board's filesystem; those would
+# shadow them). --boot-time resets the board and reads the "boot: N ms" line
+# the firmware prints once the menu is on screen.
+#
+#   python deploy.py                          # compile into build/ only
+#   python deploy.py --port /dev/ttyACM0      # compile, upload, reset
+#   python deploy.py --port /dev/ttyACM0 --boot-time 5
+#   python deploy.py --manifest manifest.py
+#
+# mpy-cross comes from `pip install mpy-cross` (or a MicroPython build); its
+# version must match the firmware on the board. mpremote: `pip install mpremote`.
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import time
+
+from firmware import FIRMWARE
+
+ENTRY = "main.py"       # Run by MicroPython at boot; stays a source file
+ARCH = "armv6m"         # RP2040
+
+def modules(root=FIRMWARE):
+    """Firmware module file names, main.py excluded"""
+    return sorted(f for f in os.listdir(root) if f.endswith(".py") and f != ENTRY)
+
+def mpy_cross():
+    exe = shutil.which("mpy-cross")
+    if exe is None:
+        raise SystemExit("mpy-cross not found: pip install mpy-cross (matching the board's MicroPython)")
+    return exe
+
+def compile_all(names, out_dir, arch=ARCH, root=FIRMWARE):
+    """Compile names into out_dir; returns the .mpy paths"""
+    os.makedirs(out_dir, exist_ok=True)
+    exe = mpy_cross()
+    built = []
+    for name in names:
+        out = os.path.join(out_dir, name[:-3] + ".mpy")
+        subprocess.run([exe, "-march=" + arch, "-o", out, name], cwd=root, check=True)
+        built.append(out)
+    return built
+
+def write_manifest(path, names, root=FIRMWARE):
+    """manifest.py freezing the firmware modules (FROZEN_MANIFEST=... in a MicroPython build)"""
+    with open(path, "w") as f:
+        f.write("# Generated by host/deploy.py\n")
+        f.write('include("$(PORT_DIR)/boards/manifest.py")\n')
+        f.write("freeze({!r}, (\n".format(os.path.abspath(root)))
+        for name in names:
+            f.write("    {!r},\n".format(name))
+        f.write("))\n")
+
+# ───── Board ─────
+
+def mpremote(port, *args, check=True):
+    cmd = ["mpremote"] + (["connect", port] if port else []) + list(args)
+    return subprocess.run(cmd, check=check)
+
+def upload(port, built, names, root=FIRMWARE):
+    """Copy the .mpy files and main.py in one mpremote session, then drop stale .py copies"""
+    args = []
+    for path in built:
+        args += ["fs", "cp", path, ":" + os.path.basename(path), "+"]
+    args += ["fs", "cp", os.path.join(root, ENTRY), ":" + ENTRY]
+    mpremote(port, *args)
+    code = ("import os\nfor f in {!r}:\n try:\n  os.remove(f)\n except OSError:\n  pass\n").format(names)
+    mpremote(port, "exec", code)
+
+BOOT_LINE = re.compile(rb"boot: (\d+) ms")
+
+def boot_time(port, timeout_s=10.0):
+    """Reset the board and return the boot-to-menu ms it reports, or None"""
+    from monitor import open_port
+    mpremote(port, "reset", check=False)
+    t_end = time.monotonic() + timeout_s
+    tty = None
+    buf = b""
+    try:
+        while time.monotonic() < t_end:
+            if tty is None:
+                # The USB port disappears during the reset; retry until it is back
+                try:
+                    tty = open_port(port)
+                except OSError:
+                    time.sleep(0.05)
+                    continue
+            try:
+                data = tty.read(256)
+            except OSError:
+                tty = None
+                continue
+            if not data:
+                time.sleep(0.01)
+                continue
+            buf = (buf + data)[-256:]
+            m = BOOT_LINE.search(buf)
+            if m:
+                return int(m.group(1))
+    finally:
+        if tty is not None:
+            tty.close()
+    return None
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Cross-compile the firmware to .mpy and deploy it")
+    ap.add_argument("--port", help="upload to the board on this serial port (e.g. /dev/ttyACM0)")
+    ap.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "build"),
+                    help="directory for the .mpy files")
+    ap.add_argument("--arch", default=ARCH, help="mpy-cross -march value")
+    ap.add_argument("--exclude", action="append", default=[], metavar="MODULE",
+                    help="leave this module as source (e.g. config.py)")
+    ap.add_argument("--manifest", metavar="PATH", help="write a freeze manifest instead of compiling")
+    ap.add_argument("--no-upload", action="store_true", help="with --port: only measure --boot-time")
+    ap.add_argument("--boot-time", type=int, default=0, metavar="N",
+                    help="reset N times and report the boot-to-menu time")
+    args = ap.parse_args(argv)
+
+    names = [n for n in modules() if n not in args.exclude]
+    if args.manifest:
+        write_manifest(args.manifest, names)
+        print("wrote {} ({} modules)".format(args.manifest, len(names)))
+        return
+
+    if not args.no_upload:
+        built = compile_all(names, args.out, args.arch)
+        size = sum(os.path.getsize(p) for p in built)
+        print("compiled {} modules into {} ({} bytes)".format(len(built), args.out, size))
+        if args.port:
+            upload(args.port, built, names)
+            print("uploaded to {}".format(args.port))
+    if args.boot_time:
+        if not args.port:
+            ap.error("--boot-time needs --port")
+        times = []
+        for _ in range(args.boot_time):
+            ms = boot_time(args.port)
+            print("boot: {} ms".format("no report" if ms is None else ms))
+            if ms is not None:
+                times.append(ms)
+        if times:
+            print("boot-to-menu: min {} ms  mean {:.0f} ms  max {} ms".format(
+                min(times), sum(times) / len(times), max(times)))
+    elif args.port and not args.no_upload:
+        mpremote(args.port, "reset", check=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# firmware.py - Read settings out of the firmware sources without running them
+#
+# main.py only runs on the device (it starts the scheduler at import), so host
+# tools pull its literal assignments (profile, gains) out of the syntax tree.
+
+import ast
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIRMWARE = os.path.dirname(HERE)
+
+def main_constants(*names):
+    """Read literal assignments (e.g. reflow_profile) from main.py without running it"""
+    with open(os.path.join(FIRMWARE, "main.py")) as f:
+        tree = ast.parse(f.read())
+    found = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target = node.targets[0]
+            if isinstance(target, ast.Name) and target.id in names:
+                try:
+                    found[target.id] = ast.literal_eval(node.value)
+                except ValueError:
+                    pass
+    return found
@@ -0,0 +1,21 @@
+# hal - CPython stand-ins for the MicroPython modules the firmware imports
+#
+#   import hal
+#   clock = hal.install()      # before importing any firmware module
+#   import modes, ssr, ...     # now run unmodified on the virtual clock
+
+import sys
+
+from .clock import VirtualClock
+
+def install(clock=None):
+    """Register machine, utime, framebuf and micropython stand-ins in sys.modules"""
+    from . import utime, machine, framebuf, micropython
+    clock = clock or VirtualClock()
+    utime.clock = clock
+    machine.reset()
+    sys.modules["utime"] = utime
+    sys.modules["machine"] = machine
+    sys.modules["framebuf"] = framebuf
+    sys.modules["micropython"] = micropython
+    return clock
@@ -0,0 +1,44 @@
+# clock.py - Virtual millisecond clock shared by the HAL stand-ins
+#
+# Time only moves when advance() (or a sleep) is called. Timers fire at their
+# exact due time, and listeners (e.g. the plant model) are stepped up to each
+# event first, so an SSR edge in the middle of a step is integrated correctly.
+
+class VirtualClock:
+    def __init__(self):
+        self.now_us = 0
+        self.timers = []        # Active HAL Timer objects
+        self.listeners = []     # callables(dt_ms) stepped as time passes
+
+    def ticks_ms(self):
+        return self.now_us // 1000
+
+    def ticks_us(self):
+        return self.now_us
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def _move_to(self, t_us):
+        dt_us = t_us - self.now_us
+        if dt_us <= 0:
+            return
+        self.now_us = t_us
+        for fn in self.listeners:
+            fn(dt_us / 1000.0)
+
+    def advance_us(self, us):
+        end = self.now_us + us
+        while True:
+            due = None
+            for t in self.timers:
+                if t.due_us is not None and t.due_us <= end and (due is None or t.due_us < due.due_us):
+                    due = t
+            if due is None:
+                break
+            self._move_to(due.due_us)
+            due.fire()
+        self._move_to(end)
+
+    def advance(self, ms):
+        self.advance_us(int(ms * 1000))
@@ -0,0 +1,73 @@
+# devices.py - Simulated peripherals attached to the HAL buses
+
+class ThermocoupleModel:
+    """MAX6675 / MAX31855 stand-in answering SPI reads from a temperature source"""
+    def __init__(self, source, chip="MAX31855"):
+        self.source = source    # callable() -> temperature in C, or None for an open thermocouple
+        self.chip = chip
+
+    def read_frame(self, nbytes):
+        temp = self.source()
+        if self.chip == "MAX6675":
+            if temp is None:
+                return bytes((0x00, 0x04))
+            value = (max(0, int(temp * 4)) & 0xFFF) << 3
+            return bytes((value >> 8, value & 0xFF))
+        if temp is None:
+            return bytes((0x00, 0x01, 0x00, 0x01))  # Fault + open circuit
+        value = (int(temp * 4) & 0x3FFF) << 18
+        internal = (25 * 16) << 4
+        word = value | internal
+        return bytes(((word >> 24) & 0xFF, (word >> 16) & 0xFF, (word >> 8) & 0xFF, word & 0xFF))
+
+class SSD1309Panel:
+    """Keeps the panel's GDDRAM in sync with the command/data stream"""
+    # Commands followed by argument bytes
+    _ARGS = {0x81: 1, 0xA8: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1, 0x8D: 1, 0x20: 1,
+             0x21: 2, 0x22: 2}
+
+    def __init__(self, width=128, height=64):
+        self.width = width
+        self.pages = height // 8
+        self.ram = bytearray(width * self.pages)
+        self.col0, self.col1 = 0, width - 1
+        self.page0, self.page1 = 0, self.pages - 1
+        self.col, self.page = 0, 0
+        self.on = False
+
+    def write(self, data):
+        if not data:
+            return
+        if data[0] == 0x40:
+            self._data(data[1:])
+        else:
+            self._commands(data[1:])
+
+    def _commands(self, cmds):
+        i = 0
+        while i < len(cmds):
+            c = cmds[i]
+            n = self._ARGS.get(c, 0)
+            args = cmds[i + 1:i + 1 + n]
+            if c == 0x21:
+                self.col0, self.col1 = args[0], args[1]
+                self.col = self.col0
+            elif c == 0x22:
+                self.page0, self.page1 = args[0], args[1]
+                self.page = self.page0
+            elif 0xB0 <= c <= 0xB7:
+                self.page = c - 0xB0
+            elif c == 0xAF:
+                self.on = True
+            elif c == 0xAE:
+                self.on = False
+            i += 1 + n
+
+    def _data(self, data):
+        for b in data:
+            self.ram[self.page * self.width + self.col] = b
+            if self.col >= self.col1:
+                self.col = self.col0
+                self.page = self.page + 1 if self.page < self.page1 else self.page0
+            else:
+                self.col += 1
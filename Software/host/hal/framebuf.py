@@ -0,0 +1,119 @@
+# framebuf stand-in (MONO_VLSB only, which is what the SSD1309 driver uses)
+#
+# text() draws deterministic 8x8 placeholder glyphs rather than the real
+# MicroPython font: good enough for the driver's dirty tracking and for
+# checking what changed on screen, not for pixel-exact screenshots.
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+def _glyph(ch):
+    c = ord(ch)
+    if c == 32:
+        return bytes(8)
+    return bytes(((c * (k + 3) * 37) & 0x7E) | 0x02 if k < 7 else 0 for k in range(8))
+
+_glyphs = {}
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError("only MONO_VLSB is supported")
+        self.buf = buffer
+        self.width = width
+        self.height = height
+
+    def fill(self, c):
+        v = 0xFF if c else 0x00
+        self.buf[:] = bytes([v]) * len(self.buf)
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        i = (y >> 3) * self.width + x
+        m = 1 << (y & 7)
+        if c is None:
+            return 1 if self.buf[i] & m else 0
+        if c:
+            self.buf[i] |= m
+        else:
+            self.buf[i] &= ~m & 0xFF
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(0, x)
+        x1 = min(self.width, x + w)
+        if x1 <= x0:
+            return
+        for yy in range(max(0, y), min(self.height, y + h)):
+            base = (yy >> 3) * self.width
+            m = 1 << (yy & 7)
+            buf = self.buf
+            if c:
+                for i in range(base + x0, base + x1):
+                    buf[i] |= m
+            else:
+                nm = ~m & 0xFF
+                for i in range(base + x0, base + x1):
+                    buf[i] &= nm
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x0, y0, x1, y1, c):
+        dx = abs(x1 - x0)
+        dy = -abs(y1 - y0)
+        sx = 1 if x0 < x1 else -1
+        sy = 1 if y0 < y1 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x0, y0, c)
+            if x0 == x1 and y0 == y1:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+
+    def text(self, s, x, y, c=1):
+        for n, ch in enumerate(s):
+            g = _glyphs.get(ch)
+            if g is None:
+                g = _glyphs[ch] = _glyph(ch)
+            cx = x + n * 8
+            for col in range(8):
+                bits = g[col]
+                for row in range(8):
+                    if bits & (1 << row):
+                        self.pixel(cx + col, y + row, c)
+
+    def scroll(self, xstep, ystep):
+        w, h = self.width, self.height
+        old = [[self.pixel(x, y) for x in range(w)] for y in range(h)]
+        for y in range(h):
+            for x in range(w):
+                sx, sy = x - xstep, y - ystep
+                if 0 <= sx < w and 0 <= sy < h:
+                    self.pixel(x, y, old[sy][sx])
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for yy in range(fbuf.height):
+            for xx in range(fbuf.width):
+                c = fbuf.pixel(xx, yy)
+                if c != key:
+                    self.pixel(x + xx, y + yy, c)
@@ -0,0 +1,174 @@
+# machine stand-in: Pin, SPI, I2C and Timer for running the firmware on CPython
+#
+# Pins with the same id share one level, so the SSR pin the firmware drives
+# is the same one the plant model reads. SPI reads are answered by whichever
+# attached device has its chip select low; I2C writes go to the device
+# attached at the target address.
+
+from . import utime
+
+_levels = {}        # pin id -> level
+_irqs = {}          # pin id -> [(trigger, handler, pin)]
+_spi_devices = {}   # cs pin id -> device with read_frame(nbytes) -> bytes
+_i2c_devices = {}   # address -> device with write(data: bytes)
+
+def pin_level(pin_id):
+    return _levels.get(pin_id, 0)
+
+def drive(pin_id, level):
+    """Set an input pin from the outside (encoder, button), firing its IRQs"""
+    old = _levels.get(pin_id, 0)
+    _levels[pin_id] = level
+    if level == old:
+        return
+    edge = Pin.IRQ_RISING if level else Pin.IRQ_FALLING
+    for trigger, handler, pin in _irqs.get(pin_id, ()):
+        if trigger & edge:
+            handler(pin)
+
+def attach_spi(cs_pin_id, device):
+    _spi_devices[cs_pin_id] = device
+
+def attach_i2c(addr, device):
+    _i2c_devices[addr] = device
+
+def reset():
+    _levels.clear()
+    _irqs.clear()
+    _spi_devices.clear()
+    _i2c_devices.clear()
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=IN, pull=None, value=None):
+        self.id = id
+        self.mode = mode
+        if value is not None:
+            _levels[id] = value
+        elif id not in _levels:
+            _levels[id] = 1 if pull == Pin.PULL_UP else 0
+
+    def value(self, v=None):
+        if v is None:
+            return _levels.get(self.id, 0)
+        _levels[self.id] = 1 if v else 0
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        _irqs.setdefault(self.id, []).append((trigger, handler, self))
+
+class SPI:
+    def __init__(self, id, baudrate=1000000, polarity=0, phase=0, sck=None, mosi=None, miso=None):
+        self.id = id
+
+    def _selected(self):
+        for cs, dev in _spi_devices.items():
+            if _levels.get(cs, 1) == 0:
+                return dev
+        return None
+
+    def read(self, nbytes, write=0x00):
+        dev = self._selected()
+        if dev is None:
+            return bytes([0xFF] * nbytes)
+        return bytes(dev.read_frame(nbytes))
+
+    def readinto(self, buf, write=0x00):
+        data = self.read(len(buf), write)
+        buf[:] = data
+
+    def write(self, buf):
+        pass
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+        self.bytes = 0
+        self.transactions = 0
+
+    def _send(self, addr, data):
+        self.bytes += len(data)
+        self.transactions += 1
+        dev = _i2c_devices.get(addr)
+        if dev is not None:
+            dev.write(data)
+
+    def writeto(self, addr, buf, stop=True):
+        self._send(addr, bytes(buf))
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        data = b"".join(bytes(v) for v in vector)
+        self._send(addr, data)
+        return len(data)
+
+    def scan(self):
+        return sorted(_i2c_devices)
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, period=-1, callback=None, freq=None):
+        self.due_us = None
+        self.period_us = 0
+        self.mode = mode
+        self.callback = None
+        if callback is not None:
+            self.init(mode=mode, period=period, callback=callback, freq=freq)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=None):
+        if freq is not None:
+            period = 1000 / freq
+        self.mode = mode
+        self.callback = callback
+        self.period_us = max(1, int(period * 1000))
+        self.due_us = utime.clock.now_us + self.period_us
+        if self not in utime.clock.timers:
+            utime.clock.timers.append(self)
+
+    def deinit(self):
+        self.due_us = None
+        if self in utime.clock.timers:
+            utime.clock.timers.remove(self)
+
+    def fire(self):
+        if self.mode == Timer.PERIODIC:
+            self.due_us += self.period_us
+        else:
+            self.deinit()
+        if self.callback is not None:
+            self.callback(self)
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+        self.fed_at = utime.ticks_ms()
+
+    def feed(self):
+        self.fed_at = utime.ticks_ms()
+
+def freq(hz=None):
+    return 125000000
+
+def reset_cause():
+    return 0
+
+def unique_id():
+    return b"\x00" * 8
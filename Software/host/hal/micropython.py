@@ -0,0 +1,22 @@
+# micropython stand-in: decorators become no-ops on CPython
+
+def const(x):
+    return x
+
+def native(f):
+    return f
+
+def viper(f):
+    return f
+
+def schedule(fn, arg):
+    fn(arg)
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+def mem_info(*args):
+    pass
+
+def kbd_intr(chr):
+    pass
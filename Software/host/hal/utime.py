@@ -0,0 +1,34 @@
+# utime stand-in driven by the virtual clock
+import time as _time
+
+clock = None    # Set by hal.install()
+
+def ticks_ms():
+    return clock.ticks_ms()
+
+def ticks_us():
+    return clock.ticks_us()
+
+def ticks_cpu():
+    return clock.ticks_us()
+
+def ticks_diff(a, b):
+    return a - b
+
+def ticks_add(a, b):
+    return a + b
+
+def sleep_ms(ms):
+    clock.advance(ms)
+
+def sleep_us(us):
+    clock.advance_us(us)
+
+def sleep(s):
+    clock.advance(s * 1000)
+
+def time():
+    return clock.now_us // 1000000
+
+def localtime(secs=None):
+    return _time.gmtime(secs if secs is not None else time())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# logdecode.py - Decode binary run logs (runs/run_NNNN.rfl) written by binlog.py
+#
+# A file is a fixed header, the run's meta text and a stream of key records
+# (absolute values) each followed by a run of 5-byte delta records. Every
+# run of deltas is decoded at once: the bytes are viewed as an (n, 5) array,
+# the run ends at the first row whose dt byte is the key marker, and a
+# cumulative sum on top of the key record rebuilds time and values.
+#
+# The result has the CSV log's columns (Time, Stage, Temp, Setpoint, Output,
+# RampRate), so analyze.py, sysid.py and catalog.py read .rfl files directly.
+#
+#   python logdecode.py runs/run_0007.rfl                  # summary
+#   python logdecode.py runs/run_0007.rfl --csv run_0007.csv
+#   python logdecode.py runs/run_0007.rfl --npy run_0007.npy
+
+import argparse
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b"RFLG"
+HEADER_FMT = "<4sBBHHHHHH"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+KEY = 0xFF
+KEY_DTYPE = np.dtype([("marker", "u1"), ("stage", "u1"), ("t", "<u4"), ("v", "<i2", 4)])
+DELTA_SIZE = 5
+NAN = -32768
+CSV_COLUMNS = "Time,Stage,Temp,Setpoint,Output,RampRate\n"
+SCAN_ROWS = 4096    # Delta rows searched for the next key before widening the search
+
+def read_file(path):
+    """(info dict, meta text, record bytes) of a binary log"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER_SIZE:
+        raise ValueError("{}: too short for a binary log header".format(path))
+    magic, version, flags, period_ms, s0, s1, s2, s3, meta_len = struct.unpack_from(HEADER_FMT, data)
+    if magic != MAGIC:
+        raise ValueError("{}: not a binary run log".format(path))
+    if version != 1:
+        raise ValueError("{}: unsupported binary log version {}".format(path, version))
+    info = {"version": version, "flags": flags, "period_ms": period_ms, "scales": (s0, s1, s2, s3)}
+    meta = data[HEADER_SIZE:HEADER_SIZE + meta_len].decode("utf-8", "replace")
+    return info, meta, memoryview(data)[HEADER_SIZE + meta_len:]
+
+def read_meta(path):
+    """'# key: value' fields of the meta text (same as analyze.read_header on a CSV)"""
+    fields = {}
+    for line in read_file(path)[1].splitlines():
+        if not line.startswith("#"):
+            break
+        key, sep, value = line[1:].partition(":")
+        if sep:
+            fields[key.strip()] = value.strip()
+    return fields
+
+def _delta_run(raw, pos):
+    """Number of whole delta records starting at pos before the next key (or the end)"""
+    rows = SCAN_ROWS
+    while True:
+        avail = (len(raw) - pos) // DELTA_SIZE
+        n = min(rows, avail)
+        dts = raw[pos:pos + n * DELTA_SIZE:DELTA_SIZE]
+        hit = np.flatnonzero(dts == KEY)
+        if len(hit):
+            return int(hit[0])
+        if n == avail:
+            return n
+        rows *= 4
+
+def decode_records(records, scales):
+    """(n, 6) float array in CSV column order from the record bytes"""
+    raw = np.frombuffer(records, dtype=np.uint8)
+    scale = np.asarray(scales, dtype=float)
+    parts = []
+    pos = 0
+    while pos + KEY_DTYPE.itemsize <= len(raw):
+        if raw[pos] != KEY:
+            raise ValueError("corrupt record stream at byte {}".format(pos))
+        key = np.frombuffer(raw, dtype=KEY_DTYPE, count=1, offset=pos)[0]
+        pos += KEY_DTYPE.itemsize
+        n = _delta_run(raw, pos)
+        deltas = raw[pos:pos + n * DELTA_SIZE].reshape(n, DELTA_SIZE)
+        pos += n * DELTA_SIZE
+
+        t = np.empty(n + 1, dtype=np.int64)
+        t[0] = key["t"]
+        t[1:] = deltas[:, 0]
+        v = np.empty((n + 1, 4), dtype=np.int32)
+        v[0] = key["v"]
+        v[1:] = deltas[:, 1:].view(np.int8)
+        np.cumsum(t, out=t)
+        np.cumsum(v, axis=0, out=v)
+
+        block = np.empty((n + 1, 6))
+        block[:, 0] = t / 1000.0
+        block[:, 1] = key["stage"]
+        block[:, 2:] = v / scale
+        block[:, 2:][v == NAN] = np.nan
+        parts.append(block)
+    # A trailing partial record (power cut mid-write) is ignored
+    return np.concatenate(parts) if parts else np.empty((0, 6))
+
+def decode(path):
+    """(info, meta text, (n, 6) array) for a binary log"""
+    info, meta, records = read_file(path)
+    return info, meta, decode_records(records, info["scales"])
+
+def write_csv(path, meta, data):
+    """CSV in the firmware's RingLogger format, meta lines kept as the header"""
+    with open(path, "w") as f:
+        f.write(meta if meta.endswith(CSV_COLUMNS) else meta + CSV_COLUMNS)
+        for row in data:
+            f.write("{0:.3f},{1:.0f},{2:.1f},{3:.1f},{4:.1f},{5:.1f}\n".format(*row))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Decode a binary run log (.rfl)")
+    ap.add_argument("log")
+    ap.add_argument("--csv", metavar="OUT", help="write the records as a CSV log")
+    ap.add_argument("--npy", metavar="OUT", help="write the records as a memory-mappable .npy")
+    args = ap.parse_args(argv)
+
+    info, meta, data = decode(args.log)
+    if args.csv:
+        write_csv(args.csv, meta, data)
+        print("wrote {} rows to {}".format(len(data), args.csv))
+    if args.npy:
+        np.save(args.npy, data)
+        print("wrote {} rows to {}".format(len(data), args.npy))
+    if not (args.csv or args.npy):
+        sys.stdout.write(meta)
+        span = data[-1, 0] - data[0, 0] if len(data) else 0.0
+        print("{} records over {:.1f} s, period {} ms, scales {}".format(
+            len(data), span, info["period_ms"], info["scales"]))
+
+if __name__ == "__main__":
+    main()
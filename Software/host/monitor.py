@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# monitor.py - Live telemetry from the hotplate over USB serial
+#
+# Decodes the framed binary stream from the firmware's telemetry.py (enable
+# TELEMETRY in main.py), prints or plots it live and records it as a CSV in
+# the run-log format, so analyze.py and sysid.py read the recording too.
+# Commands (setpoint, start, abort, profile upload, sample rate) are sent
+# once the port is open and their ACKs reported.
+#
+# The port is opened with pyserial when it is installed, otherwise as a raw
+# POSIX tty, which also works against the simulator's pty:
+#
+#   python monitor.py /dev/ttyACM0 --record run.csv --plot
+#   python monitor.py /dev/ttyACM0 --profile profile.json --start
+#   python sim.py --serve --speed 10                  # prints "telemetry on /dev/pts/N"
+#   python monitor.py /dev/pts/N --start --seconds 30 --record sim.csv
+#   python monitor.py --sim --start --seconds 30     # does both of the above
+
+import argparse
+import json
+import math
+import os
+import struct
+import subprocess
+import sys
+import time
+
+# Must match telemetry.py
+SYNC = b"\xa5\x5a"
+FR_SAMPLE = 0x01
+FR_ACK = 0x02
+TM_SETPOINT = 0x10
+TM_START = 0x11
+TM_ABORT = 0x12
+TM_PROFILE = 0x13
+TM_RATE = 0x14
+SAMPLE = struct.Struct("<IhhhhBBH")
+FLAG_NO_READING = 0x01
+COMMAND_NAMES = {TM_SETPOINT: "setpoint", TM_START: "start", TM_ABORT: "abort",
+                 TM_PROFILE: "profile", TM_RATE: "rate"}
+
+CSV_HEADER = "Time,Stage,Temp,Setpoint,Output,RampRate,StepUs\n"
+
+def crc8(data):
+    c = 0
+    for b in data:
+        c ^= b
+        for _ in range(8):
+            c = ((c << 1) ^ 0x07) & 0xFF if c & 0x80 else (c << 1) & 0xFF
+    return c
+
+def frame(ftype, seq, payload=b""):
+    body = bytes((ftype, seq & 0xFF, len(payload))) + payload
+    return SYNC + body + bytes((crc8(body),))
+
+# ───── Port ─────
+
+class RawPort:
+    """Non-blocking POSIX tty (a pty from sim.py, or /dev/ttyACM* without pyserial)"""
+    def __init__(self, path):
+        import tty
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(self.fd)
+
+    def read(self, n=4096):
+        try:
+            return os.read(self.fd, n)
+        except BlockingIOError:
+            return b""
+
+    def write(self, data):
+        return os.write(self.fd, data)
+
+    def close(self):
+        os.close(self.fd)
+
+def open_port(path, baud=115200):
+    try:
+        import serial
+    except ImportError:
+        return RawPort(path)
+    return serial.Serial(path, baud, timeout=0)
+
+# ───── Decoding ─────
+
+class Decoder:
+    """Byte stream in, (type, seq, payload) frames out; counts CRC errors and lost frames"""
+    def __init__(self):
+        self.buf = bytearray()
+        self.last_seq = None
+        self.frames = 0
+        self.crc_errors = 0
+        self.lost = 0
+
+    def feed(self, data):
+        self.buf += data
+        buf = self.buf
+        out = []
+        while True:
+            i = buf.find(SYNC)
+            if i < 0:
+                del buf[:max(0, len(buf) - 1)]
+                return out
+            if len(buf) < i + 5:
+                del buf[:i]
+                return out
+            n = buf[i + 4]
+            end = i + 6 + n
+            if len(buf) < end:
+                del buf[:i]
+                return out
+            body = bytes(buf[i + 2:end - 1])
+            if crc8(body) != buf[end - 1]:
+                self.crc_errors += 1
+                del buf[:i + 1]     # Resync on the next marker
+                continue
+            del buf[:end]
+            ftype, seq = body[0], body[1]
+            if self.last_seq is not None:
+                self.lost += (seq - self.last_seq - 1) & 0xFF
+            self.last_seq = seq
+            self.frames += 1
+            out.append((ftype, seq, body[3:]))
+
+def decode_sample(payload):
+    """(t s, stage, temp, target, output, ramp, step us); temp is NaN without a reading"""
+    t, temp, target, output, ramp, stage, flags, step_us = SAMPLE.unpack(payload)
+    temp = math.nan if flags & FLAG_NO_READING else temp / 10
+    target = math.nan if target == -32768 else target / 10
+    return t / 1000, stage, temp, target, output / 10, ramp / 100, step_us
+
+# ───── Commands ─────
+
+def commands(args):
+    """(type, payload) for the command-line options, in a sensible order"""
+    cmds = []
+    if args.rate:
+        cmds.append((TM_RATE, struct.pack("<H", args.rate)))
+    if args.profile:
+        with open(args.profile) as f:
+            stages = json.load(f)
+        cmds.append((TM_PROFILE, b"".join(struct.pack("<HHH", *map(int, s[:3])) for s in stages)))
+    if args.setpoint is not None:
+        cmds.append((TM_SETPOINT, struct.pack("<h", int(round(args.setpoint * 10)))))
+    if args.abort:
+        cmds.append((TM_ABORT, b""))
+    if args.start:
+        cmds.append((TM_START, b""))
+    return cmds
+
+# ───── Live view ─────
+
+class Plot:
+    def __init__(self, window_s):
+        import matplotlib.pyplot as plt
+        self.plt = plt
+        self.window_s = window_s
+        plt.ion()
+        self.fig, self.ax = plt.subplots()
+        self.ax2 = self.ax.twinx()
+        self.temp_line, = self.ax.plot([], [], label="temp")
+        self.target_line, = self.ax.plot([], [], "--", label="target")
+        self.out_line, = self.ax2.plot([], [], color="tab:red", alpha=0.4, label="output %")
+        self.ax.set_xlabel("s")
+        self.ax.set_ylabel("C")
+        self.ax2.set_ylim(0, 105)
+        self.ax.legend(loc="upper left")
+        self.rows = []
+
+    def add(self, row):
+        self.rows.append(row)
+
+    def draw(self):
+        rows = [r for r in self.rows if r[0] >= self.rows[-1][0] - self.window_s] if self.rows else []
+        self.rows = rows
+        if rows:
+            t = [r[0] for r in rows]
+            self.temp_line.set_data(t, [r[2] for r in rows])
+            self.target_line.set_data(t, [r[3] for r in rows])
+            self.out_line.set_data(t, [r[4] for r in rows])
+            self.ax.relim()
+            self.ax.autoscale_view()
+            self.ax2.set_xlim(self.ax.get_xlim())
+        self.plt.pause(0.001)
+
+def spawn_sim(speed):
+    """Start sim.py --serve and return (process, pty path)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.Popen([sys.executable, os.path.join(here, "sim.py"), "--serve", "--speed", str(speed),
+                             "--seconds", "36000"], stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith("telemetry on "):
+        proc.kill()
+        raise RuntimeError("sim.py --serve did not start: {!r}".format(line))
+    return proc, line.split()[-1]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Live telemetry from the hotplate")
+    ap.add_argument("port", nargs="?", help="serial port (e.g. /dev/ttyACM0, COM3, or a sim.py pty)")
+    ap.add_argument("--sim", action="store_true", help="start sim.py --serve and connect to its pty")
+    ap.add_argument("--speed", type=float, default=10.0, help="--sim: simulated seconds per second")
+    ap.add_argument("--baud", type=int, default=115200)
+    ap.add_argument("--record", metavar="CSV", help="write samples in the run-log CSV format")
+    ap.add_argument("--plot", action="store_true", help="live plot (needs matplotlib)")
+    ap.add_argument("--window", type=float, default=300, help="plot window, s")
+    ap.add_argument("--quiet", action="store_true", help="no per-sample output")
+    ap.add_argument("--seconds", type=float, help="stop after this long (default: until Ctrl-C)")
+    ap.add_argument("--setpoint", type=float, help="set the manual-mode setpoint, C")
+    ap.add_argument("--start", action="store_true", help="start a reflow (board must be in the menu)")
+    ap.add_argument("--abort", action="store_true", help="stop the running manual/reflow mode")
+    ap.add_argument("--profile", metavar="JSON", help="upload stages [[duration, lower, upper], ...]")
+    ap.add_argument("--rate", type=int, metavar="MS", help="telemetry sample period, ms")
+    args = ap.parse_args(argv)
+    if not args.port and not args.sim:
+        ap.error("give a port or --sim")
+
+    proc = None
+    if args.sim:
+        proc, args.port = spawn_sim(args.speed)
+        print("simulator on {}".format(args.port))
+    port = open_port(args.port, args.baud)
+    decoder = Decoder()
+    plot = Plot(args.window) if args.plot else None
+    record = open(args.record, "w") if args.record else None
+    if record:
+        record.write("# source: telemetry {}\n".format(args.port))
+        record.write(CSV_HEADER)
+
+    pending = {}
+    for seq, (cmd, payload) in enumerate(commands(args)):
+        port.write(frame(cmd, seq, payload))
+        pending[seq] = cmd
+
+    samples = 0
+    t_end = time.monotonic() + args.seconds if args.seconds else None
+    next_draw = 0.0
+    try:
+        while t_end is None or time.monotonic() < t_end:
+            data = port.read(4096)
+            if not data:
+                time.sleep(0.01)
+            for ftype, seq, payload in decoder.feed(data or b""):
+                if ftype == FR_ACK and len(payload) == 3:
+                    cmd, cseq, ok = payload
+                    if pending.pop(cseq, None) == cmd:
+                        print("{}: {}".format(COMMAND_NAMES.get(cmd, hex(cmd)), "ok" if ok else "refused"))
+                elif ftype == FR_SAMPLE and len(payload) == SAMPLE.size:
+                    row = decode_sample(payload)
+                    samples += 1
+                    if record:
+                        record.write("{:.3f},{},{:.1f},{:.1f},{:.1f},{:.2f},{}\n".format(*row))
+                    if plot:
+                        plot.add(row)
+                    if not args.quiet:
+                        print("{:9.2f}s  stage {}  {:6.1f} C  target {:6.1f}  out {:5.1f}%  {:+.2f} C/s  "
+                              "{} us".format(*row))
+            if plot and time.monotonic() >= next_draw:
+                next_draw = time.monotonic() + 0.5
+                plot.draw()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        port.close()
+        if record:
+            record.close()
+        if proc:
+            proc.terminate()
+            proc.wait()
+    for seq, cmd in pending.items():
+        print("{}: no reply".format(COMMAND_NAMES.get(cmd, hex(cmd))))
+    print("{} samples, {} frames lost, {} CRC errors".format(samples, decoder.lost, decoder.crc_errors))
+
+if __name__ == "__main__":
+    main()
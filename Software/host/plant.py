@@ -0,0 +1,64 @@
+# plant.py - Lumped-parameter thermal model of the hotplate
+#
+#   heater element --k_couple--> plate --k_loss--> ambient
+#                                  |
+#                                  +--(first-order lag tc_tau)--> thermocouple
+#
+# The heater dumps power_w into a small element mass whenever the SSR pin is
+# high; the element heats the plate mass, the plate loses heat to ambient,
+# and the thermocouple sees the plate through its own lag. Defaults are sized
+# for the 850 W repair hotplate: ~2.5 C/s peak ramp, ~350 C at full power.
+
+import random
+from hal.machine import pin_level
+
+class HotplatePlant:
+    def __init__(self, power_w=850.0, heater_c=60.0, plate_c=280.0, k_couple=15.0,
+                 k_loss=2.4, tc_tau=1.5, ambient=25.0, noise_sd=0.0, ssr_pin=16, seed=None):
+        self.power_w = power_w
+        self.heater_c = heater_c    # J/K
+        self.plate_c = plate_c      # J/K
+        self.k_couple = k_couple    # W/K element -> plate
+        self.k_loss = k_loss        # W/K plate -> ambient
+        self.tc_tau = tc_tau        # s
+        self.ambient = ambient
+        self.noise_sd = noise_sd
+        self.ssr_pin = ssr_pin
+        self.rng = random.Random(seed)
+        self.open_circuit = False   # Simulate a broken thermocouple
+        self.energy_j = 0.0
+        self.reset()
+
+    def reset(self, temp=None):
+        t = self.ambient if temp is None else temp
+        self.heater_t = t
+        self.plate_t = t
+        self.sensor_t = t
+
+    def heater_on(self):
+        return pin_level(self.ssr_pin)
+
+    def step(self, dt_ms, u=None):
+        """Advance the model by dt_ms with heater input u (0..1, default: SSR pin)"""
+        if u is None:
+            u = self.heater_on()
+        dt = dt_ms / 1000.0
+        # Sub-step so explicit Euler stays well inside the fastest time constant
+        n = int(dt / 0.05) + 1
+        h = dt / n
+        for _ in range(n):
+            q_in = self.power_w * u
+            q_couple = self.k_couple * (self.heater_t - self.plate_t)
+            q_loss = self.k_loss * (self.plate_t - self.ambient)
+            self.heater_t += h * (q_in - q_couple) / self.heater_c
+            self.plate_t += h * (q_couple - q_loss) / self.plate_c
+            self.sensor_t += h * (self.plate_t - self.sensor_t) / self.tc_tau
+            self.energy_j += q_in * h
+
+    def reading(self):
+        """What the thermocouple reports, or None when open"""
+        if self.open_circuit:
+            return None
+        if self.noise_sd:
+            return self.sensor_t + self.rng.gauss(0.0, self.noise_sd)
+        return self.sensor_t
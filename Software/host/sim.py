@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# sim.py - Run the unmodified firmware modes against the plant model
+#
+# The HAL stand-ins replace machine/utime/framebuf/micropython, so display.py,
+# encoder.py, thermocouple.py, ssr.py, sampler.py and modes.py are the real
+# firmware. Time is virtual: a full reflow profile runs in well under a
+# second of wall time.
+#
+#   python sim.py                      # reflow with main.py's profile
+#   python sim.py --manual 150 --seconds 600
+#   python sim.py --autotune 150
+#   python sim.py --csv trace.csv --render
+#   python sim.py --serve              # telemetry on a pty, driven by host/monitor.py
+#   python sim.py --fixed              # Manual/Reflow on the fixed-point pipeline
+#   python sim.py --render --graph     # graph view; prints I2C bytes per frame
+#   python sim.py --zones 3            # multi-zone reflow, one plant per zone
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tty
+
+from firmware import HERE, FIRMWARE, main_constants
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+if FIRMWARE not in sys.path:
+    sys.path.insert(1, FIRMWARE)
+
+import hal
+hal.install()
+
+import machine
+from hal.devices import ThermocoupleModel, SSD1309Panel
+from plant import HotplatePlant
+from display import Display
+from encoder import RotaryEncoder
+from thermocouple import MAX31855, MAX6675, shared_spi
+from sampler import Sampler
+from estimator import FixedEstimator
+from fixedpoint import from_q
+from ssr import SSR
+from logger import RingLogger
+from binlog import BinaryLogger
+from dualcore import ControlLink, ControlCore, LogQueue
+from modes import MenuMode, ManualMode, ReflowMode, ZoneReflowMode, AutotuneMode, TUNE_RUNNING
+from zones import Zone, ZoneSet
+from runtime import Runtime
+from telemetry import Telemetry, RemoteControl
+
+# Pin assignments mirror main.py
+SSR_PIN = 16
+ENC_CLK, ENC_DT, ENC_BUTTON = 10, 11, 12
+TC_SCK, TC_CS, TC_MISO = 6, 5, 4
+# --zones: (SSR pin, CS pin) per zone; zone 0 is the pins above
+ZONE_PINS = ((SSR_PIN, TC_CS), (17, 7), (18, 8), (19, 9))
+OLED_ADDR = 0x3C
+
+class Simulation:
+    def __init__(self, plant=None, control_ms=10, render=False, chip="MAX31855", log_dir=None,
+                 dual_core=False, fixed=False, graph=False, zones=1):
+        if fixed and zones > 1:
+            # As main.py refuses FIXED_POINT with ZONES
+            raise ValueError("fixed-point control has no multi-zone Reflow")
+        self.clock = hal.install()
+        self.plant = plant or HotplatePlant()
+        self.clock.add_listener(self.plant.step)
+        self.control_ms = control_ms
+        self.render = render
+        self.log_dir = log_dir or tempfile.mkdtemp(prefix="reflow-sim-")
+        if log_dir:
+            # The firmware's loggers swallow open errors, so a missing directory would log nothing
+            os.makedirs(log_dir, exist_ok=True)
+        # Dual-core: the control side goes through dualcore's link, stepped in turn with core 0
+        self.dual_core = dual_core
+        self.queues = []
+        self.fixed = fixed      # Integer estimator and control steps (main.py FIXED_POINT)
+        self.graph = graph      # Manual/Reflow graph view (main.py GRAPH_VIEW)
+        self.frame_bytes = []   # I2C bytes of each rendered frame
+
+        machine.attach_spi(TC_CS, ThermocoupleModel(self.plant.reading, chip))
+        # Extra zones: their own plant each, a little weaker and leakier per zone, so
+        # the controllers have different work to do
+        self.plants = [self.plant]
+        for k in range(1, zones):
+            plant = HotplatePlant(power_w=self.plant.power_w * (1 - 0.08 * k),
+                                  k_loss=self.plant.k_loss * (1 + 0.15 * k), noise_sd=self.plant.noise_sd,
+                                  ssr_pin=ZONE_PINS[k][0], seed=k + 1)
+            self.clock.add_listener(plant.step)
+            machine.attach_spi(ZONE_PINS[k][1], ThermocoupleModel(plant.reading, "MAX31855"))
+            self.plants.append(plant)
+        self.panel = SSD1309Panel()
+        machine.attach_i2c(OLED_ADDR, self.panel)
+
+        self.display = Display()
+        self.encoder = RotaryEncoder(clk=ENC_CLK, dt=ENC_DT, button=ENC_BUTTON)
+        if chip == "MAX6675":
+            thermo = MAX6675(clk=TC_SCK, cs=TC_CS, do=TC_MISO)
+        else:
+            thermo = MAX31855(sck=TC_SCK, cs=TC_CS, miso=TC_MISO)
+        self.sampler = Sampler(thermo, estimator=FixedEstimator(thermo.CONVERSION_MS) if fixed else None)
+        self.ssr = SSR(pin=SSR_PIN, window_ms=1000, min_on_ms=50)
+        self.zones = None
+        if zones > 1:
+            # As main.py with ZONES set: one shared bus, zone 0 is the sampler/SSR above
+            spi = shared_spi(sck=TC_SCK, miso=TC_MISO)
+            zone_list = [Zone("Z0", self.sampler, self.ssr)]
+            for k in range(1, zones):
+                ssr_pin, cs_pin = ZONE_PINS[k]
+                zone_list.append(Zone("Z{}".format(k), Sampler(MAX31855(cs=cs_pin, spi=spi)),
+                                      SSR(pin=ssr_pin, window_ms=1000, min_on_ms=50)))
+            self.zones = ZoneSet(zone_list)
+        self.samplers = self.zones or self.sampler
+        self.overlap_ms = 0     # Time with more than one zone's heater on
+        self.heat_ms = 0        # ...and with any on
+        self.plate_peaks = [p.plate_t for p in self.plants]
+
+        # (time s, measured C, plate C, target C, ssr) once per new sample
+        self.trace = []
+        self.events = []    # (time ms, callable) scripted inputs
+
+    def log_path(self, name):
+        return os.path.join(self.log_dir, name)
+
+    def at(self, t_s, fn):
+        """Schedule a scripted input (e.g. self.press) at sim time t_s"""
+        self.events.append((int(t_s * 1000), fn))
+        self.events.sort(key=lambda e: e[0])
+
+    def press(self, hold_ms=100):
+        """Push the encoder button now; it is released hold_ms later"""
+        machine.drive(ENC_BUTTON, 0)
+        self.at((self.clock.ticks_ms() + hold_ms) / 1000.0, lambda: machine.drive(ENC_BUTTON, 1))
+
+    def run(self, mode, max_s=3600, target_of=None, until=None):
+        """Run one mode until it requests another one, until(mode) is true, or max_s. Returns the requested mode."""
+        mode.next_mode = None
+        mode.enter()
+        if self.dual_core:
+            link = ControlLink()
+            core = ControlCore(link, self.samplers)
+            mode.mailbox = link
+            mode.on_switch = link.request_switch
+            link.set_mode(mode)
+        end = self.clock.ticks_ms() + int(max_s * 1000)
+        next_ui = self.clock.ticks_ms()
+        next_log = next_ui
+        last_seq = -1
+        while self.clock.ticks_ms() < end:
+            self.clock.advance(self.control_ms)
+            now = self.clock.ticks_ms()
+            while self.events and self.events[0][0] <= now:
+                self.events.pop(0)[1]()
+            if self.dual_core:
+                mode.input()
+                core.step()
+                mode.next_mode = link.take_switch()
+                if now >= next_log or mode.next_mode is not None:
+                    next_log = now + 500
+                    for q in self.queues:
+                        q.poll()
+            else:
+                self.samplers.poll()
+                mode.input()
+                if mode.next_mode is None:
+                    mode.control()
+            if self.zones is not None:
+                on = sum(machine.pin_level(p.ssr_pin) for p in self.plants)
+                if on:
+                    self.heat_ms += self.control_ms
+                if on > 1:
+                    self.overlap_ms += self.control_ms
+                for k, p in enumerate(self.plants):
+                    if p.plate_t > self.plate_peaks[k]:
+                        self.plate_peaks[k] = p.plate_t
+            if self.sampler.seq != last_seq:
+                last_seq = self.sampler.seq
+                target = target_of(mode) if target_of else None
+                self.trace.append((now / 1000.0, self.sampler.temp, self.plant.plate_t,
+                                   target, machine.pin_level(SSR_PIN)))
+            if mode.next_mode is not None:
+                return mode.next_mode
+            if until is not None and until(mode):
+                break
+            if self.render and now >= next_ui:
+                next_ui = now + 200
+                mode.render()
+                self.frame_bytes.append(self.display.oled.frame_bytes)
+        self.ssr.off()
+        if self.zones is not None:
+            self.zones.off()
+        return None
+
+    def reflow(self, profile, stage_names, max_s=3600, gains=None, binary_log=False, tuning=None,
+               target_of=None):
+        logger = BinaryLogger(self.log_path("log.rfl")) if binary_log else RingLogger(self.log_path("log.csv"))
+        debug_logger = RingLogger(self.log_path("debug_soak.log"))
+        if self.dual_core:
+            logger, debug_logger = LogQueue(logger), LogQueue(debug_logger)
+            self.queues = [logger, debug_logger]
+        if self.zones is not None:
+            mode = ZoneReflowMode(self.display, self.encoder, self.zones, profile, stage_names,
+                                  logger=logger, run_dir=self.log_path("runs"), graph=self.graph)
+            self.mode = mode
+            return self.run(mode, max_s, target_of=target_of or (lambda m: m.target_temp))
+        mode = ReflowMode(self.display, self.encoder, self.sampler, self.ssr, profile, stage_names,
+                          logger=logger, debug_logger=debug_logger, gains=gains,
+                          run_dir=self.log_path("runs"), fixed=self.fixed, graph=self.graph)
+        if tuning:
+            # As main.py applies tuning.json
+            mode.apply_tuning(tuning)
+            self.ssr.min_on_ms = tuning.get("min_on_ms", self.ssr.min_on_ms)
+        self.mode = mode
+        if target_of is None:
+            target_of = lambda m: from_q(m.target_q) if m.fixed else m.target_temp
+        return self.run(mode, max_s, target_of=target_of)
+
+    def manual(self, setpoint, seconds):
+        mode = ManualMode(self.display, self.encoder, self.sampler, self.ssr, fixed=self.fixed, graph=self.graph)
+        mode.setpoint = setpoint
+        self.mode = mode
+        return self.run(mode, seconds, target_of=lambda m: m.setpoint)
+
+    def autotune(self, setpoint, max_s=3600):
+        mode = AutotuneMode(self.display, self.encoder, self.sampler, self.ssr, setpoint=setpoint,
+                            logger=RingLogger(self.log_path("autotune.csv")),
+                            tuning_path=self.log_path("tuning.json"), timeout_s=max_s)
+        self.mode = mode
+        self.run(mode, max_s, target_of=lambda m: m.setpoint, until=lambda m: m.state != TUNE_RUNNING)
+        return mode.result
+
+    def serve(self, profile, stage_names, gains=None, max_s=3600, speed=1.0, period_ms=100):
+        """Menu, Manual and Reflow under a Runtime, streaming telemetry on a pty in (speed x) real time.
+        Commands from the host (host/monitor.py) drive the mode changes."""
+        master, slave = os.openpty()
+        tty.setraw(slave)   # No echo or line editing: the stream is binary
+        os.set_blocking(master, False)
+        port = os.fdopen(master, "r+b", buffering=0)
+        modes = {
+            "MENU": MenuMode(self.display, self.encoder, self.sampler, self.ssr),
+            "MANUAL": ManualMode(self.display, self.encoder, self.sampler, self.ssr),
+            "REFLOW": ReflowMode(self.display, self.encoder, self.sampler, self.ssr, profile, stage_names,
+                                 logger=RingLogger(self.log_path("log.csv")),
+                                 debug_logger=RingLogger(self.log_path("debug_soak.log")), gains=gains,
+                                 run_dir=self.log_path("runs")),
+        }
+        runtime = Runtime(modes, "MENU")
+        telemetry = Telemetry(runtime.publish, port, port, period_ms=period_ms,
+                              on_command=RemoteControl(runtime, profile))
+        print("telemetry on {}".format(os.ttyname(slave)), flush=True)
+
+        start = self.clock.ticks_ms()
+        wall0 = time.monotonic()
+        last_seq = -1
+        try:
+            while self.clock.ticks_ms() - start < max_s * 1000:
+                self.clock.advance(self.control_ms)
+                now = self.clock.ticks_ms()
+                self.sampler.poll()
+                if runtime.pending_mode is not None:
+                    runtime.set_mode(runtime.pending_mode)
+                    runtime.pending_mode = None
+                runtime.control()
+                if now % 20 == 0:
+                    telemetry.poll()
+                if self.sampler.seq != last_seq:
+                    last_seq = self.sampler.seq
+                    self.trace.append((now / 1000.0, self.sampler.temp, self.plant.plate_t, None,
+                                       machine.pin_level(SSR_PIN)))
+                ahead = (now - start) / 1000.0 / speed - (time.monotonic() - wall0)
+                if ahead > 0:
+                    time.sleep(ahead)
+        except KeyboardInterrupt:
+            pass
+        self.ssr.off()
+        port.close()
+        os.close(slave)
+        return telemetry.stats()
+
+    def summary(self):
+        temps = [row[1] for row in self.trace if row[1] is not None]
+        return {
+            "sim_s": self.clock.ticks_ms() / 1000.0,
+            "samples": len(self.trace),
+            "peak_c": max(temps) if temps else None,
+            "plate_peak_c": max(row[2] for row in self.trace) if self.trace else None,
+            "energy_kj": self.plant.energy_j / 1000.0,
+        }
+
+    def write_csv(self, path):
+        with open(path, "w") as f:
+            f.write("Time,Temp,Plate,Target,SSR\n")
+            for t, temp, plate, target, on in self.trace:
+                f.write("{:.3f},{},{:.2f},{},{}\n".format(
+                    t, "" if temp is None else "{:.2f}".format(temp), plate,
+                    "" if target is None else "{:.2f}".format(target), on))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run the firmware against a simulated hotplate")
+    ap.add_argument("--manual", type=float, metavar="SETPOINT", help="run manual mode instead of a reflow")
+    ap.add_argument("--autotune", type=float, metavar="SETPOINT", help="run the relay autotune instead")
+    ap.add_argument("--seconds", type=float, default=600, help="manual mode run time / reflow time limit")
+    ap.add_argument("--control-ms", type=int, default=10, help="control step (ms of virtual time)")
+    ap.add_argument("--render", action="store_true", help="also run the display path every 200 ms")
+    ap.add_argument("--chip", choices=("MAX31855", "MAX6675"), default="MAX31855")
+    ap.add_argument("--noise", type=float, default=0.0, help="thermocouple noise SD in C")
+    ap.add_argument("--csv", help="write the sampled trace here")
+    ap.add_argument("--binary-log", action="store_true", help="reflow run file in binlog.py's format")
+    ap.add_argument("--dual-core", action="store_true",
+                    help="drive Manual/Reflow through dualcore.py's mailbox, state and log queues")
+    ap.add_argument("--serve", action="store_true",
+                    help="stream telemetry on a pty and take commands from host/monitor.py")
+    ap.add_argument("--speed", type=float, default=1.0, help="--serve: virtual seconds per wall second")
+    ap.add_argument("--fixed", action="store_true", help="fixed-point estimator and Manual/Reflow steps")
+    ap.add_argument("--graph", action="store_true", help="Manual/Reflow graph view (with --render)")
+    ap.add_argument("--zones", type=int, default=1, choices=range(1, len(ZONE_PINS) + 1),
+                    help="reflow several zones from one loop (zones.py), each on its own plant")
+    ap.add_argument("--log-dir", help="where the firmware's own logs go (default: temp dir)")
+    args = ap.parse_args(argv)
+
+    sim = Simulation(plant=HotplatePlant(noise_sd=args.noise, seed=1), control_ms=args.control_ms,
+                     render=args.render, chip=args.chip, log_dir=args.log_dir,
+                     dual_core=args.dual_core, fixed=args.fixed, graph=args.graph,
+                     zones=args.zones)
+    wall = time.perf_counter()
+    if args.serve:
+        consts = main_constants("reflow_profile", "stage_names", "P", "I", "D")
+        stats = sim.serve(consts["reflow_profile"], consts["stage_names"], (consts["P"], consts["I"], consts["D"]),
+                          max_s=args.seconds, speed=args.speed)
+        print("telemetry: {}".format(stats))
+    elif args.manual is not None:
+        sim.manual(args.manual, args.seconds)
+    elif args.autotune is not None:
+        result = sim.autotune(args.autotune, max_s=max(args.seconds, 1800))
+        print("autotune: {}".format(result if result else sim.mode.message))
+    else:
+        consts = main_constants("reflow_profile", "stage_names", "P", "I", "D")
+        result = sim.reflow(consts["reflow_profile"], consts["stage_names"], max_s=args.seconds,
+                            gains=(consts["P"], consts["I"], consts["D"]), binary_log=args.binary_log)
+        if result is None:
+            print("reflow did not finish within {} s".format(args.seconds))
+    wall = time.perf_counter() - wall
+
+    s = sim.summary()
+    print("simulated {:.1f} s in {:.3f} s wall ({:.0f}x real time)".format(
+        s["sim_s"], wall, s["sim_s"] / wall if wall else 0))
+    print("peak {:.1f} C (plate {:.1f} C), {} samples, {:.1f} kJ".format(
+        s["peak_c"] or 0, s["plate_peak_c"] or 0, s["samples"], s["energy_kj"]))
+    if sim.zones is not None:
+        print("zones: peak {} C; >1 heater on {:.1f}% of heating time".format(
+            " / ".join("{:.1f}".format(peak) for peak in sim.plate_peaks),
+            100.0 * sim.overlap_ms / sim.heat_ms if sim.heat_ms else 0.0))
+    if sim.frame_bytes:
+        fb = sim.frame_bytes
+        print("display: {} frames, {:.0f} B/frame mean, {} max after the first".format(
+            len(fb), sum(fb) / len(fb), max(fb[1:], default=0)))
+    print("firmware logs in {}".format(sim.log_dir))
+    if args.csv:
+        sim.write_csv(args.csv)
+
+if __name__ == "__main__":
+    main()
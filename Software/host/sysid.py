@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# sysid.py - Fit a thermal model to a logged run and derive tuning values
+#
+# Reads the firmware's log.csv (or autotune.csv): Time, Temp and Output are
+# resampled onto a uniform grid and a discrete model is fitted by linear
+# least squares for every candidate dead time; the best fit wins.
+#
+#   fopdt     T[k+1] = a T[k] + b u[k-d] + c
+#   two-mass  T[k+1] = a1 T[k] + a2 T[k-1] + b u[k-d] + c
+#
+# The two-mass fit is reduced to an equivalent first-order-plus-dead-time
+# model (Skogestad's half rule). IMC tuning rules then give the PID gains,
+# and the plant gain/time constant give the feedforward terms. The result
+# is written as tuning.json; copy it to the Pico next to main.py.
+#
+#   python sysid.py log.csv                       # writes tuning.json
+#   python sysid.py autotune.csv --ambient 25 --model two-mass
+
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+
+from analyze import iter_chunks, T, TEMP, OUT
+from firmware import main_constants
+
+def load_log(path):
+    """Time (s), Temp (C) and Output (%) columns of a firmware CSV log"""
+    data = np.concatenate(list(iter_chunks(path)))
+    t, temp, out = data[:, T], data[:, TEMP], data[:, OUT]
+    ok = np.isfinite(t) & np.isfinite(temp) & np.isfinite(out)
+    t, temp, out = t[ok], temp[ok], out[ok]
+    order = np.argsort(t, kind="stable")
+    return t[order], temp[order], out[order]
+
+def resample(t, temp, out, dt):
+    """Uniform grid: temperature interpolated, output held (it's a duty command)"""
+    grid = np.arange(t[0], t[-1], dt)
+    y = np.interp(grid, t, temp)
+    idx = np.clip(np.searchsorted(t, grid, side="right") - 1, 0, len(out) - 1)
+    return grid, y, out[idx]
+
+def _regress(columns, target):
+    A = np.column_stack(columns)
+    coef, _, _, _ = np.linalg.lstsq(A, target, rcond=None)
+    resid = target - A @ coef
+    return coef, float(resid @ resid)
+
+def fit(y, u, dt, model="fopdt", max_dead_s=15.0, ambient=None):
+    """Best-fitting model over dead times 0..max_dead_s. Returns a dict of parameters."""
+    # A known ambient pins the DC gain on runs that never leave one temperature (autotune)
+    if ambient is not None:
+        y = y - ambient
+    best = None
+    start = 1 if model == "two-mass" else 0
+    for d in range(0, int(max_dead_s / dt) + 1):
+        k0 = max(start, d)
+        n = len(y) - 1 - k0
+        if n < 10:
+            break
+        target = y[k0 + 1:]
+        ud = u[k0 - d:len(y) - 1 - d]
+        if model == "two-mass":
+            columns = [y[k0:-1], y[k0 - 1:-2], ud]
+        else:
+            columns = [y[k0:-1], ud]
+        if ambient is None:
+            columns.append(np.ones(n))
+        coef, sse = _regress(columns, target)
+        if ambient is not None:
+            coef = np.append(coef, 0.0)
+        if best is None or sse < best[1]:
+            best = (d, sse, coef, n)
+    if best is None:
+        raise ValueError("log too short to fit")
+    d, sse, coef, n = best
+    theta = d * dt + dt / 2     # Zero-order hold adds half a step of delay
+    rms = math.sqrt(sse / n)
+
+    if model == "two-mass":
+        a1, a2, b, c = coef
+        poles = np.roots([1.0, -a1, -a2])
+        if np.any(np.abs(poles.imag) > 1e-9):
+            raise ValueError("two-mass fit has complex poles {}; try --model fopdt".format(poles))
+        # A pole at or below zero is a lag shorter than dt: treat it as none
+        lags = [p for p in poles.real if 0 < p < 1]
+        if not lags or any(p >= 1 for p in poles.real):
+            raise ValueError("two-mass fit is not stable: poles {}".format(poles))
+        taus = sorted((-dt / math.log(p) for p in lags), reverse=True) + [0.0]
+        gain = b / (1 - a1 - a2)
+        ambient = c / (1 - a1 - a2) + (ambient or 0.0)
+        tau1, tau2 = taus[0], taus[1]
+        # Half rule: half the small lag goes to the time constant, half to the dead time
+        return {"model": model, "K": gain, "tau": tau1 + tau2 / 2, "theta": theta + tau2 / 2,
+                "tau1": tau1, "tau2": tau2, "ambient": ambient, "rms": rms, "dt": dt}
+
+    a, b, c = coef
+    if not 0 < a < 1:
+        raise ValueError("fit is not a stable first-order lag (a = {:.4f})".format(a))
+    return {"model": model, "K": b / (1 - a), "tau": -dt / math.log(a), "theta": theta,
+            "ambient": c / (1 - a) + (ambient or 0.0), "rms": rms, "dt": dt}
+
+def tuning(params, lam=None, profile=None, stage_names=None):
+    """Firmware tuning dict (see config.py) from fitted FOPDT parameters"""
+    K, tau, theta = params["K"], params["tau"], params["theta"]
+    if lam is None:
+        lam = max(theta, 0.1 * tau)     # Closed-loop time constant
+    # IMC PID for a first-order-plus-dead-time plant
+    kc = (tau + theta / 2) / (K * (lam + theta / 2))
+    ti = tau + theta / 2
+    td = tau * theta / (2 * tau + theta)
+    values = {
+        "P": round(kc, 3),
+        "I": round(kc / ti, 4),
+        "D": round(kc * td, 3),
+        "feedforward": round(tau / K, 2),           # % per C/s of setpoint slope
+        "hold_feedforward": round(1 / K, 4),        # % per C above ambient
+        "cutoff_k": round(theta, 2),                # s the temperature keeps climbing after cutoff
+        "source": "sysid-" + params["model"],
+    }
+    if profile and stage_names:
+        # Fraction of full power that holds each stage's top temperature
+        comp = {}
+        for name, stage in zip(stage_names, profile):
+            hold = (max(stage[1], stage[2]) - params["ambient"]) / K / 100
+            comp[name] = round(min(1.0, max(0.05, hold)), 3)
+        values["compensation"] = comp
+    return values
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fit a thermal model to a firmware log and derive tuning")
+    ap.add_argument("log", help="log.csv or autotune.csv from the device")
+    ap.add_argument("--model", choices=("fopdt", "two-mass"), default="fopdt")
+    ap.add_argument("--dt", type=float, default=0.5, help="resampling step, s")
+    ap.add_argument("--max-dead", type=float, default=15.0, help="longest dead time to try, s")
+    ap.add_argument("--lambda", dest="lam", type=float, help="closed-loop time constant, s (default: dead time)")
+    ap.add_argument("--ambient", type=float, help="fix ambient temperature, C (recommended for autotune logs)")
+    ap.add_argument("--skip", type=float, default=0.0, help="ignore the first SKIP seconds of the log")
+    ap.add_argument("--out", default="tuning.json", help="tuning file to write (existing keys are kept)")
+    args = ap.parse_args(argv)
+
+    t, temp, out = load_log(args.log)
+    keep = t >= t[0] + args.skip
+    grid, y, u = resample(t[keep], temp[keep], out[keep], args.dt)
+    params = fit(y, u, args.dt, args.model, args.max_dead, args.ambient)
+
+    consts = main_constants("reflow_profile", "stage_names")
+    values = tuning(params, args.lam, consts.get("reflow_profile"), consts.get("stage_names"))
+
+    print("{model}: K={K:.3f} C/%  tau={tau:.1f} s  theta={theta:.1f} s  ambient={ambient:.1f} C  "
+          "rms={rms:.3f} C".format(**params))
+    existing = {}
+    if os.path.exists(args.out):
+        with open(args.out) as f:
+            existing = json.load(f)
+    existing.update(values)
+    with open(args.out, "w") as f:
+        json.dump(existing, f, indent=1, sort_keys=True)
+    print(json.dumps(values, sort_keys=True))
+    print("wrote {}".format(args.out))
+
+if __name__ == "__main__":
+    main()
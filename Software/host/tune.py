@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# tune.py - Search ReflowMode's tuning values with simulated reflows
+#
+# Each candidate is a full reflow of main.py's profile: the real ReflowMode,
+# sampler and SSR driver running on sim.py's virtual clock against the
+# plant.py thermal model. Candidates are spread over all cores with
+# multiprocessing and scored on
+#
+#   overshoot  plate peak above the profile's highest temperature, C
+#   tracking   RMS of measured minus target while a heated stage runs, C
+#   cycle      time to finish the profile, min (max_s if it never does)
+#
+# score = w_overshoot * overshoot + w_tracking * tracking + w_cycle * cycle.
+# Search is a grid or uniform random sample over the parameter ranges,
+# optionally followed by --refine rounds that sample again in ranges shrunk
+# around the best candidate so far. The winner is merged into tuning.json
+# (see config.py); copy that to the Pico next to main.py.
+#
+#   python tune.py --samples 400                      # random search, all cores
+#   python tune.py --grid 3 --param P=3:9 --param D=5:25 --fix window_ms
+#   python tune.py --samples 200 --refine 2 --plant plant.json --noise 0.3
+
+import argparse
+import csv
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from firmware import main_constants
+from plant import HotplatePlant
+
+# name: (low, high, integer) around main.py/modes.py defaults; keys are tuning.json keys
+SPACE = {
+    "P": (2.0, 12.0, False),
+    "I": (0.05, 0.8, False),
+    "D": (5.0, 30.0, False),
+    "feedforward": (10.0, 60.0, False),
+    "hold_feedforward": (0.1, 0.5, False),
+    "max_ramp_rate": (1.5, 3.0, False),
+    "window_ms": (500, 2000, True),
+    "min_on_ms": (20, 100, True),
+}
+
+WEIGHTS = {"overshoot": 2.0, "tracking": 1.0, "cycle": 0.5}
+
+# ───── Candidate runs (worker processes) ─────
+
+_worker = {}
+
+def _init_worker(config, log_root):
+    _worker.update(config)
+    _worker["log_dir"] = tempfile.mkdtemp(prefix="w{}-".format(os.getpid()), dir=log_root)
+
+def evaluate(values):
+    """Run one reflow with these tuning values; returns the metrics dict"""
+    from sim import Simulation
+    cfg = _worker
+    plant = HotplatePlant(noise_sd=cfg["noise"], seed=cfg["seed"], **cfg["plant"])
+    sim = Simulation(plant=plant, control_ms=cfg["control_ms"], log_dir=cfg["log_dir"])
+    result = sim.reflow(cfg["profile"], cfg["stage_names"], max_s=cfg["max_s"], tuning=values,
+                        target_of=_running_target)
+    metrics = score(sim.trace, cfg["profile"], result is not None, cfg["max_s"], cfg["weights"])
+    metrics["values"] = values
+    return metrics
+
+def _running_target(mode):
+    # Only heated stages whose timer runs count towards tracking: not waiting for a
+    # lower bound, and not cooldown, where the heater is off whatever the tuning
+    from modes import VIEW_ACTIVE
+    from controller import CTRL_OFF
+    cp = mode.compiled
+    if mode.view != VIEW_ACTIVE or mode.reflow_stage >= cp.count or cp.controls[mode.reflow_stage] == CTRL_OFF:
+        return None
+    return mode.target_temp
+
+def score(trace, profile, finished, max_s, weights):
+    """Overshoot, tracking error and cycle time of a sim trace, and their weighted sum"""
+    peak = max((row[2] for row in trace), default=0.0)
+    top = max(max(stage[1], stage[2]) for stage in profile)
+    errors = [row[1] - row[3] for row in trace if row[1] is not None and row[3] is not None]
+    tracking = math.sqrt(sum(e * e for e in errors) / len(errors)) if errors else float("inf")
+    cycle_min = (trace[-1][0] if finished and trace else max_s) / 60.0
+    overshoot = max(0.0, peak - top)
+    return {
+        "score": (weights["overshoot"] * overshoot + weights["tracking"] * tracking
+                  + weights["cycle"] * cycle_min),
+        "overshoot": overshoot,
+        "tracking": tracking,
+        "cycle_min": cycle_min,
+        "finished": finished,
+    }
+
+# ───── Search ─────
+
+def _value(lo, hi, integer, x):
+    v = lo + (hi - lo) * x
+    return int(round(v)) if integer else round(v, 4)
+
+def grid(space, n):
+    """n points per parameter, every combination"""
+    names = list(space)
+    total = n ** len(names)
+    for k in range(total):
+        values = {}
+        for name in names:
+            k, i = divmod(k, n)
+            lo, hi, integer = space[name]
+            values[name] = _value(lo, hi, integer, i / (n - 1) if n > 1 else 0.5)
+        yield values
+
+def sample(space, n, rng):
+    for _ in range(n):
+        yield {name: _value(lo, hi, integer, rng.random()) for name, (lo, hi, integer) in space.items()}
+
+def shrink(space, best, factor):
+    """Ranges of width factor x the current ones, centred on best and kept inside the old ones"""
+    out = {}
+    for name, (lo, hi, integer) in space.items():
+        half = (hi - lo) * factor / 2
+        c = min(hi - half, max(lo + half, best[name]))
+        out[name] = (c - half, c + half, integer)
+    return out
+
+def run_batch(pool, candidates, fixed, results, progress=True):
+    """Evaluate candidates (plus the fixed values) in the pool; appends to results"""
+    batch = [dict(c, **fixed) for c in candidates]
+    t0 = time.perf_counter()
+    for i, m in enumerate(pool.imap_unordered(evaluate, batch, chunksize=4), 1):
+        results.append(m)
+        if progress and (i % 50 == 0 or i == len(batch)):
+            best = min(results, key=lambda r: r["score"])
+            print("  {}/{}  best score {:.2f}  ({:.1f} runs/s)".format(
+                i, len(batch), best["score"], i / (time.perf_counter() - t0)), flush=True)
+    return min(results, key=lambda r: r["score"])
+
+# ───── Command line ─────
+
+def parse_ranges(items, space):
+    """--param NAME=LO:HI overrides on a copy of space"""
+    space = dict(space)
+    for item in items:
+        name, _, rng = item.partition("=")
+        if name not in SPACE:
+            raise SystemExit("unknown parameter {!r} (one of {})".format(name, ", ".join(SPACE)))
+        lo, _, hi = rng.partition(":")
+        space[name] = (float(lo), float(hi), SPACE[name][2])
+    return space
+
+def write_csv(path, results):
+    names = list(SPACE)
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["score", "overshoot", "tracking", "cycle_min", "finished"] + names)
+        for r in sorted(results, key=lambda r: r["score"]):
+            w.writerow(["{:.4f}".format(r["score"]), "{:.3f}".format(r["overshoot"]),
+                        "{:.3f}".format(r["tracking"]), "{:.2f}".format(r["cycle_min"]), int(r["finished"])]
+                       + [r["values"].get(n, "") for n in names])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Tune ReflowMode against the simulated hotplate")
+    ap.add_argument("--samples", type=int, default=200, help="random candidates (ignored with --grid)")
+    ap.add_argument("--grid", type=int, metavar="N", help="N values per parameter instead of random")
+    ap.add_argument("--refine", type=int, default=0, help="extra rounds around the best candidate")
+    ap.add_argument("--shrink", type=float, default=0.4, help="range factor per refine round")
+    ap.add_argument("--param", action="append", default=[], metavar="NAME=LO:HI", help="override a range")
+    ap.add_argument("--fix", action="append", default=[], metavar="NAME",
+                    help="leave a parameter at its firmware default (not searched)")
+    ap.add_argument("--plant", help="JSON of HotplatePlant keyword arguments (power_w, k_loss, ...)")
+    ap.add_argument("--noise", type=float, default=0.0, help="thermocouple noise SD in C")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--control-ms", type=int, default=10)
+    ap.add_argument("--max-s", type=float, default=900, help="give up on a run after this long")
+    ap.add_argument("--w-overshoot", type=float, default=WEIGHTS["overshoot"])
+    ap.add_argument("--w-tracking", type=float, default=WEIGHTS["tracking"])
+    ap.add_argument("--w-cycle", type=float, default=WEIGHTS["cycle"])
+    ap.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    ap.add_argument("--csv", help="write every candidate and its metrics here")
+    ap.add_argument("--out", default="tuning.json", help="tuning file to write (existing keys are kept)")
+    args = ap.parse_args(argv)
+
+    space = parse_ranges(args.param, SPACE)
+    for name in args.fix:
+        space.pop(name, None)
+    plant = {}
+    if args.plant:
+        with open(args.plant) as f:
+            plant = json.load(f)
+    consts = main_constants("reflow_profile", "stage_names")
+    config = {
+        "profile": consts["reflow_profile"], "stage_names": consts["stage_names"], "plant": plant,
+        "noise": args.noise, "seed": args.seed, "control_ms": args.control_ms, "max_s": args.max_s,
+        "weights": {"overshoot": args.w_overshoot, "tracking": args.w_tracking, "cycle": args.w_cycle},
+    }
+    rng = random.Random(args.seed)
+    if args.grid:
+        candidates = list(grid(space, args.grid))
+    else:
+        candidates = list(sample(space, args.samples, rng))
+
+    log_root = tempfile.mkdtemp(prefix="reflow-tune-")
+    results = []
+    wall = time.perf_counter()
+    try:
+        with multiprocessing.Pool(args.jobs, _init_worker, (config, log_root)) as pool:
+            # Baseline: the firmware defaults, so the winner can be compared to what's there
+            baseline = pool.apply(evaluate, ({},))
+            print("defaults: score {score:.2f}  overshoot {overshoot:.2f} C  tracking {tracking:.2f} C  "
+                  "cycle {cycle_min:.2f} min".format(**baseline))
+            print("{} candidates on {} processes".format(len(candidates), args.jobs))
+            best = run_batch(pool, candidates, {}, results)
+            for r in range(args.refine):
+                space = shrink(space, best["values"], args.shrink)
+                print("refine {}: {} candidates".format(r + 1, args.samples))
+                best = run_batch(pool, sample(space, args.samples, rng), {}, results)
+    finally:
+        shutil.rmtree(log_root, ignore_errors=True)
+    wall = time.perf_counter() - wall
+
+    print("{} runs in {:.1f} s".format(len(results) + 1, wall))
+    print("best: score {score:.2f}  overshoot {overshoot:.2f} C  tracking {tracking:.2f} C  "
+          "cycle {cycle_min:.2f} min{}".format("" if best["finished"] else "  (did not finish)", **best))
+    if args.csv:
+        write_csv(args.csv, results)
+    if best["score"] >= baseline["score"]:
+        print("no candidate beat the defaults; {} not written".format(args.out))
+        return
+
+    values = dict(best["values"], source="tune")
+    existing = {}
+    if os.path.exists(args.out):
+        with open(args.out) as f:
+            existing = json.load(f)
+    existing.update(values)
+    with open(args.out, "w") as f:
+        json.dump(existing, f, indent=1, sort_keys=True)
+    print(json.dumps(values, sort_keys=True))
+    print("wrote {}".format(args.out))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# instrument.py - Hot-path timing probes and a control-loop deadline monitor
+#
+# Each probe keeps a count, total, min, max and a log2 histogram of its
+# durations (ticks_us) in preallocated arrays; recording allocates nothing.
+# Probes are attached by wrapping callables (runtime tasks, sampler reads,
+# log flushes, display page transfers), so with INSTRUMENT off in main.py
+# nothing is wrapped and the hot path is exactly what it was. `enabled` pauses
+# recording at run time.
+#
+# The deadline monitor watches the gap between control task starts. A gap
+# longer than the period plus slack is an overrun, blamed on whichever probe
+# ran longest since the previous control run ("other" when none stands out:
+# GC, interrupts, the scheduler itself).
+
+from array import array
+import sys
+import utime
+
+BINS = 12           # Histogram bin k counts durations below 64 << k us; the last bin is open-ended
+MAX_PROBES = 16
+OTHER = MAX_PROBES  # Overrun cause slot when no probe is to blame
+
+class Instruments:
+    def __init__(self, period_us=10000, slack_us=2000):
+        self.enabled = True
+        self.period_us = period_us
+        self.slack_us = slack_us
+        self.names = []
+
+        self.counts = array('i', [0] * MAX_PROBES)
+        self.seconds = array('i', [0] * MAX_PROBES)     # Total time = seconds + micros
+        self.micros = array('i', [0] * MAX_PROBES)
+        self.mins = array('i', [0] * MAX_PROBES)
+        self.maxs = array('i', [0] * MAX_PROBES)
+        self.hist = array('i', [0] * (MAX_PROBES * BINS))
+
+        # Deadline monitor
+        self.control = -1           # Probe index of the control task
+        self.last_control_us = None
+        self.worst = -1             # Longest-running probe since the last control run
+        self.worst_us = 0
+        self.loops = 0
+        self.overrun_total = 0
+        self.overruns = array('i', [0] * (MAX_PROBES + 1))
+        self.max_gap_us = 0
+
+    # ───── Probes ─────
+    def probe(self, name):
+        """Index of the named probe, registering it on first use"""
+        if name in self.names:
+            return self.names.index(name)
+        if len(self.names) == MAX_PROBES:
+            raise ValueError("too many probes")
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def record(self, i, us):
+        n = self.counts[i]
+        if n == 0 or us < self.mins[i]:
+            self.mins[i] = us
+        if us > self.maxs[i]:
+            self.maxs[i] = us
+        self.counts[i] = n + 1
+        t = self.micros[i] + us
+        if t >= 1000000:
+            self.seconds[i] += t // 1000000
+            t %= 1000000
+        self.micros[i] = t
+        b = 0
+        v = us >> 6
+        while v and b < BINS - 1:
+            v >>= 1
+            b += 1
+        self.hist[i * BINS + b] += 1
+        if us > self.worst_us and i != self.control:
+            self.worst = i
+            self.worst_us = us
+
+    def begin(self):
+        return utime.ticks_us()
+
+    def end(self, i, t0):
+        """Record the time since t0 = begin() for probe i"""
+        if self.enabled:
+            self.record(i, utime.ticks_diff(utime.ticks_us(), t0))
+
+    def timer(self, name):
+        """Reusable scoped timer: `with timer:` records the block under name"""
+        return Scope(self, self.probe(name))
+
+    def wrap(self, fn, name, steps=None):
+        """Timed stand-in for a no-argument callable. If it returns a generator (page
+        transfers), each step of that is timed as probe `steps`."""
+        i = self.probe(name)
+        j = self.probe(steps) if steps else -1
+
+        def timed():
+            if not self.enabled:
+                return fn()
+            t0 = utime.ticks_us()
+            result = fn()
+            self.record(i, utime.ticks_diff(utime.ticks_us(), t0))
+            if result is not None and j >= 0:
+                return self._timed_steps(result, j)
+            return result
+        return timed
+
+    def _timed_steps(self, steps, i):
+        t0 = utime.ticks_us()
+        for _ in steps:
+            self.record(i, utime.ticks_diff(utime.ticks_us(), t0))
+            yield
+            t0 = utime.ticks_us()
+
+    # ───── Deadline monitor ─────
+    def wrap_control(self, fn, name="control"):
+        """Timed control step that also checks the gap since the previous one"""
+        i = self.probe(name)
+        self.control = i
+
+        def timed():
+            if not self.enabled:
+                return fn()
+            t0 = utime.ticks_us()
+            self.check_deadline(t0)
+            result = fn()
+            us = utime.ticks_diff(utime.ticks_us(), t0)
+            self.record(i, us)
+            # The next gap may be this run's own fault
+            if us > self.worst_us:
+                self.worst = i
+                self.worst_us = us
+            return result
+        return timed
+
+    def check_deadline(self, now_us):
+        last = self.last_control_us
+        self.last_control_us = now_us
+        if last is not None:
+            gap = utime.ticks_diff(now_us, last)
+            self.loops += 1
+            if gap > self.max_gap_us:
+                self.max_gap_us = gap
+            if gap > self.period_us + self.slack_us:
+                self.overrun_total += 1
+                # Blame a probe only if it ate a real share of the period
+                cause = self.worst if self.worst_us > self.slack_us else OTHER
+                self.overruns[cause if cause >= 0 else OTHER] += 1
+        self.worst = -1
+        self.worst_us = 0
+
+    def attach(self, runtime, steps=("ui",)):
+        """Wrap every runtime task; the one running runtime.control is the deadline reference"""
+        for task in runtime.tasks:
+            if task.fn == runtime.control:
+                task.fn = self.wrap_control(task.fn, task.name)
+            else:
+                task.fn = self.wrap(task.fn, task.name, task.name + ".step" if task.name in steps else None)
+
+    # ───── Reporting ─────
+    def reset(self):
+        for a in (self.counts, self.seconds, self.micros, self.mins, self.maxs, self.hist, self.overruns):
+            for k in range(len(a)):
+                a[k] = 0
+        self.loops = 0
+        self.overrun_total = 0
+        self.max_gap_us = 0
+        self.last_control_us = None
+
+    def mean_us(self, i):
+        n = self.counts[i]
+        return (self.seconds[i] * 1000000 + self.micros[i]) // n if n else 0
+
+    def cause_name(self, k):
+        return "other" if k == OTHER else self.names[k]
+
+    def dump(self, out=None):
+        """Text table of every probe, histogram and overrun cause"""
+        out = out or sys.stdout
+        out.write("probe            count    mean     min     max  hist <64us x2 ...\n")
+        for i, name in enumerate(self.names):
+            out.write("{:12s} {:9d} {:7d} {:7d} {:7d}  {}\n".format(
+                name, self.counts[i], self.mean_us(i), self.mins[i], self.maxs[i],
+                " ".join(str(self.hist[i * BINS + b]) for b in range(BINS))))
+        out.write("loops {} overruns {} (>{} us) max gap {} us\n".format(
+            self.loops, self.overrun_total, self.period_us + self.slack_us, self.max_gap_us))
+        for k in range(MAX_PROBES + 1):
+            if self.overruns[k]:
+                out.write("  overrun cause {}: {}\n".format(self.cause_name(k), self.overruns[k]))
+
+    def dump_file(self, path="timing.txt"):
+        try:
+            with open(path, "w") as f:
+                self.dump(f)
+            return True
+        except:
+            return False
+
+class Scope:
+    def __init__(self, instruments, index):
+        self.instruments = instruments
+        self.index = index
+        self.t0 = 0
+
+    def __enter__(self):
+        self.t0 = utime.ticks_us()
+        return self
+
+    def __exit__(self, *exc):
+        self.instruments.end(self.index, self.t0)
+        return False
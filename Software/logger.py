@@ -0,0 +1,180 @@
+# logger.py - Buffered RAM logger for run data
+#
+# Samples are stored in a preallocated ring and written to flash in batches,
+# so the control loop never opens a file on its own. A flush happens every
+# `flush_every` records, every `flush_ms` milliseconds, on every stage change,
+# and whenever flush() is called explicitly (abort / run complete).
+# With auto_flush=False nothing is written from log(); a scheduler task is
+# expected to call poll() and the policy is applied there.
+
+from array import array
+import os
+import utime
+
+CSV_HEADER = "Time,Stage,Temp,Setpoint,Output,RampRate\n"
+CSV_FORMAT = "{0:.3f},{1},{2:.1f},{3:.1f},{4:.1f},{5:.1f}\n"
+
+# ───── Run files ─────
+# Each run gets its own runs/run_NNNN.<ext>; the oldest are deleted beyond MAX_RUNS
+RUN_DIR = "runs"
+RUN_PREFIX = "run_"
+MAX_RUNS = 20
+
+def _run_number(name):
+    if name.startswith(RUN_PREFIX):
+        try:
+            return int(name[len(RUN_PREFIX):].split(".")[0])
+        except ValueError:
+            pass
+    return -1
+
+def new_run_path(directory=RUN_DIR, keep=MAX_RUNS, ext=".csv"):
+    """(path, number) for the next run file, pruning old runs so at most keep remain afterwards"""
+    try:
+        os.mkdir(directory)
+    except OSError:
+        pass  # Already exists
+    try:
+        runs = sorted((_run_number(name), name) for name in os.listdir(directory))
+    except OSError:
+        runs = []
+    runs = [r for r in runs if r[0] >= 0]
+    number = runs[-1][0] + 1 if runs else 1
+    while len(runs) >= keep > 0:
+        try:
+            os.remove(directory + "/" + runs.pop(0)[1])
+        except OSError:
+            pass
+    return "{}/{}{:04d}{}".format(directory, RUN_PREFIX, number, ext), number
+
+def run_header(fields, columns=CSV_HEADER):
+    """'# key: value' comment lines followed by the CSV column header"""
+    return "".join("# {}: {}\n".format(k, v) for k, v in fields) + columns
+
+class RingLogger:
+    EXT = ".csv"    # Run file extension
+
+    def __init__(self, path, line_fmt=CSV_FORMAT, capacity=64, flush_every=32,
+                 flush_ms=2000, decimate=1, auto_flush=True):
+        self.path = path
+        self.line_fmt = line_fmt
+        self.capacity = capacity
+        self.flush_every = min(flush_every, capacity)
+        self.flush_ms = flush_ms
+        self.decimate = max(1, decimate)
+        self.auto_flush = auto_flush
+
+        # Preallocated storage: timestamp (ms), stage id and four values per record
+        self.times = array('i', [0] * capacity)
+        self.stages = bytearray(capacity)
+        self.values = array('f', [0.0] * (capacity * 4))
+
+        self.head = 0           # Index of the oldest buffered record
+        self.count = 0          # Number of buffered records
+        self.skip = 0           # Decimation counter
+        self.last_stage = -1
+        self.flush_pending = False
+        self.t0 = utime.ticks_ms()
+        self.last_flush = self.t0
+
+        # Counters
+        self.logged = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.errors = 0
+
+    def start(self, header=None, path=None):
+        """Begin a new run (in a new file if path is given): truncate, write the header, reset the clock"""
+        if path is not None:
+            self.path = path
+        self.head = 0
+        self.count = 0
+        self.skip = 0
+        self.last_stage = -1
+        self.flush_pending = False
+        self.t0 = utime.ticks_ms()
+        self.last_flush = self.t0
+        try:
+            with open(self.path, "w") as f:
+                if header:
+                    f.write(header)
+        except:
+            self.errors += 1
+
+    def log(self, stage, a=0.0, b=0.0, c=0.0, d=0.0, now=None):
+        """Buffer one record. Returns True if it was kept after decimation."""
+        if now is None:
+            now = utime.ticks_ms()
+        stage_changed = stage != self.last_stage
+        if not stage_changed:
+            self.skip += 1
+            if self.skip < self.decimate:
+                if self.auto_flush:
+                    self.poll(now)
+                return False
+        self.skip = 0
+
+        if self.count == self.capacity:
+            # Ring full (flash writes failing or falling behind): overwrite the oldest
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            self.dropped += 1
+
+        i = (self.head + self.count) % self.capacity
+        self.times[i] = utime.ticks_diff(now, self.t0)
+        self.stages[i] = stage
+        j = i * 4
+        vals = self.values
+        vals[j] = a
+        vals[j + 1] = b
+        vals[j + 2] = c
+        vals[j + 3] = d
+        self.count += 1
+        self.logged += 1
+
+        if stage_changed and self.last_stage >= 0:
+            self.flush_pending = True
+        self.last_stage = stage
+        if self.auto_flush:
+            self.poll(now)
+        return True
+
+    def poll(self, now=None):
+        """Flush if the record count or time policy says so"""
+        if self.count == 0:
+            return
+        if now is None:
+            now = utime.ticks_ms()
+        if (self.flush_pending or self.count >= self.flush_every
+                or utime.ticks_diff(now, self.last_flush) >= self.flush_ms):
+            self.flush()
+
+    def flush(self):
+        """Write all buffered records to flash in one file open"""
+        self.last_flush = utime.ticks_ms()
+        self.flush_pending = False
+        if self.count == 0:
+            return
+        try:
+            with open(self.path, "a") as f:
+                vals = self.values
+                while self.count:
+                    i = self.head
+                    j = i * 4
+                    f.write(self.line_fmt.format(self.times[i] / 1000, self.stages[i],
+                                                 vals[j], vals[j + 1], vals[j + 2], vals[j + 3]))
+                    self.head = (i + 1) % self.capacity
+                    self.count -= 1
+                    self.flushed += 1
+        except:
+            # Keep whatever is left buffered; it will be retried on the next flush
+            self.errors += 1
+
+    def stats(self):
+        return {
+            "logged": self.logged,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "buffered": self.count,
+            "errors": self.errors,
+        }
@@ -8,31 +8,118 @@
 
 from display import Display
 from encoder import RotaryEncoder
-from thermocouple import MAX31855
+from thermocouple import MAX31855, shared_spi
 from ssr import SSR
-from modes import MenuMode, ManualMode, ReflowMode, ProfileEditMode
+from logger import RingLogger
+from binlog import BinaryLogger
+from modes import (MenuMode, ManualMode, ReflowMode, ZoneReflowMode, ProfileEditMode, ProfileSelectMode,
+                   AutotuneMode, DiagnosticsMode)
+from zones import Zone, ZoneSet
+from profiles import ProfileStore
+from sampler import Sampler
+from estimator import FixedEstimator
+from runtime import Runtime, ModeTable
+from dualcore import DualCoreRuntime, LogQueue
+from telemetry import Telemetry, RemoteControl
+from instrument import Instruments
+from gcpolicy import GcPolicy, alloc_check
+import config
+import micropython
 import utime
 
 # ───── Modes ─────
-MODE_MENU       = 0
-MODE_MANUAL     = 1
-MODE_REFLOW     = 2
-MODE_SET_REFLOW = 3
+# Mode names double as the events passed to BaseMode.switch()
+MODE_MENU       = "MENU"
+MODE_MANUAL     = "MANUAL"
+MODE_REFLOW     = "REFLOW"
+MODE_SET_REFLOW = "SET_REFLOW"
+MODE_PROFILES   = "PROFILES"
+MODE_AUTOTUNE   = "AUTOTUNE"
+MODE_DIAG       = "DIAG"
+
+# ───── Task periods (ms) and priorities ─────
+CONTROL_PERIOD_MS = 10
+UI_PERIOD_MS      = 200
+LOG_PERIOD_MS     = 500
+WATCHDOG_PERIOD_MS = 100
+
+# Sampling and Manual/Reflow control on core 1; UI, input and flash writes stay on core 0
+DUAL_CORE = False
+
+# ───── Telemetry ─────
+# Binary samples and remote commands over USB serial (see telemetry.py, host/monitor.py)
+TELEMETRY = False
+TELEMETRY_PERIOD_MS = 100   # Sample rate; the host can change it with TM_RATE
+TELEMETRY_POLL_MS = 20
+
+# ───── Instrumentation ─────
+# Per-task timing histograms and control-loop overruns by cause (instrument.py),
+# shown on the Diagnostics screen. Off: no task is wrapped, so it costs nothing.
+INSTRUMENT = False
+INSTRUMENT_SLACK_US = 2000  # Control gaps beyond period + slack count as overruns
+
+# ───── Memory ─────
+# Collections are scheduled into SSR idle slots (see gcpolicy.py)
+GC_PERIOD_MS = 50
+ALLOC_CHECK = False     # Print heap bytes allocated per control step before starting (not with TELEMETRY)
+
+# Manual/Reflow control steps in scaled integers instead of floats (see fixedpoint.py)
+FIXED_POINT = False
+
+# Manual/Reflow open on a live temperature graph; in Reflow, turning the encoder
+# switches to the text screens and back
+GRAPH_VIEW = True
+
+# ───── Heater zones ─────
+# (name, SSR pin, thermocouple CS pin) per zone. With more than one, Reflow runs
+# every zone from one control loop (see zones.py): the MAX31855s share the SPI
+# bus on their own CS pins and the SSR windows are staggered. Manual, Autotune
+# and the single-zone tools use the first zone. Empty: the one plate below.
+# Multi-zone Reflow has a float control path only: FIXED_POINT is refused with it.
+ZONES = []
+# ZONES = [("Left", 16, 5), ("Right", 17, 7)]
+
+# ───── Boot ─────
+# The splash ends at the first good thermocouple reading, or after this long without one.
+# Boot-to-menu time is printed once the menu is drawn (host/deploy.py --boot-time reads it).
+SPLASH_MAX_MS = 1000
 
 # Environment variables
-P = 1.2
-I = 0.2
-D = 3.0
+# PID gains for ReflowMode: % output per C, per C*s, per C/s
+P = 6.0
+I = 0.3
+D = 15.0
 reflow_output_reduction = 0.7
+AUTOTUNE_SETPOINT = 150     # C; relay autotune oscillates around this
 
-# ───── Logging Helper ─────
-def log_data(t_elapsed, stage, temp, target, output):
-    # Logs temperature, setpoint, output to CSV
-    try:
-        with open("log.csv", "a") as f:
-            f.write("{},{:.1f},{:.1f},{:.1f},{:.1f}\n".format(t_elapsed, stage, temp, target, output))
-    except:
-        pass
+# ───── Logging ─────
+# Records are buffered in RAM and flushed in batches (see logger.py)
+LOG_DECIMATE = 1        # Keep every Nth control-loop sample
+LOG_FLUSH_EVERY = 32    # Flush after this many buffered records
+LOG_FLUSH_MS = 2000     # ...or after this long, whichever comes first
+LOG_BINARY = False      # Run files as delta-encoded runs/run_NNNN.rfl (binlog.py, ~6x smaller)
+
+if LOG_BINARY:
+    run_log = BinaryLogger("log.rfl", capacity=1024, flush_every=128, flush_ms=LOG_FLUSH_MS,
+                           decimate=LOG_DECIMATE, period_ms=CONTROL_PERIOD_MS, auto_flush=False)
+else:
+    run_log = RingLogger("log.csv", capacity=64, flush_every=LOG_FLUSH_EVERY,
+                         flush_ms=LOG_FLUSH_MS, decimate=LOG_DECIMATE, auto_flush=False)
+debug_log = RingLogger("debug_soak.log", capacity=32, flush_every=16, flush_ms=LOG_FLUSH_MS,
+                       line_fmt="BelowBound: t={0:.3f}, temp={2:.2f}, set={3:.2f}, out={4:.2f}\n",
+                       auto_flush=False)
+
+tune_log = RingLogger("autotune.csv", capacity=64, flush_every=LOG_FLUSH_EVERY,
+                      flush_ms=LOG_FLUSH_MS, auto_flush=False)
+
+# Core 1 only queues records; core 0 moves them into the loggers and writes flash
+if DUAL_CORE:
+    run_log = LogQueue(run_log)
+    debug_log = LogQueue(debug_log)
+
+def log_data(stage, temp, target, output):
+    # Logs temperature, setpoint, output to the buffered CSV log
+    run_log.log(stage, temp, target, output)
 
 # ───── Reflow Profile: (duration, lower_temp, upper_temp) ─────
 reflow_profile = [
@@ -44,23 +131,107 @@ reflow_profile = [
 
 stage_names = ["Preheat", "Soak", "Reflow", "Cooldown"]
 
+# Profiles live in profiles/ on flash (see profiles.py). The one above seeds an empty
+# library as "Default"; after that the selected profile is loaded into these lists.
+profiles = ProfileStore()
+profiles.open(reflow_profile, stage_names)
+
+if FIXED_POINT and len(ZONES) > 1:
+    # Before any SSR exists: refuse to start rather than run a different pipeline than asked for
+    raise ValueError("FIXED_POINT has no multi-zone Reflow; clear FIXED_POINT or use one zone")
+
 # ───── Hardware Init ─────
 display = Display()
 encoder = RotaryEncoder(clk=10, dt=11, button=12)
-thermo = MAX31855(sck=6, cs=5, miso=4)
-ssr = SSR(pin=16)
+zones = None
+if ZONES:
+    spi = shared_spi(sck=6, miso=4)
+    zone_list = []
+    for name, ssr_pin, cs_pin in ZONES:
+        chip = MAX31855(cs=cs_pin, spi=spi)
+        est = FixedEstimator(chip.CONVERSION_MS) if FIXED_POINT else None
+        zone_list.append(Zone(name, Sampler(chip, estimator=est),
+                              SSR(pin=ssr_pin, window_ms=1000, min_on_ms=50, mains_hz=60)))
+    zones = ZoneSet(zone_list, window_ms=1000)
+    thermo = zone_list[0].sampler.thermo
+    sampler = zone_list[0].sampler
+    ssr = zone_list[0].ssr
+else:
+    thermo = MAX31855(sck=6, cs=5, miso=4)
+    sampler = Sampler(thermo, estimator=FixedEstimator(thermo.CONVERSION_MS) if FIXED_POINT else None)
+    ssr = SSR(pin=16, window_ms=1000, min_on_ms=50, mains_hz=60)
+# Sample task, watchdog and GC see every zone
+samplers = zones or sampler
+heaters = zones or ssr
+
+instruments = Instruments(CONTROL_PERIOD_MS * 1000, INSTRUMENT_SLACK_US) if INSTRUMENT else None
+
+def make_reflow():
+    if zones is not None and len(zones) > 1:
+        return ZoneReflowMode(display, encoder, zones, reflow_profile, stage_names, logger=run_log,
+                              store=profiles, graph=GRAPH_VIEW)
+    return ReflowMode(display, encoder, sampler, ssr, reflow_profile, stage_names,
+                      logger=run_log, debug_logger=debug_log, gains=(P, I, D),
+                      fixed=FIXED_POINT, store=profiles, graph=GRAPH_VIEW)
 
 # ───── Mode Init ─────
-modes = {
-    MODE_MENU: MenuMode(display, encoder, thermo, ssr),
-    MODE_MANUAL: ManualMode(display, encoder, thermo, ssr),
-    MODE_REFLOW: ReflowMode(display, encoder, thermo, ssr, reflow_profile, stage_names),
-    MODE_SET_REFLOW: ProfileEditMode(display, encoder, thermo, ssr, reflow_profile, stage_names)
-}
+# Modes read the sampler's cached temperature; only the sample task touches SPI.
+# Each one is built the first time it is entered, so boot only constructs the menu.
+modes = ModeTable({
+    MODE_MENU: lambda: MenuMode(display, encoder, sampler, ssr),
+    MODE_MANUAL: lambda: ManualMode(display, encoder, sampler, ssr, fixed=FIXED_POINT, graph=GRAPH_VIEW),
+    MODE_REFLOW: make_reflow,
+    MODE_SET_REFLOW: lambda: ProfileEditMode(display, encoder, sampler, ssr, reflow_profile, stage_names,
+                                             store=profiles),
+    MODE_PROFILES: lambda: ProfileSelectMode(display, encoder, sampler, ssr, profiles, reflow_profile,
+                                             stage_names),
+    MODE_AUTOTUNE: lambda: AutotuneMode(display, encoder, sampler, ssr, setpoint=AUTOTUNE_SETPOINT,
+                                        logger=tune_log),
+    MODE_DIAG: lambda: DiagnosticsMode(display, encoder, sampler, ssr, instruments),
+})
+
+tuning = {}
+
+def apply_tuning(values):
+    tuning.update(values)
+    for mode in modes.values():
+        mode.apply_tuning(values)
+    for heater in (zones.ssrs if zones is not None else [ssr]):
+        heater.min_on_ms = values.get("min_on_ms", heater.min_on_ms)
+
+def setup_mode(name, mode):
+    # Modes built after boot pick up the tuning loaded (or autotuned) so far
+    mode.apply_tuning(tuning)
+    if name == MODE_AUTOTUNE:
+        mode.on_tuned = apply_tuning
+
+# Gains and cutoff from autotune / host/sysid.py override the defaults above
+apply_tuning(config.load())
+modes.watch(setup_mode)
+
+def check_alloc(n=200):
+    """Heap bytes per sample/control step with the heater held off; 0 means allocation-free"""
+    ssr.locked = True
+    manual = modes[MODE_MANUAL]
+    setpoint = manual.setpoint
+    manual.setpoint = 0
+    try:
+        print("sample: {} B/step".format(alloc_check(sampler.sample, n)))
+        for name in (MODE_MENU, MODE_MANUAL):
+            print("{}: {} B/step".format(name, alloc_check(modes[name].control, n)))
+    finally:
+        manual.setpoint = setpoint
+        ssr.off()
+        ssr.locked = False
+
+def flush_logs():
+    run_log.poll()
+    debug_log.poll()
+    tune_log.poll()
 
 # ───── Init ─────
 display.show_startup()
-utime.sleep(1)
+sampler.wait_first(SPLASH_MAX_MS)
 current_mode = MODE_MENU
 menu_items = ["Manual Mode", "Reflow Mode", "Set Profile"]
 selected_index = 0
@@ -68,26 +239,49 @@ manual_setpoint = 150
 profile_edit_stage = 0
 profile_edit_param = 0
 
+if DUAL_CORE:
+    runtime = DualCoreRuntime(modes, current_mode, display, samplers, heaters,
+                              control_modes=(MODE_MANUAL, MODE_REFLOW), period_ms=CONTROL_PERIOD_MS)
+    runtime.add_task("watchdog", WATCHDOG_PERIOD_MS, runtime.watchdog, priority=3)
+else:
+    runtime = Runtime(modes, current_mode, display)
+    # Sampling runs at the converter's own rate; reading faster only restarts conversions
+    runtime.add_task("sample", samplers.period_ms, samplers.poll, priority=3)
+# Core-0 modes' control step, or just encoder input for the modes on core 1
+runtime.add_task("control", CONTROL_PERIOD_MS, runtime.control, priority=2)
+runtime.add_task("ui", UI_PERIOD_MS, runtime.render, priority=1)
+runtime.add_task("log", LOG_PERIOD_MS, flush_logs, priority=0)
+if TELEMETRY:
+    # stdout carries the frames: the boot line is dropped and a crash report goes to a file
+    runtime.console = False
+    # Command frames are binary: Ctrl-C bytes in them must not interrupt the program
+    micropython.kbd_intr(-1)
+    telemetry = Telemetry(runtime.publish, period_ms=TELEMETRY_PERIOD_MS,
+                          on_command=RemoteControl(runtime, reflow_profile))
+    runtime.add_task("telemetry", TELEMETRY_POLL_MS, telemetry.poll, priority=0)
+gc_policy = GcPolicy(zones.ssrs if zones is not None else ssr)
+runtime.add_task("gc", GC_PERIOD_MS, gc_policy.poll, priority=0)
+if instruments is not None:
+    instruments.attach(runtime)
+if ALLOC_CHECK and not TELEMETRY:
+    check_alloc()
+
 try:
     # ───── Main Loop ─────
-    while True:
-        encoder.update()
-        
-        # Update current mode and check for mode change
-        new_mode = modes[current_mode].update()
-        if new_mode:
-            if new_mode == "MENU":
-                current_mode = MODE_MENU
-            elif new_mode == "MANUAL":
-                current_mode = MODE_MANUAL
-            elif new_mode == "REFLOW":
-                current_mode = MODE_REFLOW
-            elif new_mode == "SET_REFLOW":
-                current_mode = MODE_SET_REFLOW
-        
-        utime.sleep_ms(10)
+    runtime.run()
 except Exception as e:
-    ssr.off()
+    # Locked off: with DUAL_CORE, core 1 may still be running a control step
+    heaters.lockout()
+    run_log.flush()
+    debug_log.flush()
+    tune_log.flush()
+    flush_logs()    # Writes out queued (dual-core) records; no-op otherwise
+    if TELEMETRY:
+        runtime.report_file()
+    else:
+        runtime.report()
+    if instruments is not None:
+        instruments.dump_file()
     display.oled.fill(0)
     display.oled.text("CRITICAL ERROR", 0, 0)
     display.oled.text(str(e), 0, 16)
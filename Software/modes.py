@@ -1,10 +1,85 @@
-from machine import Pin
+from machine import Pin, unique_id
+from logger import RingLogger, CSV_HEADER, RUN_DIR, new_run_path, run_header
+from screen import Screen, Label, Field, NumberField, Cursor, Graph, NO_DATA
+from thermocouple import TC_OK, STATUS_NAMES
+from profile_compiler import compile_profile
+from controller import PID, Controller, CTRL_OFF, CTRL_BANG, CTRL_PID
+from fixedpoint import Q, RATE, DUTY, to_q, from_q
+from runtime import S_TEMP, S_RATE, S_TARGET, S_OUTPUT, S_STAGE
+from version import FIRMWARE_VERSION
+try:
+    import ujson as json
+except ImportError:
+    import json
+import config
+import math
 import utime
 
-def should_cutoff(current_temp, target_temp, ramp_rate, cutoff_k=7, min_margin=2):
-    cutoff_margin = max(min_margin, cutoff_k * abs(ramp_rate))
+# ReflowMode screen states
+VIEW_WAITING = 0
+VIEW_PAUSED = 1
+VIEW_ACTIVE = 2
+VIEW_FAULT = 3
+
+# Commands from input() to the control side (through the mailbox when dual-core)
+CMD_ADJUST = 1      # Nudge the setpoint by value
+CMD_EXIT = 2        # Stop heating and go back to the menu
+CMD_SET = 3         # Set the setpoint to value
+
+NAN = float("nan")
+
+# Graph view: the chart fills the screen below one text row
+GRAPH_Y = 10
+GRAPH_W = 128
+GRAPH_H = 54
+
+def graph_screen(graph):
+    """Temperature and target/setpoint on the top row, the chart below; returns (screen, temp, target)"""
+    temp_field = NumberField(0, 0, 7, 1, "C")
+    target_field = NumberField(72, 0, 5, 0, "C")
+    return Screen([temp_field, Label(60, 0, ">"), target_field, graph]), temp_field, target_field
+
+def graph_top(peak):
+    """Upper end of the chart's temperature scale for a peak in C: 25 C steps, with headroom"""
+    return (int(peak) // 25 + 2) * 25
+
+def plot_envelope(graph, cp):
+    """Reset graph to a compiled profile's planned length and chart its target"""
+    total = 0
+    for i in range(cp.count):
+        total += cp.durations[i]
+    # Headroom for time spent waiting on lower bounds; a longer run wraps around
+    ms_per_col = max(1000, -(-total * 5 // 4 // GRAPH_W))
+    graph.reset(ms_per_col)
+    peak = 0
+    for i in range(cp.count):
+        peak = max(peak, cp.lowers[i], cp.uppers[i])
+    graph.scale(20, graph_top(peak))
+    stage = 0
+    start = 0
+    for col in range(GRAPH_W):
+        t = col * ms_per_col
+        while stage < cp.count and t >= start + cp.durations[stage]:
+            start += cp.durations[stage]
+            stage += 1
+        if stage >= cp.count:
+            break
+        graph.envelope(col, to_q(cp.target(stage, t - start)))
+
+def should_cutoff(current_temp, target_temp, ramp_rate, cutoff_k=7, min_margin=2, rate_sd=0.0):
+    # Only the part of the ramp rate that stands out from the estimator's uncertainty counts
+    rate = abs(ramp_rate) - rate_sd
+    cutoff_margin = max(min_margin, cutoff_k * rate) if rate > 0 else min_margin
     return current_temp >= target_temp - cutoff_margin
 
+def should_cutoff_q(temp_q, target_q, rate_r, cutoff_f=7 << 8, min_margin_q=2 * Q, rate_sd_r=0):
+    """should_cutoff() in fixed point: quarter-degrees, centi-C/s, cutoff_k as Q8 seconds"""
+    rate = (rate_r if rate_r >= 0 else -rate_r) - rate_sd_r
+    margin = ((cutoff_f * rate * Q) // RATE) >> 8 if rate > 0 else 0
+    if margin < min_margin_q:
+        margin = min_margin_q
+    return temp_q >= target_q - margin
+
 class BaseMode:
     def __init__(self, display, encoder, thermo, ssr):
         self.display = display
@@ -12,11 +87,66 @@ class BaseMode:
         self.thermo = thermo
         self.ssr = ssr
         self.last_display_update = utime.ticks_ms()
+        self.next_mode = None
+        self.on_switch = None   # Set by the runtime, called with the requested mode name
+        self.mailbox = None     # Set by DualCoreRuntime when control() runs on core 1
 
-    def update(self):
-        """Called every loop iteration. Returns new mode if mode should change."""
+    def enter(self):
+        """Called when the mode becomes the active mode"""
+        pass
+
+    def input(self):
+        """Encoder handling for modes that split it from control(); posts commands"""
+        pass
+
+    def control(self):
+        """Fast path: inputs and heater decisions, called at the control rate"""
+        pass
+
+    def command(self, cmd, value=0):
+        """Apply a command posted by input(), on the control side"""
         pass
 
+    def post(self, cmd, value=0):
+        """Send a command to the control side: directly, or via core 1's mailbox"""
+        if self.mailbox is None:
+            self.command(cmd, value)
+        else:
+            self.mailbox.post(cmd, value)
+
+    def publish(self, state):
+        """Latest control values into a shared state array (see dualcore.py)"""
+        est = self.thermo.estimator
+        state[S_TEMP] = NAN if est.temp is None else est.temp
+        state[S_RATE] = est.rate
+        state[S_TARGET] = NAN
+        state[S_OUTPUT] = 0.0
+        state[S_STAGE] = 0
+
+    def render(self):
+        """Slow path: redraw the screen, called at the UI rate"""
+        pass
+
+    def apply_tuning(self, values):
+        """Take over gains/cutoff values from a tuning dict (see config.py)"""
+        pass
+
+    def switch(self, mode_name):
+        """Request a mode change; the runtime receives it as an event"""
+        self.next_mode = mode_name
+        if self.on_switch is not None:
+            self.on_switch(mode_name)
+
+    def update(self):
+        """Single-loop compatibility: control, render when due. Returns new mode if mode should change."""
+        self.next_mode = None
+        self.input()
+        if self.next_mode is None:
+            self.control()
+        if self.next_mode is None and self.update_display():
+            self.render()
+        return self.next_mode
+
     def update_display(self, force=False):
         """Update display if enough time has passed"""
         now = utime.ticks_ms()
@@ -25,13 +155,29 @@ class BaseMode:
             return True
         return False
 
+MENU_ROWS = 5
+MENU_ITEMS = (
+    ("Manual Mode", "MANUAL"),
+    ("Reflow Mode", "REFLOW"),
+    ("Profiles", "PROFILES"),
+    ("Set Profile", "SET_REFLOW"),
+    ("Autotune", "AUTOTUNE"),
+    ("Diagnostics", "DIAG"),
+)
+
 class MenuMode(BaseMode):
     def __init__(self, display, encoder, thermo, ssr):
         super().__init__(display, encoder, thermo, ssr)
-        self.menu_items = ["Manual Mode", "Reflow Mode", "Set Profile"]
+        self.menu_items = [item[0] for item in MENU_ITEMS]
         self.selected_index = 0
+        self.top = 0                # First item on screen; the list scrolls
 
-    def update(self):
+        self.temp_field = NumberField(48, 0, 8, 1, " C")
+        self.cursor = Cursor(0, [12 + i * 10 for i in range(MENU_ROWS)])
+        self.item_fields = [Field(8, 12 + i * 10, "{}", 15) for i in range(MENU_ROWS)]
+        self.screen = Screen([Label(0, 0, "Temp:"), self.temp_field, self.cursor] + self.item_fields)
+
+    def control(self):
         # Navigate menu with encoder
         delta = self.encoder.get_position()
         if delta != 0:
@@ -40,84 +186,167 @@ class MenuMode(BaseMode):
 
         if self.encoder.was_pressed():
             # Select mode
-            if self.selected_index == 0:
-                return "MANUAL"
-            elif self.selected_index == 1:
-                return "REFLOW"
-            elif self.selected_index == 2:
-                return "SET_REFLOW"
-
-        # Update display
-        if self.update_display():
-            current_temp = self.thermo.read_temp() or 0.0
-            self.display.oled.fill(0)
-            self.display.oled.text("Temp: {:.1f} C".format(current_temp), 0, 0)
-            for i, item in enumerate(self.menu_items):
-                prefix = ">" if i == self.selected_index else " "
-                self.display.oled.text(f"{prefix}{item}", 0, 16 + i * 12)
-            self.display.oled.show()
-
-        return "MENU"
+            self.switch(MENU_ITEMS[self.selected_index][1])
+
+    def render(self):
+        current_temp = self.thermo.read_temp()
+        if self.selected_index < self.top:
+            self.top = self.selected_index
+        elif self.selected_index >= self.top + MENU_ROWS:
+            self.top = self.selected_index - MENU_ROWS + 1
+        self.display.use(self.screen)
+        self.temp_field.set(current_temp)
+        for i in range(MENU_ROWS):
+            k = self.top + i
+            self.item_fields[i].set(self.menu_items[k] if k < len(self.menu_items) else "")
+        self.cursor.set(self.selected_index - self.top)
+        self.display.render()
 
 class ManualMode(BaseMode):
-    def __init__(self, display, encoder, thermo, ssr):
+    GRAPH_MS_PER_COL = 2000     # 128 columns: the last ~4 minutes
+
+    def __init__(self, display, encoder, thermo, ssr, fixed=False, graph=False):
         super().__init__(display, encoder, thermo, ssr)
+        self.fixed = fixed      # Integer control step (fixedpoint.py)
         self.setpoint = 150
-        self.last_temp = None
-        self.last_temp_time = None
+        self.current_temp = None
+        self.sensor_state = TC_OK
         self.ramp_rate = 0
+        self.output = 0
+        self.cutoff_k = 7
+        self.cutoff_f = 7 << 8
 
-    def update(self):
-        # Adjust setpoint with encoder
-        delta = self.encoder.get_position()
+        # Graph view: temperature against the setpoint history, instead of the text screen
+        self.show_graph = graph
+        self.graph = Graph(0, GRAPH_Y, GRAPH_W, GRAPH_H, self.GRAPH_MS_PER_COL)
+        self.graph_screen, self.graph_temp_field, self.graph_target_field = graph_screen(self.graph)
+        self.graph_t0 = 0
+
+    def enter(self):
+        self.graph.reset()
+        self.graph_t0 = utime.ticks_ms()
+
+    def apply_tuning(self, values):
+        self.cutoff_k = values.get("cutoff_k", self.cutoff_k)
+        self.cutoff_f = int(self.cutoff_k * 256 + 0.5)
+
+    def input(self):
+        # Adjust setpoint with encoder (fast spins move in larger steps)
+        delta = self.encoder.get_accelerated()
         if delta != 0:
-            self.setpoint = max(0, min(300, self.setpoint + delta))
             self.encoder.position = 0
+            self.post(CMD_ADJUST, delta)
 
-        current_temp = self.thermo.read_temp() or 0.0
-        now = utime.ticks_ms()
-        # Calculate ramp rate
-        if self.last_temp is not None and self.last_temp_time is not None:
-            dt = utime.ticks_diff(now, self.last_temp_time) / 1000.0
-            if dt > 0:
-                self.ramp_rate = (current_temp - self.last_temp) / dt
-        self.last_temp = current_temp
-        self.last_temp_time = now
-
-        # Predictive cutoff for inertia
-        if should_cutoff(current_temp, self.setpoint, self.ramp_rate, cutoff_k=7):
+        # Exit manual mode
+        if self.encoder.was_pressed():
+            self.post(CMD_EXIT)
+
+    def command(self, cmd, value=0):
+        if cmd == CMD_ADJUST:
+            self.setpoint = max(0, min(300, self.setpoint + int(value)))
+        elif cmd == CMD_SET:
+            self.setpoint = max(0, min(300, int(value)))
+        elif cmd == CMD_EXIT:
             self.ssr.off()
-        elif current_temp < self.setpoint - 2:
-            self.ssr.on()
-        elif current_temp > self.setpoint + 2:
+            self.output = 0
+            self.switch("MENU")
+
+    def control(self):
+        self.sensor_state = self.thermo.state()
+        if self.sensor_state != TC_OK:
+            # No trustworthy reading: never heat blind
             self.ssr.off()
+            self.output = 0
+            self.current_temp = None
+        elif self.fixed:
+            self.control_q()
+        else:
+            self.current_temp = self.thermo.temp
+            # Filtered temperature and ramp rate from the shared estimator
+            est = self.thermo.estimator
+            current_temp = est.temp
+            self.ramp_rate = est.rate
 
-        # Update display
-        if self.update_display():
-            self.display.show_temp(current_temp, self.setpoint)
+            # Predictive cutoff for inertia
+            if should_cutoff(current_temp, self.setpoint, est.rate, cutoff_k=self.cutoff_k, rate_sd=est.rate_sd):
+                self.ssr.off()
+                self.output = 0
+            elif current_temp < self.setpoint - 2:
+                self.ssr.on()
+                self.output = 100
+            elif current_temp > self.setpoint + 2:
+                self.ssr.off()
+                self.output = 0
 
-        # Exit manual mode
-        if self.encoder.was_pressed():
+    def control_q(self):
+        """control() for a good reading, in quarter-degrees"""
+        self.current_temp = self.thermo.temp    # Display only
+        est = self.thermo.estimator
+        temp_q = est.temp_q
+        setpoint_q = self.setpoint * Q
+        if should_cutoff_q(temp_q, setpoint_q, est.rate_r, self.cutoff_f, rate_sd_r=est.rate_sd_r):
+            self.ssr.off()
+            self.output = 0
+        elif temp_q < setpoint_q - 2 * Q:
+            self.ssr.on()
+            self.output = 100
+        elif temp_q > setpoint_q + 2 * Q:
             self.ssr.off()
-            return "MENU"
+            self.output = 0
 
-        return None
+    def publish(self, state):
+        super().publish(state)
+        state[S_TARGET] = self.setpoint
+        state[S_OUTPUT] = self.output
+
+    def render(self):
+        ok = self.sensor_state == TC_OK and self.current_temp is not None
+        self.graph.add(utime.ticks_diff(utime.ticks_ms(), self.graph_t0),
+                       to_q(self.current_temp) if ok else NO_DATA, to_q(self.setpoint))
+        if self.show_graph:
+            self.graph.scale(20, graph_top(self.setpoint))
+            self.display.use(self.graph_screen)
+            self.graph_temp_field.set(self.current_temp if ok else None)
+            self.graph_target_field.set(self.setpoint)
+            self.display.render()
+        elif not ok:
+            self.display.show_temp(None, self.setpoint, STATUS_NAMES[self.sensor_state])
+        else:
+            self.display.show_temp(self.current_temp, self.setpoint)
 
 class ReflowMode(BaseMode):
-    def __init__(self, display, encoder, thermo, ssr, profile, stage_names):
+    def __init__(self, display, encoder, thermo, ssr, profile, stage_names, logger=None, debug_logger=None,
+                 gains=None, run_dir=RUN_DIR, profile_name="default", fixed=False, store=None, graph=False):
         super().__init__(display, encoder, thermo, ssr)
+        self.fixed = fixed              # Integer control step (fixedpoint.py)
         self.profile = profile
+        self.profile_name = profile_name
+        self.store = store              # profiles.ProfileStore: names the selected profile
+        self.run_dir = run_dir          # One file per run here; None keeps rewriting logger.path
+        self.run_number = 0
         self.stage_names = stage_names
+        self.logger = logger or RingLogger("log.csv")
+        self.debug_logger = debug_logger or RingLogger(
+            "debug_soak.log",
+            line_fmt="BelowBound: t={0:.3f}, temp={2:.2f}, set={3:.2f}, out={4:.2f}\n")
         self.reflow_start_time = None
         self.stage_start_time = None
         self.reflow_stage = 0
         self.reflow_output_reduction = 0.7
-        self.P = 1.2
-        self.I = 0.2
-        self.D = 3.0
+        self.P = 6.0
+        self.I = 0.3
+        self.D = 15.0
+        if gains is not None:
+            self.P, self.I, self.D = gains
+        self.FEEDFORWARD = 40.0     # % per C/s of setpoint slope
+        self.HOLD_FEEDFORWARD = 0.28  # % per C above ambient
+        self.INTEGRAL_BAND = 5.0    # C around the setpoint where the integral accumulates
+        self.BOUND_MARGIN = 3.0     # C above a stage's lower bound the PID aims for while waiting
+        self.controller = None
+        self.build_controller()
+        self.last_control = None
         self.MAX_RAMP_RATE = 2.5
-        self.last_temp = None
-        self.last_temp_time = None
+        self.WINDOW_MS = 1000       # SSR time-proportioning window
         self.temp_ramp_rate = 0
         self.COMPENSATION_FACTORS = {
             "Preheat": 0.5,
@@ -126,29 +355,100 @@ class ReflowMode(BaseMode):
             "Cooldown": 1.0
         }
         self.cutoff_k = 7
+        self.TABLE_STEP_MS = 1000   # Setpoint table resolution; 0 computes from slope instead
+        self.compiled = None
 
-    def compute_target_temp(self, stage_elapsed, duration, lower, upper, stage_name):
-        ramp = upper - lower
-        if ramp > 0 and self.stage_names[self.reflow_stage] == "Preheat":
-            max_temp = lower + self.MAX_RAMP_RATE * stage_elapsed
-            linear_target = lower + ramp * min(1.0, stage_elapsed / duration)
-            return min(linear_target, max_temp)
-        return lower + ramp * min(1.0, stage_elapsed / duration)
+        # Latest control-loop state, read by render() (written only by the control side)
+        self.view = VIEW_WAITING
+        self.fault = TC_OK
+        self.current_temp = 0.0
+        self.target_temp = 0.0
+        self.output = 0.0
+        self.stage_elapsed = 0
+        self.target_q = 0               # Fixed point: converted for render()/publish() only
+        self.output_pm = 0
 
-    def calculate_thermal_compensation(self, current_temp, target_temp, stage_name):
-        now = utime.ticks_ms()
-        
-        # Calculate temperature ramp rate
-        if self.last_temp is not None and self.last_temp_time is not None:
-            dt = utime.ticks_diff(now, self.last_temp_time) / 1000.0  # Convert to seconds
-            if dt > 0:
-                self.temp_ramp_rate = (current_temp - self.last_temp) / dt
-        
-        self.last_temp = current_temp
-        self.last_temp_time = now
+        # Screen templates: waiting for a stage, paused below bound, stage active
+        self.build_titles()
+        self.stage_field = Field(0, 0, "{}", 16)
+        self.temp_field = NumberField(48, 12, 8, 1, " C")
+        self.target_field = NumberField(64, 12, 8, 1, " C")
+        self.bound_field = NumberField(64, 24, 8, 1, " C")
+        self.note_field = Field(0, 36, "{}", 16)
+        self.active_temp_field = NumberField(48, 24, 8, 1, " C")
+        self.time_field = NumberField(48, 36, 8, 0, "s")
+        self.wait_screen = Screen([
+            self.stage_field,
+            Label(0, 12, "Temp:"), self.temp_field,
+            Label(0, 24, "Target:"), self.bound_field,
+            self.note_field,
+            Label(0, 50, "Press to abort"),
+        ])
+        self.active_screen = Screen([
+            self.stage_field,
+            Label(0, 12, "Target:"), self.target_field,
+            Label(0, 24, "Temp:"), self.active_temp_field,
+            Label(0, 36, "Time:"), self.time_field,
+            Label(0, 50, "Press to abort"),
+        ])
+
+        # Graph view (turning the encoder switches between it and the text screens)
+        self.show_graph = graph
+        self.graph = Graph(0, GRAPH_Y, GRAPH_W, GRAPH_H)
+        self.graph_screen, self.graph_temp_field, self.graph_target_field = graph_screen(self.graph)
+        self.graph_t0 = 0
+
+    def build_titles(self):
+        names = self.stage_names
+        self.wait_titles = [name + ": Waiting" for name in names]
+        self.pause_titles = [name + ": Below Bound" for name in names]
+        self.pause_notes = [name + " Paused" if name == "Soak" else "" for name in names]
+        self.stage_titles = [name + " Stage" for name in names]
+
+    def build_controller(self):
+        self.controller = Controller(PID(self.P, self.I, self.D, kff=self.FEEDFORWARD,
+                                         k_hold=self.HOLD_FEEDFORWARD, i_band=self.INTEGRAL_BAND))
+        self.bound_margin_q = to_q(self.BOUND_MARGIN)
+
+    def apply_tuning(self, values):
+        self.P = values.get("P", self.P)
+        self.I = values.get("I", self.I)
+        self.D = values.get("D", self.D)
+        self.FEEDFORWARD = values.get("feedforward", self.FEEDFORWARD)
+        self.HOLD_FEEDFORWARD = values.get("hold_feedforward", self.HOLD_FEEDFORWARD)
+        self.cutoff_k = values.get("cutoff_k", self.cutoff_k)
+        self.MAX_RAMP_RATE = values.get("max_ramp_rate", self.MAX_RAMP_RATE)
+        self.WINDOW_MS = int(values.get("window_ms", self.WINDOW_MS))
+        self.COMPENSATION_FACTORS.update(values.get("compensation", {}))
+        self.build_controller()
+
+    def run_header(self):
+        """Comment lines identifying the run, ahead of the CSV columns"""
+        t = utime.localtime()
+        return run_header((
+            ("run", self.run_number),
+            ("started", "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(*t[:6])),
+            ("firmware", FIRMWARE_VERSION),
+            ("board", "".join("{:02x}".format(b) for b in unique_id())),
+            ("profile_name", self.profile_name),
+            ("profile", json.dumps([list(stage) for stage in self.profile])),
+            ("stages", json.dumps(list(self.stage_names))),
+            ("gains", json.dumps({"P": self.P, "I": self.I, "D": self.D, "feedforward": self.FEEDFORWARD,
+                                  "hold_feedforward": self.HOLD_FEEDFORWARD, "cutoff_k": self.cutoff_k})),
+        ))
+
+    def compile(self):
+        """Compile the (possibly edited) profile into lookup arrays"""
+        self.compiled = compile_profile(self.profile, self.stage_names, self.MAX_RAMP_RATE,
+                                        self.COMPENSATION_FACTORS, self.TABLE_STEP_MS)
+        return self.compiled
+
+    def calculate_thermal_compensation(self, current_temp, target_temp, stage):
+        # Ramp rate comes from the shared estimator
+        self.temp_ramp_rate = self.thermo.estimator.rate
 
         # Base compensation factor for this stage
-        base_factor = self.COMPENSATION_FACTORS.get(stage_name, 0.8)
+        base_factor = self.compiled.comp[stage]
         
         # Additional compensation based on temperature difference and ramp rate
         temp_diff = target_temp - current_temp
@@ -163,181 +463,595 @@ class ReflowMode(BaseMode):
         
         return 1.0  # No compensation when cooling or far from target
 
-    def update(self):
+    def enter(self):
+        # Every entry starts a fresh run with the current profile values. The run
+        # files are opened here, never from control(), which may run on core 1.
+        self.reflow_start_time = None
+        self.stage_start_time = None
+        if self.store is not None:
+            # A different profile may have been picked since the last run
+            self.profile_name = self.store.selected
+            self.build_titles()
+        self.compile()
+        self.plot_envelope()
+        if self.run_dir is None:
+            self.logger.start(CSV_HEADER)
+        else:
+            path, self.run_number = new_run_path(self.run_dir, ext=self.logger.EXT)
+            self.logger.start(self.run_header(), path)
+        self.debug_logger.start()
+
+    def plot_envelope(self):
+        """Chart the compiled profile's target against planned time, once per run"""
+        plot_envelope(self.graph, self.compiled)
+        self.graph_t0 = utime.ticks_ms()
+
+    def input(self):
+        # Turning the encoder flips between the text and graph views (UI state only)
+        if self.encoder.get_position() != 0:
+            self.encoder.position = 0
+            self.show_graph = not self.show_graph
+        if self.encoder.was_pressed():
+            self.post(CMD_EXIT)
+
+    def command(self, cmd, value=0):
+        if cmd == CMD_EXIT:
+            self.abort()
+            self.switch("MENU")
+
+    def publish(self, state):
+        super().publish(state)
+        if self.fixed:
+            self.from_fixed()
+        state[S_TARGET] = self.target_temp
+        state[S_OUTPUT] = self.output
+        state[S_STAGE] = self.reflow_stage + 1
+
+    def control(self):
+        if self.fixed:
+            self.control_q()
+            return
         now = utime.ticks_ms()
-        MIN_OUTPUT_THRESHOLD = 1.0  # percent
-        MIN_ON_TIME_MS = 50         # ms
-        window_ms = 1000
+        window_ms = self.WINDOW_MS  # Minimum on-time is enforced by the SSR driver
 
         if self.reflow_start_time is None:
             self.reflow_start_time = now
             self.reflow_stage = 0
             self.ssr.off()
-            self.last_temp = None
-            self.last_temp_time = None
             self.temp_ramp_rate = 0
-            try:
-                with open("log.csv", "w") as f:
-                    f.write("Time,Stage,Temp,Setpoint,Output,RampRate\n")
-            except:
-                pass
-
-        current_temp = self.thermo.read_temp() or 0.0
-        stage_duration, lower_bound, upper_bound = self.profile[self.reflow_stage]
-        stage_name = self.stage_names[self.reflow_stage]
-
-        # Calculate ramp rate for predictive cutoff
-        if self.last_temp is not None and self.last_temp_time is not None:
-            dt = utime.ticks_diff(now, self.last_temp_time) / 1000.0
-            if dt > 0:
-                self.temp_ramp_rate = (current_temp - self.last_temp) / dt
-        self.last_temp = current_temp
-        self.last_temp_time = now
+            self.controller.pid.reset()
+            self.controller.select(CTRL_OFF)
+            self.controller.output = 0.0
+            self.output = 0.0
+            self.last_control = now
+        dt_ms = utime.ticks_diff(now, self.last_control)
+        dt_s = dt_ms / 1000
+        self.last_control = now
+
+        # Sensor fault: heater off until readings are good again
+        self.fault = self.thermo.state(now)
+        if self.fault != TC_OK:
+            self.ssr.off()
+            self.output = 0.0
+            self.view = VIEW_FAULT
+            return
+
+        # Control on the estimator's filtered temperature and ramp rate (updated once
+        # per new sample); the raw reading is what gets displayed and logged
+        est = self.thermo.estimator
+        current_temp = est.temp
+        self.temp_ramp_rate = est.rate
+        measured = self.thermo.temp
+        self.current_temp = measured
+        cp = self.compiled
+        stage = self.reflow_stage
+        lower_bound = cp.lowers[stage]
+        control = cp.controls[stage]
+        if control != self.controller.mode:
+            self.controller.select(control, lower_bound, current_temp)
 
         # --- Stage start logic ---
         if self.stage_start_time is None:
-            if stage_name == "Preheat":
-                # Start Preheat immediately, no waiting
+            if not cp.waits[stage]:
+                # Ramp-limited and cooldown stages start immediately, no waiting
                 self.stage_start_time = now
             elif current_temp < lower_bound:
-                # Waiting logic for other stages: use bang-bang control
-                if current_temp < lower_bound - 2:
-                    self.ssr.on()
-                else:
-                    self.ssr.off()
-                if self.update_display():
-                    self.display.oled.fill(0)
-                    self.display.oled.text(f"{stage_name}: Waiting", 0, 0)
-                    self.display.oled.text("Temp: {:.1f} C".format(current_temp), 0, 12)
-                    self.display.oled.text("Target: {:.1f} C".format(lower_bound), 0, 24)
-                    self.display.oled.text("Press to abort", 0, 50)
-                    self.display.oled.show()
-                if self.encoder.was_pressed():
-                    self.ssr.off()
-                    self.stage_start_time = None
-                    return "MENU"
+                # Waiting for the bound: one controller step towards it, and the stage hasn't started
+                self.output = self.heat_to_bound(control, lower_bound, current_temp, dt_s, est.rate, window_ms)
+                self.view = VIEW_WAITING
+                self.target_temp = lower_bound
+                self.log_data(stage + 1, measured, lower_bound, self.output)
+                return
             else:
                 self.stage_start_time = now
 
         # --- Stage is active ---
         # PAUSE TIMER IF TEMP DROPS BELOW LOWER BOUND
-        if stage_name != "Preheat" and current_temp < lower_bound:
+        if cp.pauses[stage] and current_temp < lower_bound:
             # Pause timer, re-engage heating
-            if current_temp < lower_bound - 2:
-                self.ssr.on()
-            else:
-                self.ssr.off()
+            output = self.heat_to_bound(control, lower_bound, current_temp, dt_s, est.rate, window_ms)
+            self.output = output
             # Debug logging for PID output and cutoff status
-            try:
-                with open("debug_soak.log", "a") as f:
-                    f.write("BelowBound: temp={:.2f}, set={:.2f}, out={:.2f}\n".format(current_temp, lower_bound, 100 if self.ssr.control.value() else 0))
-            except:
-                pass
-            if self.update_display():
-                self.display.oled.fill(0)
-                self.display.oled.text(f"{stage_name}: Below Bound", 0, 0)
-                self.display.oled.text("Temp: {:.1f} C".format(current_temp), 0, 12)
-                self.display.oled.text("Target: {:.1f} C".format(lower_bound), 0, 24)
-                if stage_name == "Soak":
-                    self.display.oled.text("Soak Paused", 0, 36)
-                self.display.oled.text("Press to abort", 0, 50)
-                self.display.oled.show()
-            if self.encoder.was_pressed():
-                self.ssr.off()
-                self.stage_start_time = None
-                return "MENU"
-            if self.temp_ramp_rate is None:
-                self.temp_ramp_rate = 0
-            total_elapsed = utime.ticks_diff(now, self.reflow_start_time) // 1000
-            self.log_data(total_elapsed, self.reflow_stage + 1, current_temp, lower_bound, 100 if self.ssr.control.value() else 0)
-            return None
+            self.debug_logger.log(stage + 1, measured, lower_bound, output)
+            # Timer held: the start moves forward by the time spent below the bound
+            self.stage_start_time = utime.ticks_add(self.stage_start_time, dt_ms)
+            self.view = VIEW_PAUSED
+            self.target_temp = lower_bound
+            self.log_data(stage + 1, measured, lower_bound, output)
+            return
 
         # Only increment timer if temp is above lower bound
-        stage_elapsed = utime.ticks_diff(now, self.stage_start_time) // 1000
-        target_temp = self.compute_target_temp(stage_elapsed, stage_duration, lower_bound, upper_bound, stage_name)
+        elapsed_ms = utime.ticks_diff(now, self.stage_start_time)
+        target_temp = cp.target(stage, elapsed_ms)
+
+        slope = cp.slope(stage, elapsed_ms)
+        output = self.controller.update(target_temp, current_temp, dt_s, slope, est.rate)
+        self.drive(control, output, window_ms)
+        self.output = output
+        self.log_data(stage + 1, measured, target_temp, output)
 
-        if stage_name == "Preheat":
-            if current_temp < target_temp - 2:
+        # Stage complete (only if timer has run for full duration above lower bound)
+        if elapsed_ms >= cp.durations[stage]:
+            self.reflow_stage += 1
+            if self.reflow_stage >= cp.count:
+                self.abort()
+                self.switch("MENU")
+                return
+            self.stage_start_time = None
+            return
+
+        self.view = VIEW_ACTIVE
+        self.target_temp = target_temp
+        self.stage_elapsed = elapsed_ms // 1000
+
+    def render(self):
+        stage = self.reflow_stage
+        if stage >= len(self.profile):
+            return
+        if self.fixed:
+            self.from_fixed()
+        fault = self.view == VIEW_FAULT
+        self.graph.add(utime.ticks_diff(utime.ticks_ms(), self.graph_t0),
+                       NO_DATA if fault else to_q(self.current_temp))
+        if self.show_graph and not fault:
+            self.display.use(self.graph_screen)
+            self.graph_temp_field.set(self.current_temp)
+            self.graph_target_field.set(self.target_temp)
+        elif self.view == VIEW_ACTIVE:
+            self.display.use(self.active_screen)
+            self.stage_field.set(self.stage_titles[stage])
+            self.target_field.set(self.target_temp)
+            self.active_temp_field.set(self.current_temp)
+            self.time_field.set(self.stage_elapsed)
+        elif self.view == VIEW_FAULT:
+            self.display.use(self.wait_screen)
+            self.stage_field.set("Sensor fault")
+            self.temp_field.set(None)
+            self.bound_field.set(self.target_temp)
+            self.note_field.set(STATUS_NAMES[self.fault])
+        else:
+            self.display.use(self.wait_screen)
+            if self.view == VIEW_WAITING:
+                self.stage_field.set(self.wait_titles[stage])
+                self.note_field.set("")
+            else:
+                self.stage_field.set(self.pause_titles[stage])
+                self.note_field.set(self.pause_notes[stage])
+            self.temp_field.set(self.current_temp)
+            self.bound_field.set(self.target_temp)
+        self.display.render()
+
+    def heat_to_bound(self, control, lower_bound, current_temp, dt_s, rate, window_ms):
+        """Heating while waiting for (or paused below) a stage's lower bound. Returns the output %."""
+        if control == CTRL_PID:
+            # Aim just past the bound so the PID crosses it instead of settling under it
+            output = self.controller.update(lower_bound + self.BOUND_MARGIN, current_temp, dt_s, 0.0, rate)
+            self.drive(CTRL_PID, output, window_ms)
+            return output
+        if current_temp < lower_bound - 2:
+            self.ssr.on()
+            return 100
+        self.ssr.off()
+        return 0
+
+    def drive(self, control, output, window_ms):
+        """Apply a controller output (percent) to the SSR"""
+        if control == CTRL_BANG:
+            if output > 0:
                 self.ssr.on()
-            elif current_temp >= target_temp:
+            else:
                 self.ssr.off()
-            output = 100 if self.ssr.control.value() else 0
         else:
-            # PWM heating logic
-            error = target_temp - current_temp
-            if error > 0:
-                # Compute PWM duty cycle (0-100%)
-                duty_cycle = min(100, max(0, error * 10))  # Scale error to get reasonable duty cycle
-                on_time = int(duty_cycle / 100 * window_ms)
-                if on_time < MIN_ON_TIME_MS:
-                    on_time = 0
-                cycle_pos = utime.ticks_diff(now, self.stage_start_time) % window_ms
-                self.ssr.on() if cycle_pos < on_time else self.ssr.off()
-                output = duty_cycle
+            # Time-proportional output, 0 included: the window keeps running and a pulse
+            # already on finishes. Minimum on-time is enforced by the SSR driver.
+            self.ssr.set_duty(output, window_ms)
+
+    def abort(self):
+        """Stop heating and write out any buffered log records"""
+        self.ssr.off()
+        self.output = 0.0
+        self.output_pm = 0
+        self.stage_start_time = None
+        self.logger.flush()
+        self.debug_logger.flush()
+
+    # ───── Fixed point ─────
+    def control_q(self):
+        """control() with temperatures in quarter-degrees, rates in centi-C/s and duty in per mille"""
+        now = utime.ticks_ms()
+        window_ms = self.WINDOW_MS
+
+        if self.reflow_start_time is None:
+            self.reflow_start_time = now
+            self.reflow_stage = 0
+            self.ssr.off()
+            self.controller.pid.reset()
+            self.controller.select_q(CTRL_OFF)
+            self.controller.output_pm = 0
+            self.output_pm = 0
+            self.last_control = now
+        dt_ms = utime.ticks_diff(now, self.last_control)
+        self.last_control = now
+
+        self.fault = self.thermo.state(now)
+        if self.fault != TC_OK:
+            self.ssr.off()
+            self.output_pm = 0
+            self.view = VIEW_FAULT
+            return
+
+        est = self.thermo.estimator
+        temp_q = est.temp_q
+        rate_r = est.rate_r
+        measured_q = self.thermo.temp_q
+        self.current_temp = self.thermo.temp    # Display only
+        cp = self.compiled
+        stage = self.reflow_stage
+        lower_q = cp.lowers_q[stage]
+        control = cp.controls[stage]
+        if control != self.controller.mode:
+            self.controller.select_q(control, lower_q, temp_q)
+
+        if self.stage_start_time is None:
+            if not cp.waits[stage]:
+                self.stage_start_time = now
+            elif temp_q < lower_q:
+                self.output_pm = self.heat_to_bound_q(control, lower_q, temp_q, dt_ms, rate_r, window_ms)
+                self.view = VIEW_WAITING
+                self.target_q = lower_q
+                self.log_q(stage + 1, measured_q, lower_q, self.output_pm, rate_r)
+                return
             else:
-                self.ssr.off()
-                output = 0
-        if self.temp_ramp_rate is None:
-            self.temp_ramp_rate = 0
-        total_elapsed = utime.ticks_diff(now, self.reflow_start_time) // 1000
-        self.log_data(total_elapsed, self.reflow_stage + 1, current_temp, target_temp, output)
+                self.stage_start_time = now
 
-        # Stage complete (only if timer has run for full duration above lower bound)
-        if stage_elapsed >= stage_duration:
+        if cp.pauses[stage] and temp_q < lower_q:
+            output_pm = self.heat_to_bound_q(control, lower_q, temp_q, dt_ms, rate_r, window_ms)
+            self.output_pm = output_pm
+            self.debug_logger.log(stage + 1, from_q(measured_q), from_q(lower_q), output_pm / 10)
+            self.stage_start_time = utime.ticks_add(self.stage_start_time, dt_ms)
+            self.view = VIEW_PAUSED
+            self.target_q = lower_q
+            self.log_q(stage + 1, measured_q, lower_q, output_pm, rate_r)
+            return
+
+        elapsed_ms = utime.ticks_diff(now, self.stage_start_time)
+        target_q = cp.target_q(stage, elapsed_ms)
+        output_pm = self.controller.update_q(target_q, temp_q, dt_ms, cp.slope_r(stage, elapsed_ms), rate_r)
+        self.drive_q(control, output_pm, window_ms)
+        self.output_pm = output_pm
+        self.log_q(stage + 1, measured_q, target_q, output_pm, rate_r)
+
+        if elapsed_ms >= cp.durations[stage]:
             self.reflow_stage += 1
-            if self.reflow_stage >= len(self.profile):
-                self.ssr.off()
-                return "MENU"
+            if self.reflow_stage >= cp.count:
+                self.abort()
+                self.switch("MENU")
+                return
             self.stage_start_time = None
-            return None
+            return
 
-        if self.update_display():
-            self.display.oled.fill(0)
-            self.display.oled.text(f"{stage_name} Stage", 0, 0)
-            self.display.oled.text("Target: {:.1f} C".format(target_temp), 0, 12)
-            self.display.oled.text("Temp: {:.1f} C".format(current_temp), 0, 24)
-            self.display.oled.text("Time: {}s".format(stage_elapsed), 0, 36)
-            self.display.oled.text("Press to abort", 0, 50)
-            self.display.oled.show()
+        self.view = VIEW_ACTIVE
+        self.target_q = target_q
+        self.stage_elapsed = elapsed_ms // 1000
+
+    def heat_to_bound_q(self, control, lower_q, temp_q, dt_ms, rate_r, window_ms):
+        """heat_to_bound() in fixed point. Returns the output in per mille."""
+        if control == CTRL_PID:
+            output_pm = self.controller.update_q(lower_q + self.bound_margin_q, temp_q, dt_ms, 0, rate_r)
+            self.drive_q(CTRL_PID, output_pm, window_ms)
+            return output_pm
+        if temp_q < lower_q - 2 * Q:
+            self.ssr.on()
+            return DUTY
+        self.ssr.off()
+        return 0
 
+    def drive_q(self, control, output_pm, window_ms):
+        if control == CTRL_BANG:
+            if output_pm > 0:
+                self.ssr.on()
+            else:
+                self.ssr.off()
+        else:
+            self.ssr.set_duty_pm(output_pm, window_ms)
+
+    def log_q(self, stage, measured_q, target_q, output_pm, rate_r):
+        # The log boundary: the only float conversions of a fixed-point step
+        self.logger.log(stage, from_q(measured_q), from_q(target_q), output_pm / 10, rate_r / RATE)
+
+    def from_fixed(self):
+        """Float views of the fixed-point state for render() and publish()"""
+        self.target_temp = from_q(self.target_q)
+        self.output = self.output_pm / 10
+        self.temp_ramp_rate = self.thermo.estimator.rate
+
+    def log_data(self, stage, temp, target, output):
+        # Called every control step: plain numbers straight into the logger's preallocated arrays
+        self.logger.log(stage, temp, target, output, self.temp_ramp_rate)
+
+ZONE_ROWS = 4     # Zones listed on the reflow screen
+
+class ZoneReflowMode(BaseMode):
+    """ReflowMode's profile on several zones (zones.py): one stage clock, a controller per zone.
+
+    Stages wait for, and pause on, the coldest zone, so every zone has reached
+    a stage's lower bound before its timer runs. The run log records the
+    coldest zone's reading and the mean output."""
+    def __init__(self, display, encoder, zones, profile, stage_names, logger=None, run_dir=RUN_DIR,
+                 profile_name="default", store=None, graph=False):
+        first = zones.zones[0]
+        super().__init__(display, encoder, first.sampler, zones)
+        self.zones = zones
+        self.profile = profile
+        self.stage_names = stage_names
+        self.profile_name = profile_name
+        self.store = store
+        self.run_dir = run_dir
+        self.run_number = 0
+        self.logger = logger or RingLogger("log.csv")
+        self.MAX_RAMP_RATE = 2.5
+        self.BOUND_MARGIN = 3.0     # C above a stage's lower bound the zones aim for while waiting
+        self.TABLE_STEP_MS = 1000
+        self.compiled = None
+
+        self.reflow_stage = 0
+        self.stage_start_time = None
+        self.last_control = None
+        self.running = False
+
+        # Latest control-loop state, read by render()
+        self.view = VIEW_WAITING
+        self.coldest = None
+        self.target_temp = 0.0
+        self.output = 0.0
+        self.stage_elapsed = 0
+
+        self.stage_field = Field(0, 0, "{}", 16)
+        self.target_field = NumberField(40, 12, 8, 1, " C")
+        self.zone_rows = []
+        widgets = [self.stage_field, Label(0, 12, "Tgt"), self.target_field]
+        for k, zone in enumerate(zones.zones[:ZONE_ROWS]):
+            y = 22 + k * 10
+            temp_field = NumberField(40, y, 7, 1, "C")
+            out_field = NumberField(96, y, 4, 0, "%")
+            self.zone_rows.append((zone, temp_field, out_field))
+            widgets += [Label(0, y, zone.name[:4]), temp_field, out_field]
+        self.screen = Screen(widgets)
+        self.build_titles()
+
+        # Graph view of the coldest zone; turning the encoder switches to the zone list
+        self.show_graph = graph
+        self.graph = Graph(0, GRAPH_Y, GRAPH_W, GRAPH_H)
+        self.graph_screen, self.graph_temp_field, self.graph_target_field = graph_screen(self.graph)
+        self.graph_t0 = 0
+
+    def build_titles(self):
+        names = self.stage_names
+        self.wait_titles = [name + ": Waiting" for name in names]
+        self.pause_titles = [name + ": Below Bound" for name in names]
+        self.stage_titles = [name + " Stage" for name in names]
+
+    def apply_tuning(self, values):
+        self.MAX_RAMP_RATE = values.get("max_ramp_rate", self.MAX_RAMP_RATE)
+        self.zones.apply_tuning(values)
+
+    def run_header(self):
+        t = utime.localtime()
+        return run_header((
+            ("run", self.run_number),
+            ("started", "{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(*t[:6])),
+            ("firmware", FIRMWARE_VERSION),
+            ("board", "".join("{:02x}".format(b) for b in unique_id())),
+            ("profile_name", self.profile_name),
+            ("profile", json.dumps([list(stage) for stage in self.profile])),
+            ("stages", json.dumps(list(self.stage_names))),
+            ("zones", json.dumps([z.name for z in self.zones.zones])),
+        ))
+
+    def enter(self):
+        if self.store is not None:
+            self.profile_name = self.store.selected
+            self.build_titles()
+        self.compiled = compile_profile(self.profile, self.stage_names, self.MAX_RAMP_RATE,
+                                        None, self.TABLE_STEP_MS)
+        plot_envelope(self.graph, self.compiled)
+        self.graph_t0 = utime.ticks_ms()
+        self.running = False
+        self.stage_start_time = None
+        if self.run_dir is None:
+            self.logger.start(CSV_HEADER)
+        else:
+            path, self.run_number = new_run_path(self.run_dir, ext=self.logger.EXT)
+            self.logger.start(self.run_header(), path)
+
+    def input(self):
+        if self.encoder.get_position() != 0:
+            self.encoder.position = 0
+            self.show_graph = not self.show_graph
         if self.encoder.was_pressed():
-            self.ssr.off()
+            self.post(CMD_EXIT)
+
+    def command(self, cmd, value=0):
+        if cmd == CMD_EXIT:
+            self.abort()
+            self.switch("MENU")
+
+    def abort(self):
+        self.zones.off()
+        self.output = 0.0
+        self.running = False
+        self.stage_start_time = None
+        self.logger.flush()
+
+    def publish(self, state):
+        super().publish(state)
+        if self.coldest is not None:
+            state[S_TEMP] = self.coldest
+        state[S_TARGET] = self.target_temp
+        state[S_OUTPUT] = self.output
+        state[S_STAGE] = self.reflow_stage + 1
+
+    def control(self):
+        now = utime.ticks_ms()
+        zones = self.zones
+        if not self.running:
+            self.running = True
+            self.reflow_stage = 0
+            zones.off()
+            zones.reset()
+            self.last_control = now
+        dt_ms = utime.ticks_diff(now, self.last_control)
+        dt_s = dt_ms / 1000
+        self.last_control = now
+
+        zone = zones.coldest()
+        if zone is None:
+            # No zone has a good reading
+            zones.off()
+            self.output = 0.0
+            self.view = VIEW_FAULT
+            return
+        est = zone.sampler.estimator
+        coldest = est.temp
+        self.coldest = coldest
+        rate = est.rate
+
+        cp = self.compiled
+        stage = self.reflow_stage
+        lower = cp.lowers[stage]
+        control = cp.controls[stage]
+
+        if self.stage_start_time is None:
+            if cp.waits[stage] and coldest < lower:
+                self.output = zones.step(control, lower + self.BOUND_MARGIN, dt_s)
+                self.view = VIEW_WAITING
+                self.target_temp = lower
+                self.logger.log(stage + 1, coldest, lower, self.output, rate)
+                return
+            self.stage_start_time = now
+
+        if cp.pauses[stage] and coldest < lower:
+            # Timer held: the start moves forward by the time spent below the bound
+            self.stage_start_time = utime.ticks_add(self.stage_start_time, dt_ms)
+            self.output = zones.step(control, lower + self.BOUND_MARGIN, dt_s)
+            self.view = VIEW_PAUSED
+            self.target_temp = lower
+            self.logger.log(stage + 1, coldest, lower, self.output, rate)
+            return
+
+        elapsed_ms = utime.ticks_diff(now, self.stage_start_time)
+        target = cp.target(stage, elapsed_ms)
+        slope = cp.slope(stage, elapsed_ms)
+        self.output = zones.step(control, target, dt_s, slope)
+        self.logger.log(stage + 1, coldest, target, self.output, rate)
+
+        if elapsed_ms >= cp.durations[stage]:
+            self.reflow_stage += 1
             self.stage_start_time = None
-            return "MENU"
-
-        return None
-
-    def log_data(self, t_elapsed, stage, temp, target, output):
-        # Defensive: ensure all values are numbers
-        try:
-            if temp is None or not isinstance(temp, (int, float)):
-                temp = 0.0
-            if target is None or not isinstance(target, (int, float)):
-                target = 0.0
-            if output is None or not isinstance(output, (int, float)):
-                output = 0.0
-            if self.temp_ramp_rate is None or not isinstance(self.temp_ramp_rate, (int, float)):
-                ramp = 0.0
+            if self.reflow_stage >= cp.count:
+                self.abort()
+                self.switch("MENU")
+            return
+        self.view = VIEW_ACTIVE
+        self.target_temp = target
+        self.stage_elapsed = elapsed_ms // 1000
+
+    def render(self):
+        stage = self.reflow_stage
+        if stage >= len(self.profile):
+            return
+        fault = self.view == VIEW_FAULT
+        self.graph.add(utime.ticks_diff(utime.ticks_ms(), self.graph_t0),
+                       NO_DATA if fault or self.coldest is None else to_q(self.coldest))
+        if self.show_graph and not fault:
+            self.display.use(self.graph_screen)
+            self.graph_temp_field.set(self.coldest)
+            self.graph_target_field.set(self.target_temp)
+        else:
+            self.display.use(self.screen)
+            if fault:
+                self.stage_field.set("Sensor fault")
+            elif self.view == VIEW_ACTIVE:
+                self.stage_field.set(self.stage_titles[stage])
+            elif self.view == VIEW_WAITING:
+                self.stage_field.set(self.wait_titles[stage])
             else:
-                ramp = self.temp_ramp_rate
-            with open("log.csv", "a") as f:
-                f.write("{},{:.1f},{:.1f},{:.1f},{:.1f},{:.1f}\n".format(
-                    t_elapsed, stage, temp, target, output, ramp))
-        except Exception as e:
-            pass
+                self.stage_field.set(self.pause_titles[stage])
+            self.target_field.set(self.target_temp)
+            for zone, temp_field, out_field in self.zone_rows:
+                temp_field.set(zone.temp)
+                out_field.set(zone.output)
+        self.display.render()
 
 class ProfileEditMode(BaseMode):
-    def __init__(self, display, encoder, thermo, ssr, profile, stage_names):
+    def __init__(self, display, encoder, thermo, ssr, profile, stage_names, store=None):
         super().__init__(display, encoder, thermo, ssr)
         self.profile = profile
         self.stage_names = stage_names
+        self.store = store          # profiles.ProfileStore: edits are saved on leaving
         self.profile_edit_stage = -1  # Start in stage selection
         self.profile_edit_param = 0
         self.selected_index = 0
+        self.built_for = None       # Stage names the templates were built for
 
-    def update(self):
+        # Parameter editing template
+        param_labels = ["Duration:", "Low Temp:", "High Temp:"]
+        self.title_field = Field(0, 0, "{}", 16)
+        self.param_cursor = Cursor(0, [16 + i * 12 for i in range(3)])
+        self.param_fields = [NumberField(8 + (len(label) + 1) * 8, 16 + i * 12, 3)
+                             for i, label in enumerate(param_labels)]
+        self.edit_screen = Screen(
+            [self.title_field, self.param_cursor] +
+            [Label(8, 16 + i * 12, label) for i, label in enumerate(param_labels)] +
+            self.param_fields
+        )
+        self.build_screens()
+
+    def build_screens(self):
+        """Stage selection template for the current profile (another one may have been loaded)"""
+        names = self.stage_names
+        rows = [i * 12 for i in range(len(names) + 1)]
+        self.select_cursor = Cursor(0, rows)
+        self.select_screen = Screen(
+            [self.select_cursor] +
+            [Label(8, i * 12, name) for i, name in enumerate(names)] +
+            [Label(8, len(names) * 12, "Back to Menu")]
+        )
+        self.edit_titles = ["Edit " + name for name in names]
+        self.built_for = list(names)
+
+    def enter(self):
+        self.profile_edit_stage = -1
+        self.selected_index = 0
+        if self.built_for != self.stage_names:
+            self.build_screens()
+
+    def control(self):
         # Get encoder delta to change current param value
-        delta = self.encoder.get_position()
+        if self.profile_edit_stage == -1:
+            delta = self.encoder.get_position()
+        else:
+            delta = self.encoder.get_accelerated()  # Fast spins move in steps of 5 or 10
         if delta != 0:
             if self.profile_edit_stage == -1:  # Stage selection mode
                 # Just update the display selection
@@ -356,7 +1070,10 @@ class ProfileEditMode(BaseMode):
         if self.encoder.was_pressed():
             if self.profile_edit_stage == -1:  # Stage selection mode
                 if self.selected_index == len(self.profile):  # Menu exit option
-                    return "MENU"
+                    if self.store is not None:
+                        # Written only if something was changed
+                        self.store.save(self.store.selected, self.profile, self.stage_names)
+                    self.switch("MENU")
                 else:
                     self.profile_edit_stage = self.selected_index
                     self.profile_edit_param = 0  # Start with duration
@@ -366,25 +1083,349 @@ class ProfileEditMode(BaseMode):
                     self.profile_edit_stage = -1  # Go back to stage selection
                     self.selected_index = 0  # Reset selection
 
-        # Update display
-        if self.update_display():
-            self.display.oled.fill(0)
-            
-            if self.profile_edit_stage == -1:  # Stage selection mode
-                for i, name in enumerate(self.stage_names):
-                    prefix = ">" if i == self.selected_index else " "
-                    self.display.oled.text(f"{prefix}{name}", 0, i * 12)
-                # Add menu exit option
-                prefix = ">" if self.selected_index == len(self.profile) else " "
-                self.display.oled.text(f"{prefix}Back to Menu", 0, len(self.profile) * 12)
-            else:  # Parameter editing mode
-                stage = self.profile[self.profile_edit_stage]
-                param_labels = ["Duration", "Low Temp", "High Temp"]
-                self.display.oled.text(f"Edit {self.stage_names[self.profile_edit_stage]}", 0, 0)
-                for i in range(3):
-                    prefix = ">" if i == self.profile_edit_param else " "
-                    self.display.oled.text(f"{prefix}{param_labels[i]}: {stage[i]}", 0, 16 + i * 12)
-            
-            self.display.oled.show()
-
-        return None 
\ No newline at end of file
+    def render(self):
+        if self.profile_edit_stage == -1:  # Stage selection mode
+            self.display.use(self.select_screen)
+            self.select_cursor.set(self.selected_index)
+        else:  # Parameter editing mode
+            stage = self.profile[self.profile_edit_stage]
+            self.display.use(self.edit_screen)
+            self.title_field.set(self.edit_titles[self.profile_edit_stage])
+            self.param_cursor.set(self.profile_edit_param)
+            for i in range(3):
+                self.param_fields[i].set(stage[i])
+        self.display.render()
+
+PROFILE_ROWS = 5
+
+class ProfileSelectMode(BaseMode):
+    """Pick the active profile from the store's index; only the chosen one is read from flash"""
+    def __init__(self, display, encoder, thermo, ssr, store, profile, stage_names):
+        super().__init__(display, encoder, thermo, ssr)
+        self.store = store
+        self.profile = profile          # Lists shared with ReflowMode/ProfileEditMode, loaded in place
+        self.stage_names = stage_names
+        self.selected_index = 0
+        self.top = 0
+        self.note = None
+
+        self.title_field = Field(0, 0, "{}", 16)
+        self.row_fields = [Field(8, 12 + i * 10, "{}", 15) for i in range(PROFILE_ROWS)]
+        self.cursor = Cursor(0, [12 + i * 10 for i in range(PROFILE_ROWS)])
+        self.screen = Screen([self.title_field, self.cursor] + self.row_fields)
+        self.lines = []
+
+    def enter(self):
+        self.store.load_index()     # Picks up profile files copied onto the board
+        self.note = None
+        # Current profile marked with '*', peak temperature on the right
+        self.lines = ["{}{:10s}{:>3d}C".format("*" if e[0] == self.store.selected else " ", e[0][:10], e[3])
+                      for e in self.store.entries] + ["Back to Menu"]
+        names = self.store.names()
+        self.selected_index = names.index(self.store.selected) if self.store.selected in names else 0
+        self.top = 0
+
+    def control(self):
+        delta = self.encoder.get_position()
+        if delta != 0:
+            self.selected_index = max(0, min(len(self.lines) - 1, self.selected_index + delta))
+            self.encoder.position = 0
+        if not self.encoder.was_pressed():
+            return
+        if self.selected_index == len(self.lines) - 1:
+            self.switch("MENU")
+            return
+        name = self.store.entries[self.selected_index][0]
+        if self.store.load_into(name, self.profile, self.stage_names):
+            self.switch("MENU")
+        else:
+            self.note = "Load failed"
+
+    def render(self):
+        if self.selected_index < self.top:
+            self.top = self.selected_index
+        elif self.selected_index >= self.top + PROFILE_ROWS:
+            self.top = self.selected_index - PROFILE_ROWS + 1
+        self.display.use(self.screen)
+        self.title_field.set(self.note or "Profiles")
+        for i in range(PROFILE_ROWS):
+            k = self.top + i
+            self.row_fields[i].set(self.lines[k] if k < len(self.lines) else "")
+        self.cursor.set(self.selected_index - self.top)
+        self.display.render()
+
+# AutotuneMode states
+TUNE_RUNNING = 0
+TUNE_DONE = 1
+TUNE_FAILED = 2
+
+class AutotuneMode(BaseMode):
+    """Relay autotune: switch the heater around a setpoint and derive gains from the limit cycle"""
+    def __init__(self, display, encoder, thermo, ssr, setpoint=150, hysteresis=1.0, cycles=4,
+                 logger=None, tuning_path=config.TUNING_FILE, timeout_s=1800, ambient=25.0):
+        super().__init__(display, encoder, thermo, ssr)
+        self.setpoint = setpoint
+        self.hysteresis = hysteresis
+        self.cycles = cycles            # Measured cycles, after one settling cycle
+        self.logger = logger or RingLogger("autotune.csv")
+        self.tuning_path = tuning_path
+        self.timeout_ms = timeout_s * 1000
+        self.ambient = ambient
+        self.on_tuned = None            # Called with the new tuning dict
+
+        self.result = None
+        self.message = ""
+        self.enter()
+
+        self.temp_field = NumberField(48, 12, 8, 1, " C")
+        self.title_field = Field(0, 0, "{}", 16)
+        self.cycle_field = Field(56, 24, "{}", 8)
+        self.line1_field = Field(0, 36, "{}", 16)
+        self.line2_field = Field(0, 46, "{}", 16)
+        self.screen = Screen([
+            self.title_field,
+            Label(0, 12, "Temp:"), self.temp_field,
+            Label(0, 24, "Cycle:"), self.cycle_field,
+            self.line1_field, self.line2_field,
+        ])
+
+    def enter(self):
+        self.start_time = None
+        self.state = TUNE_RUNNING
+        self.relay_on = False
+        self.last_on_time = None
+        self.off_time = None
+        self.temp_off = 0.0
+        self.rate_off = 0.0
+        self.peak = None
+        self.trough = None
+        self.cycle = 0
+        self.current_temp = None
+        # Per measured cycle: period ms, half peak-to-peak C, on-time ms, coast s
+        self.periods = []
+        self.amplitudes = []
+        self.on_times = []
+        self.coasts = []
+
+    def control(self):
+        now = utime.ticks_ms()
+        if self.start_time is None:
+            self.start_time = now
+            self.ssr.off()
+            self.logger.start(CSV_HEADER)
+
+        if self.state != TUNE_RUNNING:
+            if self.encoder.was_pressed():
+                self.switch("MENU")
+            return
+
+        fault = self.thermo.state(now)
+        if fault != TC_OK:
+            self.fail(STATUS_NAMES[fault])
+            return
+        if utime.ticks_diff(now, self.start_time) > self.timeout_ms:
+            self.fail("Timeout")
+            return
+        if self.encoder.was_pressed():
+            self.ssr.off()
+            self.logger.flush()
+            self.switch("MENU")
+            return
+
+        est = self.thermo.estimator
+        temp = est.temp
+        self.current_temp = self.thermo.temp
+
+        if self.relay_on:
+            if self.trough is None or temp < self.trough:
+                self.trough = temp
+            if temp > self.setpoint + self.hysteresis:
+                self.relay_on = False
+                self.ssr.off()
+                self.off_time = now
+                self.temp_off = temp
+                self.rate_off = est.rate
+                self.peak = temp
+        else:
+            if self.peak is not None and temp > self.peak:
+                self.peak = temp
+            if temp < self.setpoint - self.hysteresis:
+                if self.last_on_time is not None and self.off_time is not None:
+                    self.cycle_done(now)
+                self.relay_on = True
+                self.ssr.on()
+                self.last_on_time = now
+                self.trough = temp
+
+        self.logger.log(self.cycle + 1, self.current_temp, self.setpoint,
+                        100 if self.relay_on else 0, est.rate)
+
+        if self.cycle > self.cycles:
+            self.finish()
+
+    def publish(self, state):
+        super().publish(state)
+        state[S_TARGET] = self.setpoint
+        state[S_OUTPUT] = 100 if self.relay_on and self.state == TUNE_RUNNING else 0
+        state[S_STAGE] = self.cycle + 1
+
+    def cycle_done(self, now):
+        """One full on/off cycle ended at now (the next on-switch)"""
+        self.cycle += 1
+        if self.cycle == 1:
+            return  # The first cycle starts from cold; don't measure it
+        self.periods.append(utime.ticks_diff(now, self.last_on_time))
+        self.amplitudes.append((self.peak - self.trough) / 2)
+        self.on_times.append(utime.ticks_diff(self.off_time, self.last_on_time))
+        self.coasts.append((self.peak - self.temp_off) / self.rate_off if self.rate_off > 0 else 0.0)
+
+    def finish(self):
+        self.ssr.off()
+        self.logger.flush()
+        n = len(self.periods)
+        pu = sum(self.periods) / n / 1000           # Ultimate period, s
+        a = sum(self.amplitudes) / n
+        h = self.hysteresis
+        a = math.sqrt(a * a - h * h) if a > h else a
+        ku = 4 * 50.0 / (math.pi * a)               # Relay swings 0..100 %, d = 50
+        duty = sum(self.on_times) / sum(self.periods)
+
+        # Ziegler-Nichols "no overshoot" rule
+        kp = 0.2 * ku
+        ti = pu / 2
+        td = pu / 3
+        values = config.load(self.tuning_path)
+        values.update({
+            "P": round(kp, 3),
+            "I": round(kp / ti, 4),
+            "D": round(kp * td, 3),
+            "cutoff_k": round(sum(self.coasts) / n, 2),
+            "Ku": round(ku, 3),
+            "Pu": round(pu, 2),
+            "source": "autotune",
+        })
+        if self.setpoint - self.ambient > 20:
+            values["hold_feedforward"] = round(duty * 100 / (self.setpoint - self.ambient), 4)
+        self.result = values
+        self.state = TUNE_DONE
+        self.message = "Saved" if config.save(values, self.tuning_path) else "Save failed"
+        if self.on_tuned is not None:
+            self.on_tuned(values)
+
+    def fail(self, reason):
+        self.ssr.off()
+        self.logger.flush()
+        self.state = TUNE_FAILED
+        self.message = reason
+
+    def render(self):
+        self.display.use(self.screen)
+        self.temp_field.set(self.current_temp)
+        if self.state == TUNE_RUNNING:
+            self.title_field.set("Autotune {}C".format(self.setpoint))
+            self.cycle_field.set("{}/{}".format(max(0, self.cycle - 1), self.cycles))
+            self.line1_field.set("Press to abort")
+            self.line2_field.set("")
+        elif self.state == TUNE_DONE:
+            r = self.result
+            self.title_field.set("Autotune " + self.message)
+            self.cycle_field.set("done")
+            self.line1_field.set("P{:.2f} I{:.3f}".format(r["P"], r["I"]))
+            self.line2_field.set("D{:.1f} k{:.1f}".format(r["D"], r["cutoff_k"]))
+        else:
+            self.title_field.set("Autotune failed")
+            self.cycle_field.set("")
+            self.line1_field.set(self.message)
+            self.line2_field.set("Press for menu")
+        self.display.render()
+
+# ───── Diagnostics ─────
+DIAG_ROWS = 5
+DIAG_ACTIONS = ["Dump to file", "Dump serial", "Reset", "Pause", "Back to Menu"]
+
+def _us(v):
+    """Duration in 5 characters or less: us, then ms, then s"""
+    if v < 10000:
+        return str(v)
+    if v < 10000000:
+        return "{}m".format(v // 1000)
+    return "{}s".format(v // 1000000)
+
+class DiagnosticsMode(BaseMode):
+    """Timing probes and control-loop overruns from instrument.py, with a dump to file or serial"""
+    def __init__(self, display, encoder, thermo, ssr, instruments=None, dump_path="timing.txt"):
+        super().__init__(display, encoder, thermo, ssr)
+        self.instruments = instruments     # None when INSTRUMENT is off in main.py
+        self.dump_path = dump_path
+        self.selected_index = 0
+        self.top = 0
+        self.note = None
+
+        self.title_field = Field(0, 0, "{}", 16)
+        self.row_fields = [Field(8, 12 + i * 10, "{}", 15) for i in range(DIAG_ROWS)]
+        self.cursor = Cursor(0, [12 + i * 10 for i in range(DIAG_ROWS)])
+        self.screen = Screen([self.title_field, self.cursor] + self.row_fields)
+
+    def enter(self):
+        self.selected_index = 0
+        self.top = 0
+        self.note = None
+
+    def lines(self):
+        """Probe rows (mean/max), overruns by cause, then the actions"""
+        inst = self.instruments
+        if inst is None:
+            return ["Instrument off", "Back to Menu"]
+        rows = ["{:5s}{:>4s}/{:>5s}".format(name[:5], _us(inst.mean_us(i)), _us(inst.maxs[i]))
+                for i, name in enumerate(inst.names)]
+        rows.append("Overruns {}".format(inst.overrun_total))
+        for k in range(len(inst.overruns)):
+            if inst.overruns[k]:
+                rows.append(" {:9s}{:>5d}".format(inst.cause_name(k)[:9], inst.overruns[k]))
+        actions = DIAG_ACTIONS[:]
+        if not inst.enabled:
+            actions[3] = "Resume"
+        return rows + actions
+
+    def control(self):
+        delta = self.encoder.get_position()
+        if delta == 0 and not self.encoder.was_pressed():
+            return
+        lines = self.lines()
+        if delta != 0:
+            self.selected_index = max(0, min(len(lines) - 1, self.selected_index + delta))
+            self.encoder.position = 0
+            return
+        action = self.selected_index - (len(lines) - len(DIAG_ACTIONS))
+        inst = self.instruments
+        if inst is None:
+            if self.selected_index == len(lines) - 1:
+                self.switch("MENU")
+        elif action == 0:
+            self.note = "Saved" if inst.dump_file(self.dump_path) else "Save failed"
+        elif action == 1:
+            # Plain text on the REPL port; not while TELEMETRY owns it
+            inst.dump()
+            self.note = "Dumped"
+        elif action == 2:
+            inst.reset()
+            self.note = "Reset"
+        elif action == 3:
+            inst.enabled = not inst.enabled
+            self.note = "Running" if inst.enabled else "Paused"
+        elif action == 4:
+            self.switch("MENU")
+
+    def render(self):
+        lines = self.lines()
+        if self.selected_index < self.top:
+            self.top = self.selected_index
+        elif self.selected_index >= self.top + DIAG_ROWS:
+            self.top = self.selected_index - DIAG_ROWS + 1
+        self.display.use(self.screen)
+        self.title_field.set(self.note or "Timing us av/max")
+        for i in range(DIAG_ROWS):
+            k = self.top + i
+            self.row_fields[i].set(lines[k] if k < len(lines) else "")
+        self.cursor.set(self.selected_index - self.top)
+        self.display.render()
@@ -0,0 +1,157 @@
+# profile_compiler.py - Turn a reflow profile into flat, precomputed arrays
+#
+# A profile is a list of stages [duration_s, lower_C, upper_C] with an
+# optional 4th element giving the stage type and 5th giving the controller
+# (controller.CTRL_*). Compiling resolves the type (from the stage name when
+# not given), folds the ramp-rate cap into each stage's slope, and optionally
+# samples the setpoint into a table, so the control loop only does integer
+# compares and an index lookup. The same setpoints are also compiled into
+# integer arrays for the fixed-point pipeline (target_q, slope_r).
+
+from array import array
+from controller import CTRL_OFF, CTRL_PID
+from fixedpoint import Q, to_q, to_rate
+
+SLOPE_SHIFT = 16    # slopes_f: quarter-degrees per ms, Q16
+
+# Stage types
+STAGE_LINEAR       = 0  # lower -> upper over the duration; waits for lower, pauses below it
+STAGE_HOLD         = 1  # Hold at upper; waits for lower, pauses below it
+STAGE_RAMP_LIMITED = 2  # Like linear but slope capped at max_ramp; starts at once, never pauses
+STAGE_COOLDOWN     = 3  # Heater off for the duration; target falls lower -> upper
+
+STAGE_TYPE_NAMES = ("Linear", "Hold", "RampLim", "Cooldown")
+
+# Type used when a stage doesn't specify one
+STAGE_TYPES_BY_NAME = {
+    "Preheat": STAGE_RAMP_LIMITED,
+    "Cooldown": STAGE_COOLDOWN,
+}
+
+# Controller used when a stage doesn't specify one (5th element)
+STAGE_DEFAULT_CONTROL = {
+    STAGE_LINEAR: CTRL_PID,
+    STAGE_HOLD: CTRL_PID,
+    STAGE_RAMP_LIMITED: CTRL_PID,
+    STAGE_COOLDOWN: CTRL_OFF,
+}
+
+DEFAULT_COMPENSATION = 0.8
+
+class CompiledProfile:
+    def __init__(self, n):
+        self.count = n
+        self.types = bytearray(n)
+        self.controls = bytearray(n)            # CTRL_* code per stage
+        self.waits = bytearray(n)               # 1: timer starts only once temp >= lower
+        self.pauses = bytearray(n)              # 1: timer pauses while temp < lower
+        self.durations = array('i', [0] * n)    # ms
+        self.lowers = array('f', [0.0] * n)
+        self.uppers = array('f', [0.0] * n)
+        self.slopes = array('f', [0.0] * n)     # C per ms, ramp cap already applied
+        self.ramp_ends = array('i', [0] * n)    # ms at which the target reaches upper
+        self.comp = array('f', [0.0] * n)       # Thermal compensation factor
+        self.tables = None                      # Per-stage sampled setpoints, if built
+        self.table_step_ms = 0
+
+        # Fixed point (fixedpoint.py units)
+        self.lowers_q = array('h', [0] * n)
+        self.uppers_q = array('h', [0] * n)
+        self.slopes_f = array('i', [0] * n)     # Quarter-degrees per ms, Q16
+        self.slopes_r = array('h', [0] * n)     # Centi-C/s
+        self.tables_q = None
+
+    def target(self, stage, elapsed_ms):
+        """Setpoint for a stage at elapsed_ms into it"""
+        if self.tables is not None:
+            table = self.tables[stage]
+            i = elapsed_ms // self.table_step_ms
+            if i >= len(table):
+                i = len(table) - 1
+            return table[i]
+        return self._target(stage, elapsed_ms)
+
+    def slope(self, stage, elapsed_ms):
+        """Setpoint slope in C/s at elapsed_ms (0 once the target has levelled off)"""
+        if elapsed_ms < self.ramp_ends[stage]:
+            return self.slopes[stage] * 1000
+        return 0.0
+
+    def target_q(self, stage, elapsed_ms):
+        """target() in quarter-degrees"""
+        if self.tables_q is not None:
+            table = self.tables_q[stage]
+            i = elapsed_ms // self.table_step_ms
+            if i >= len(table):
+                i = len(table) - 1
+            return table[i]
+        lower = self.lowers_q[stage]
+        upper = self.uppers_q[stage]
+        if self.types[stage] == STAGE_HOLD or elapsed_ms >= self.ramp_ends[stage]:
+            return upper
+        return lower + ((self.slopes_f[stage] * elapsed_ms) >> SLOPE_SHIFT)
+
+    def slope_r(self, stage, elapsed_ms):
+        """slope() in centi-C/s"""
+        if elapsed_ms < self.ramp_ends[stage]:
+            return self.slopes_r[stage]
+        return 0
+
+    def _target(self, stage, elapsed_ms):
+        lower = self.lowers[stage]
+        upper = self.uppers[stage]
+        if self.types[stage] == STAGE_HOLD:
+            return upper
+        t = lower + self.slopes[stage] * elapsed_ms
+        if upper >= lower:
+            return t if t < upper else upper
+        return t if t > upper else upper
+
+def compile_profile(profile, stage_names=None, max_ramp=2.5, compensation=None, table_step_ms=0):
+    """Compile profile stages. table_step_ms > 0 also builds sampled setpoint tables."""
+    n = len(profile)
+    cp = CompiledProfile(n)
+    for i, stage in enumerate(profile):
+        duration, lower, upper = stage[0], stage[1], stage[2]
+        name = stage_names[i] if stage_names and i < len(stage_names) else None
+        if len(stage) > 3:
+            kind = stage[3]
+        else:
+            kind = STAGE_TYPES_BY_NAME.get(name, STAGE_HOLD if lower == upper else STAGE_LINEAR)
+        control = stage[4] if len(stage) > 4 else STAGE_DEFAULT_CONTROL[kind]
+
+        duration_ms = int(duration * 1000)
+        slope = (upper - lower) / duration_ms if duration_ms > 0 else 0.0
+        if kind == STAGE_RAMP_LIMITED:
+            cap = max_ramp / 1000.0
+            if slope > cap:
+                slope = cap
+            elif slope < -cap:
+                slope = -cap
+
+        if kind == STAGE_HOLD:
+            slope = 0.0
+
+        cp.types[i] = kind
+        cp.controls[i] = control
+        cp.waits[i] = 1 if kind in (STAGE_LINEAR, STAGE_HOLD) else 0
+        cp.pauses[i] = cp.waits[i]
+        cp.durations[i] = duration_ms
+        cp.lowers[i] = lower
+        cp.uppers[i] = upper
+        cp.slopes[i] = slope
+        cp.ramp_ends[i] = int((upper - lower) / slope) if slope else 0
+        cp.comp[i] = compensation.get(name, DEFAULT_COMPENSATION) if compensation else DEFAULT_COMPENSATION
+        cp.lowers_q[i] = to_q(lower)
+        cp.uppers_q[i] = to_q(upper)
+        cp.slopes_f[i] = int(slope * Q * (1 << SLOPE_SHIFT))
+        cp.slopes_r[i] = to_rate(slope * 1000)
+
+    if table_step_ms > 0:
+        cp.tables = []
+        for i in range(n):
+            steps = cp.durations[i] // table_step_ms + 1
+            cp.tables.append(array('f', [cp._target(i, k * table_step_ms) for k in range(steps)]))
+        cp.tables_q = [array('h', [to_q(v) for v in table]) for table in cp.tables]
+        cp.table_step_ms = table_step_ms
+    return cp
@@ -0,0 +1,174 @@
+# profiles.py - Named reflow profiles kept on flash
+#
+# Each profile is one small JSON file in profiles/, and profiles/index.json
+# lists them with a one-line summary, so the menu can show the library
+# without opening every profile. Only the selected profile is read at boot or
+# when picked from the Profiles screen.
+#
+#   profiles/index.json   {"selected": "SAC305",
+#                          "profiles": [["SAC305", "p1.json", 4, 245], ...]}
+#                          (name, file, stage count, peak C)
+#   profiles/p1.json      {"name": "SAC305", "stages": [[90, 25, 150], ...],
+#                          "stage_names": ["Preheat", "Soak", "Reflow", "Cooldown"]}
+#
+# Writes go through config.save() (temp file, then rename) and only happen
+# when the content changed. A profile file copied into profiles/ by hand is
+# picked up by the next index load.
+
+import config
+import os
+
+PROFILE_DIR = "profiles"
+INDEX_NAME = "index.json"
+
+# Seeded into an empty library next to main.py's own profile
+PRESETS = (
+    ("SAC305", [[90, 25, 150], [90, 150, 200], [45, 235, 245], [30, 100, 100]]),
+    ("Sn63Pb37", [[90, 25, 140], [90, 140, 180], [45, 210, 225], [30, 100, 100]]),
+)
+PRESET_STAGE_NAMES = ["Preheat", "Soak", "Reflow", "Cooldown"]
+
+def _summary(name, path, stages):
+    return [name, path, len(stages), max(max(s[1], s[2]) for s in stages) if stages else 0]
+
+class ProfileStore:
+    def __init__(self, root=PROFILE_DIR):
+        self.root = root
+        self.index_path = root + "/" + INDEX_NAME
+        self.entries = []           # Index rows: [name, file, stages, peak]
+        self.selected = None
+        self.saved = None           # (stages, stage_names) as last read or written, for change checks
+
+    def _path(self, file):
+        return self.root + "/" + file
+
+    def _files(self):
+        try:
+            return [f for f in os.listdir(self.root) if f.endswith(".json") and f != INDEX_NAME]
+        except OSError:
+            return []
+
+    def _read(self, file):
+        values = config.load(self._path(file))
+        if "name" not in values or "stages" not in values:
+            return None
+        return values
+
+    # ───── Index ─────
+    def open(self, profile, stage_names, name="Default"):
+        """Load the index (seeding it from profile plus the presets when empty) and
+        the selected profile into profile/stage_names, in place. Returns its name."""
+        self.load_index()
+        if not self.entries:
+            try:
+                os.mkdir(self.root)
+            except OSError:
+                pass
+            self.add(name, profile, stage_names)
+            for preset, stages in PRESETS:
+                self.add(preset, stages, PRESET_STAGE_NAMES)
+            self.selected = name
+            self.write_index()
+        if not self.entries:
+            # Nothing could be written (flash full, a file in the directory's place):
+            # run on the in-memory profile, as config.load() falls back to defaults
+            self.selected = name
+            self.saved = ([list(s) for s in profile], list(stage_names))
+            return name
+        if not self.load_into(self.selected, profile, stage_names):
+            self.selected = self.entries[0][0]
+            self.load_into(self.selected, profile, stage_names)
+        return self.selected
+
+    def load_index(self):
+        index = config.load(self.index_path)
+        self.entries = [e for e in index.get("profiles", []) if isinstance(e, list) and len(e) == 4]
+        self.selected = index.get("selected")
+        # Files added or removed behind the index's back: re-read just those
+        files = self._files()
+        known = [e[1] for e in self.entries]
+        if sorted(known) != sorted(files):
+            self.entries = [e for e in self.entries if e[1] in files]
+            for f in files:
+                if f not in known:
+                    values = self._read(f)
+                    if values is not None and self.find(values["name"]) is None:
+                        self.entries.append(_summary(values["name"], f, values["stages"]))
+            self.write_index()
+        if self.find(self.selected) is None and self.entries:
+            self.selected = self.entries[0][0]
+
+    def write_index(self):
+        return config.save({"selected": self.selected, "profiles": self.entries}, self.index_path)
+
+    def names(self):
+        return [e[0] for e in self.entries]
+
+    def find(self, name):
+        for e in self.entries:
+            if e[0] == name:
+                return e
+        return None
+
+    # ───── Profiles ─────
+    def load(self, name):
+        """(stages, stage_names) of a profile, or None"""
+        e = self.find(name)
+        if e is None:
+            return None
+        values = self._read(e[1])
+        if values is None:
+            return None
+        stages = [list(s) for s in values["stages"]]
+        names = list(values.get("stage_names", PRESET_STAGE_NAMES[:len(stages)]))
+        return stages, names
+
+    def load_into(self, name, profile, stage_names):
+        """Load a profile into existing lists (the ones the modes hold) and select it"""
+        loaded = self.load(name)
+        if loaded is None:
+            return False
+        profile[:] = loaded[0]
+        stage_names[:] = loaded[1]
+        self.saved = ([list(s) for s in profile], list(stage_names))
+        if name != self.selected:
+            self.selected = name
+            self.write_index()
+        return True
+
+    def add(self, name, stages, stage_names):
+        """New profile file plus its index row (the index itself is written by the caller)"""
+        taken = [e[1] for e in self.entries] + self._files()
+        n = len(self.entries)
+        while "p{}.json".format(n) in taken:
+            n += 1
+        file = "p{}.json".format(n)
+        if not self._write(file, name, stages, stage_names):
+            return False
+        self.entries.append(_summary(name, file, stages))
+        return True
+
+    def save(self, name, stages, stage_names):
+        """Write a profile if it differs from what was last read or written. True if written."""
+        current = ([list(s) for s in stages], list(stage_names))
+        e = self.find(name)
+        if e is None:
+            if not self.add(name, stages, stage_names):
+                return False
+        else:
+            if current == self.saved and name == self.selected:
+                return False
+            if not self._write(e[1], name, stages, stage_names):
+                return False
+            summary = _summary(name, e[1], stages)
+            if summary == e:
+                self.saved = current
+                return True
+            e[:] = summary
+        self.saved = current
+        self.write_index()
+        return True
+
+    def _write(self, file, name, stages, stage_names):
+        return config.save({"name": name, "stages": [list(s) for s in stages],
+                            "stage_names": list(stage_names)}, self._path(file))
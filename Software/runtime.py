@@ -0,0 +1,221 @@
+# runtime.py - Cooperative task scheduler built on uasyncio
+#
+# Each task runs at its own period. When several tasks are due at once the
+# higher priority one goes first, and a task whose function returns a
+# generator (e.g. a display transfer) yields to the scheduler between steps,
+# so a slow OLED refresh cannot hold up the control task for a whole frame.
+# Mode changes arrive as events from BaseMode.switch().
+
+try:
+    import uasyncio as asyncio
+    sleep_ms = asyncio.sleep_ms
+except ImportError:
+    import asyncio
+
+    def sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+import sys
+import utime
+
+# ───── Shared state slots ─────
+# Layout of the float array modes fill in publish() (telemetry, dualcore.ControlLink)
+S_TEMP = 0
+S_RATE = 1
+S_TARGET = 2
+S_OUTPUT = 3
+S_STAGE = 4
+S_STEP_US = 5       # Duration of the last control step
+STATE_SIZE = 6
+
+class Task:
+    def __init__(self, name, period_ms, fn, priority=0):
+        self.name = name
+        self.period_ms = period_ms
+        self.fn = fn
+        self.priority = priority    # Higher runs first when several tasks are due
+        self.deadline = 0
+        self.running = False
+
+        # Statistics
+        self.runs = 0
+        self.overruns = 0           # Finished after the next deadline
+        self.max_ms = 0             # Longest single run
+        self.last_us = 0            # Duration of the latest run
+        self.max_late_ms = 0        # Worst start latency
+
+class ModeTable:
+    """Mode name -> mode object, each built by its factory the first time it is entered.
+    Boot only pays for the menu; watch() hooks set up the others as they appear."""
+    def __init__(self, factories):
+        self.factories = factories
+        self.built = {}
+        self.hooks = []
+
+    def __getitem__(self, name):
+        mode = self.built.get(name)
+        if mode is None:
+            mode = self.factories[name]()
+            self.built[name] = mode
+            for hook in self.hooks:
+                hook(name, mode)
+        return mode
+
+    def __contains__(self, name):
+        return name in self.factories
+
+    def watch(self, hook):
+        """Call hook(name, mode) for every mode built so far and every one built later"""
+        self.hooks.append(hook)
+        for name, mode in list(self.built.items()):
+            hook(name, mode)
+
+    def items(self):
+        return self.built.items()
+
+    def values(self):
+        """Modes built so far"""
+        return self.built.values()
+
+class Runtime:
+    def __init__(self, modes, initial, display=None):
+        if not isinstance(modes, ModeTable):
+            modes = ModeTable({name: (lambda m=mode: m) for name, mode in modes.items()})
+        self.modes = modes
+        self.display = display
+        self.tasks = []
+        self.pending_mode = None
+        self.mode_event = asyncio.Event()
+        modes.watch(self.adopt)
+        self.mode_name = None
+        self.mode = None
+        self.control_task = None
+        self.boot_ms = None         # ticks_ms (= ms since reset) at the first rendered screen
+        self.console = True         # Boot line on stdout; main.py clears it when telemetry frames own it
+        self.set_mode(initial)
+        if display is not None:
+            display.defer_show = True
+
+    def add_task(self, name, period_ms, fn, priority=0):
+        task = Task(name, period_ms, fn, priority)
+        self.tasks.append(task)
+        if fn == self.control:
+            self.control_task = task
+        return task
+
+    # ───── Modes ─────
+    def adopt(self, name, mode):
+        """Hook a newly built mode up to the runtime"""
+        mode.on_switch = self.request_mode
+
+    def request_mode(self, name):
+        self.pending_mode = name
+        self.mode_event.set()
+
+    def set_mode(self, name):
+        self.mode_name = name
+        self.mode = self.modes[name]
+        self.mode.next_mode = None
+        self.mode.enter()
+
+    def control(self):
+        """Task body: run the current mode's input and control step"""
+        if self.pending_mode is None:
+            self.mode.input()
+        if self.pending_mode is None:
+            self.mode.control()
+
+    def render(self):
+        """Task body: redraw the current mode, then hand back the page transfers"""
+        if self.pending_mode is not None:
+            return None
+        self.mode.render()
+        if self.boot_ms is None:
+            self.boot_ms = utime.ticks_ms()
+            if self.console:
+                print("boot: {} ms to {}".format(self.boot_ms, self.mode_name))
+        if self.display is not None:
+            return self.display.oled.show_steps()
+        return None
+
+    # ───── Scheduling ─────
+    def _higher_due(self, task, now):
+        for t in self.tasks:
+            if t.priority > task.priority and not t.running and utime.ticks_diff(now, t.deadline) >= 0:
+                return True
+        return False
+
+    async def _periodic(self, task):
+        task.deadline = utime.ticks_ms()
+        while True:
+            wait = utime.ticks_diff(task.deadline, utime.ticks_ms())
+            if wait > 0:
+                await sleep_ms(wait)
+            while self._higher_due(task, utime.ticks_ms()):
+                await sleep_ms(0)
+
+            start = utime.ticks_ms()
+            start_us = utime.ticks_us()
+            task.running = True
+            steps = task.fn()
+            if steps is not None:
+                for _ in steps:
+                    await sleep_ms(0)
+            task.running = False
+            end = utime.ticks_ms()
+            task.last_us = utime.ticks_diff(utime.ticks_us(), start_us)
+
+            task.runs += 1
+            late = utime.ticks_diff(start, task.deadline)
+            if late > task.max_late_ms:
+                task.max_late_ms = late
+            took = utime.ticks_diff(end, start)
+            if took > task.max_ms:
+                task.max_ms = took
+
+            task.deadline = utime.ticks_add(task.deadline, task.period_ms)
+            if utime.ticks_diff(end, task.deadline) > 0:
+                # Missed the next deadline: count it and skip ahead rather than bursting
+                task.overruns += 1
+                task.deadline = end
+
+    async def _mode_switcher(self):
+        while True:
+            await self.mode_event.wait()
+            self.mode_event.clear()
+            name = self.pending_mode
+            self.set_mode(name)
+            self.pending_mode = None
+
+    async def main(self):
+        coros = [self._mode_switcher()] + [self._periodic(t) for t in self.tasks]
+        await asyncio.gather(*coros)
+
+    def run(self):
+        asyncio.run(self.main())
+
+    def publish(self, state):
+        """Latest control values into a state array (see S_* above)"""
+        self.mode.publish(state)
+        if self.control_task is not None:
+            state[S_STEP_US] = self.control_task.last_us
+
+    # ───── Reporting ─────
+    def stats(self):
+        return {t.name: (t.runs, t.overruns, t.max_ms, t.max_late_ms) for t in self.tasks}
+
+    def report(self, out=None):
+        """Boot time and per-task timing, to stdout unless out is given"""
+        out = out or sys.stdout
+        out.write("boot: {} ms\n".format(self.boot_ms))
+        for t in self.tasks:
+            out.write("{}: runs={} overruns={} max={}ms late={}ms\n".format(
+                t.name, t.runs, t.overruns, t.max_ms, t.max_late_ms))
+
+    def report_file(self, path="report.txt"):
+        try:
+            with open(path, "w") as f:
+                self.report(f)
+            return True
+        except:
+            return False
@@ -0,0 +1,121 @@
+# sampler.py - Background thermocouple sampling
+#
+# The runtime's sampling task calls poll(), which reads the chip no faster
+# than its conversion time (reading a MAX6675 early restarts the conversion
+# and returns the previous value). Everyone else reads the cached result:
+# temperature, timestamp, age and status, without touching SPI. Each good
+# sample also updates the shared state estimator (filtered temp + ramp rate).
+
+from array import array
+from thermocouple import TC_OK, TC_NO_DATA, TC_STALE
+from estimator import ThermalEstimator
+import utime
+
+class Sampler:
+    def __init__(self, thermo, history=64, period_ms=None, stale_ms=1000, estimator=None):
+        self.thermo = thermo
+        self.estimator = estimator or ThermalEstimator()
+        self.period_ms = period_ms or thermo.CONVERSION_MS
+        self.stale_ms = stale_ms
+
+        # Latest reading
+        self.temp = None
+        self.temp_q = None          # Same reading in quarter-degrees (fixedpoint.py)
+        self.timestamp = None
+        self.status = TC_NO_DATA
+        self.seq = 0                # Increments on every good reading
+        self.last_read = None
+
+        # Ring of the last N good readings
+        self.size = history
+        self.temps = array('f', [0.0] * history)
+        self.times = array('i', [0] * history)
+        self.head = 0
+        self.count = 0
+
+        # Counters
+        self.reads = 0
+        self.faults = 0
+
+    def poll(self, now=None):
+        """Read the chip if a new conversion is ready. Returns True on a new good sample."""
+        if now is None:
+            now = utime.ticks_ms()
+        if self.last_read is not None and utime.ticks_diff(now, self.last_read) < self.period_ms:
+            return False
+        return self.sample(now)
+
+    def wait_first(self, timeout_ms=1000):
+        """Block until the first good reading (boot splash). False if none came in time."""
+        t0 = utime.ticks_ms()
+        while utime.ticks_diff(utime.ticks_ms(), t0) < timeout_ms:
+            # ticks_ms counts from reset: nothing is converted before the chip's first period
+            if utime.ticks_ms() >= self.period_ms and self.poll():
+                return True
+            utime.sleep_ms(5)
+        return False
+
+    def sample(self, now=None):
+        if now is None:
+            now = utime.ticks_ms()
+        self.last_read = now
+        self.reads += 1
+        status = self.thermo.read()
+        self.status = status
+        if status != TC_OK:
+            self.faults += 1
+            return False
+
+        raw = self.thermo.raw
+        temp = raw * 0.25
+        self.temp = temp
+        self.temp_q = raw
+        self.timestamp = now
+        self.seq += 1
+        i = self.head
+        self.temps[i] = temp
+        self.times[i] = now
+        self.head = (i + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+        self.estimator.update_q(raw, now)
+        return True
+
+    # ───── Cached access (no SPI) ─────
+    def read_temp(self):
+        """Latest good temperature, or None while the sensor is faulted"""
+        if self.state() != TC_OK:
+            return None
+        return self.temp
+
+    def state(self, now=None):
+        """TC_OK, the chip's fault code, or TC_STALE if readings stopped arriving"""
+        if self.status != TC_OK:
+            return self.status
+        if self.timestamp is None:
+            return TC_NO_DATA
+        if self.age_ms(now) > self.stale_ms:
+            return TC_STALE
+        return TC_OK
+
+    def age_ms(self, now=None):
+        if self.timestamp is None:
+            return -1
+        if now is None:
+            now = utime.ticks_ms()
+        return utime.ticks_diff(now, self.timestamp)
+
+    def history(self, n):
+        """Temperature of the nth most recent good reading (0 = latest)"""
+        if n >= self.count:
+            return None
+        return self.temps[(self.head - 1 - n) % self.size]
+
+    def mean(self, n):
+        n = min(n, self.count)
+        if n == 0:
+            return None
+        total = 0.0
+        for k in range(n):
+            total += self.temps[(self.head - 1 - k) % self.size]
+        return total / n
@@ -0,0 +1,281 @@
+# screen.py - Retained-mode screen templates for the OLED
+#
+# A Screen is a fixed layout of widgets. Static labels are drawn once when the
+# screen is attached; fields only redraw (and only reformat their text) when
+# their value changes. Combined with the driver's dirty-page tracking, a frame
+# where nothing changed costs no framebuffer work and no I2C traffic.
+# NumberField draws numbers from a preallocated digit buffer, so updating it
+# allocates no strings. Graph is a strip chart that draws one pixel column per
+# update, so each new point dirties a column or two of its pages whatever the
+# run length.
+
+from array import array
+
+CHAR_W = 8
+CHAR_H = 8
+_UNSET = object()
+GLYPHS = ("0", "1", "2", "3", "4", "5", "6", "7", "8", "9", ".", "-")  # Prebuilt: indexing allocates nothing
+G_POINT = 10
+G_MINUS = 11
+
+class Label:
+    """Static text, drawn once when the screen is attached"""
+    def __init__(self, x, y, text):
+        self.x = x
+        self.y = y
+        self.text = text
+
+    def draw(self, oled):
+        oled.text(self.text, self.x, self.y)
+
+class Field:
+    """Formatted value that is redrawn only when it changes"""
+    def __init__(self, x, y, fmt, width, scale=0):
+        self.x = x
+        self.y = y
+        self.fmt = fmt
+        self.width = width      # Characters cleared on redraw
+        self.scale = scale      # Floats are compared after scaling to an int (10 -> 0.1 resolution)
+        self.value = None
+        self.key = _UNSET
+        self.dirty = True
+
+    def set(self, value):
+        """Set the value; None shows as a blank placeholder"""
+        if self.scale and value is not None:
+            if isinstance(value, int):
+                key = value * self.scale
+            else:
+                key = int(value * self.scale + (0.5 if value >= 0 else -0.5))
+        else:
+            key = value
+        if key != self.key:
+            self.key = key
+            self.value = value
+            self.dirty = True
+
+    def invalidate(self):
+        self.dirty = True
+
+    def draw(self, oled):
+        oled.fill_rect(self.x, self.y, self.width * CHAR_W, CHAR_H, 0)
+        if self.value is not None:
+            oled.text(self.fmt.format(self.value), self.x, self.y)
+        elif self.key is None:
+            oled.text("--", self.x, self.y)
+        self.dirty = False
+
+class NumberField(Field):
+    """Fixed-point number plus a constant suffix, formatted without allocating"""
+    def __init__(self, x, y, width, decimals=0, suffix=""):
+        super().__init__(x, y, None, width, scale=10 ** decimals)
+        self.decimals = decimals
+        self.suffix = suffix
+        self.buf = bytearray(width)     # Glyph indexes, most significant first
+
+    def format(self, key):
+        """Glyphs of the scaled value into buf; returns their count"""
+        buf = self.buf
+        d = self.decimals
+        v = -key if key < 0 else key
+        n = 0
+        while n < len(buf):
+            buf[n] = v % 10
+            v //= 10
+            n += 1
+            if n == d:
+                buf[n] = G_POINT
+                n += 1
+            if v == 0 and n > d + (1 if d else 0):
+                break
+        if key < 0 and n < len(buf):
+            buf[n] = G_MINUS
+            n += 1
+        i = 0
+        j = n - 1
+        while i < j:
+            buf[i], buf[j] = buf[j], buf[i]
+            i += 1
+            j -= 1
+        return n
+
+    def draw(self, oled):
+        oled.fill_rect(self.x, self.y, self.width * CHAR_W, CHAR_H, 0)
+        key = self.key
+        if key is None:
+            oled.text("--", self.x, self.y)
+        elif key is not _UNSET:
+            n = self.format(key)
+            x = self.x
+            buf = self.buf
+            for i in range(n):
+                oled.text(GLYPHS[buf[i]], x, self.y)
+                x += CHAR_W
+            if self.suffix:
+                oled.text(self.suffix, x, self.y)
+        self.dirty = False
+
+class Cursor:
+    """Selection marker drawn beside one of several rows"""
+    def __init__(self, x, rows, marker=">"):
+        self.x = x
+        self.rows = rows        # y coordinate of each selectable row
+        self.marker = marker
+        self.index = 0
+        self.drawn = None
+        self.dirty = True
+
+    def set(self, index):
+        if index != self.index:
+            self.index = index
+            self.dirty = True
+
+    def invalidate(self):
+        self.drawn = None
+        self.dirty = True
+
+    def draw(self, oled):
+        if self.drawn is not None:
+            oled.fill_rect(self.x, self.rows[self.drawn], CHAR_W, CHAR_H, 0)
+        oled.text(self.marker, self.x, self.rows[self.index])
+        self.drawn = self.index
+        self.dirty = False
+
+NO_DATA = -32768
+
+class Graph:
+    """Temperature strip chart, quarter-degrees (fixedpoint.py) against elapsed time.
+
+    Each column keeps the span of readings that fell into it plus an envelope
+    value (the profile target, or the manual setpoint) drawn dotted. Columns
+    are written in place as time advances instead of scrolling the
+    framebuffer, which would dirty every page of the plot on every point.
+    Past the right edge it wraps, sweep style, with a blank column ahead of
+    the newest one."""
+    def __init__(self, x, y, width, height, ms_per_col=2000, lo=20, hi=300):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.ms_per_col = ms_per_col
+        self.lo_q = lo * 4
+        self.hi_q = hi * 4
+        self.mins = array('h', [NO_DATA] * width)
+        self.maxs = array('h', [NO_DATA] * width)
+        self.env = array('h', [NO_DATA] * width)
+        self.col = -1               # Newest column, counted from the start (not wrapped)
+        self.drawn = -1             # Newest column already in the framebuffer
+        self.last_q = NO_DATA       # Latest reading, carried into the next column so the trace joins up
+        self.full = True            # Redraw every column on the next draw()
+        self.dirty = True
+
+    def reset(self, ms_per_col=None):
+        """Empty chart, e.g. at the start of a run"""
+        if ms_per_col:
+            self.ms_per_col = ms_per_col
+        for a in (self.mins, self.maxs, self.env):
+            for i in range(self.width):
+                a[i] = NO_DATA
+        self.col = -1
+        self.drawn = -1
+        self.last_q = NO_DATA
+        self.invalidate()
+
+    def scale(self, lo, hi):
+        """Temperature range, C; a change redraws the chart"""
+        if lo * 4 != self.lo_q or hi * 4 != self.hi_q:
+            self.lo_q = lo * 4
+            self.hi_q = hi * 4
+            self.invalidate()
+
+    def envelope(self, i, q):
+        """Preset the envelope of column i (e.g. the profile target before a run)"""
+        if 0 <= i < self.width:
+            self.env[i] = q
+
+    def add(self, elapsed_ms, q, env_q=NO_DATA):
+        """Reading q (quarter-degrees, or NO_DATA) at elapsed_ms; env_q overrides the envelope"""
+        col = elapsed_ms // self.ms_per_col
+        while self.col < col:
+            # New column: starts at the previous reading
+            self.col += 1
+            i = self.col % self.width
+            self.mins[i] = self.last_q
+            self.maxs[i] = self.last_q
+            if self.col >= self.width:
+                self.env[i] = NO_DATA
+        i = col % self.width
+        if q != NO_DATA:
+            if self.mins[i] == NO_DATA or q < self.mins[i]:
+                self.mins[i] = q
+            if self.maxs[i] == NO_DATA or q > self.maxs[i]:
+                self.maxs[i] = q
+            self.last_q = q
+        if env_q != NO_DATA:
+            self.env[i] = env_q
+        self.dirty = True
+
+    def invalidate(self):
+        self.full = True
+        self.dirty = True
+
+    def _row(self, q):
+        h = self.height - 1
+        r = (q - self.lo_q) * h // (self.hi_q - self.lo_q)
+        if r < 0:
+            r = 0
+        elif r > h:
+            r = h
+        return self.y + h - r
+
+    def _column(self, oled, i):
+        x = self.x + i
+        oled.vline(x, self.y, self.height, 0)
+        e = self.env[i]
+        if e != NO_DATA and not i & 1:
+            oled.pixel(x, self._row(e), 1)
+        lo = self.mins[i]
+        if lo != NO_DATA:
+            top = self._row(self.maxs[i])
+            oled.vline(x, top, self._row(lo) - top + 1, 1)
+
+    def draw(self, oled):
+        width = self.width
+        if self.full or self.col - self.drawn >= width:
+            first, last = 0, width - 1
+            self.full = False
+        elif self.col < 0:
+            first, last = 0, -1
+        else:
+            # From the last column drawn, which may have gained readings since
+            first, last = max(self.drawn, 0), self.col
+        for c in range(first, last + 1):
+            self._column(oled, c % width)
+        if self.col >= width:
+            # Sweep gap ahead of the newest column
+            oled.vline(self.x + (self.col + 1) % width, self.y, self.height, 0)
+        self.drawn = self.col
+        self.dirty = False
+
+class Screen:
+    def __init__(self, widgets):
+        self.labels = [w for w in widgets if isinstance(w, Label)]
+        self.widgets = [w for w in widgets if not isinstance(w, Label)]
+
+    def attach(self, oled):
+        """Clear the panel, draw static labels and mark every field dirty"""
+        oled.fill(0)
+        for label in self.labels:
+            label.draw(oled)
+        for w in self.widgets:
+            w.invalidate()
+
+    def draw(self, oled):
+        """Redraw dirty widgets into the framebuffer"""
+        for w in self.widgets:
+            if w.dirty:
+                w.draw(oled)
+
+    def render(self, oled):
+        self.draw(oled)
+        oled.show()
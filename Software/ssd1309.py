@@ -1,5 +1,6 @@
 # ssd1309.py
 from micropython import const
+import micropython
 import framebuf
 import time
 
@@ -39,13 +40,37 @@ class SSD1309(framebuf.FrameBuffer):
         self.pages = self.height // 8
         self.buffer = bytearray(self.width * self.pages)
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
+
+        # Shadow of what the panel currently shows; only differences are sent
+        self.shadow = bytearray(len(self.buffer))
+        self.shadow_valid = False
+        self._buf_mv = memoryview(self.buffer)
+        self._shadow_mv = memoryview(self.shadow)
+        self._window = bytearray((0x00, COLUMN_ADDR, 0, 0, PAGE_ADDR, 0, 0))
+
+        # I2C statistics: totals and the most recent frame
+        self.bytes_sent = 0
+        self.transactions = 0
+        self.frames = 0
+        self.frame_bytes = 0
+        self.frame_transactions = 0
         self.init_display()
 
     def write_cmd(self, cmd):
         self.i2c.writeto(self.addr, b'\x00' + bytearray([cmd]))
+        self.bytes_sent += 2
+        self.transactions += 1
+
+    def invalidate(self):
+        """Force the next show() to resend the whole frame"""
+        self.shadow_valid = False
 
     def init_display(self):
-        for cmd in (
+        # One I2C transaction for the whole sequence. The panel stays off until
+        # the first show() has filled its RAM, so power-up garbage never appears
+        # and no blank frame is sent just to clear it.
+        seq = bytearray((
+            0x00,   # Control byte: a stream of commands follows
             DISPLAY_OFF,
             SET_DISPLAY_CLOCK_DIV, 0x80,
             SET_MULTIPLEX, self.height - 1,
@@ -61,15 +86,76 @@ class SSD1309(framebuf.FrameBuffer):
             SET_VCOM_DETECT, 0x40,
             DISPLAY_ALL_ON_RESUME,
             NORMAL_DISPLAY,
-            DISPLAY_ON,
-        ):
-            self.write_cmd(cmd)
+        ))
+        self.i2c.writeto(self.addr, seq)
+        self.bytes_sent += len(seq)
+        self.transactions += 1
+        self.powered = False
+        self.shadow_valid = False
         self.fill(0)
-        self.show()
 
-    def show(self):
-        for page in range(0, self.pages):
-            self.write_cmd(0xB0 + page)
-            self.write_cmd(SET_LOW_COLUMN | 0x0)
-            self.write_cmd(SET_HIGH_COLUMN | 0x0)
-            self.i2c.writeto(self.addr, b'\x40' + self.buffer[self.width * page:self.width * (page + 1)])
+    @micropython.native
+    def _dirty_span(self, start, end):
+        # Returns (first, last) differing byte offsets in [start, end), or (-1, -1)
+        buf = self.buffer
+        shadow = self.shadow
+        lo = start
+        while lo < end and buf[lo] == shadow[lo]:
+            lo += 1
+        if lo == end:
+            return -1, -1
+        hi = end - 1
+        while buf[hi] == shadow[hi]:
+            hi -= 1
+        return lo, hi
+
+    def _send_window(self, col0, col1, page0, page1, start, end):
+        # One command transaction sets the window (horizontal addressing mode),
+        # one data transaction fills it
+        w = self._window
+        w[2] = col0
+        w[3] = col1
+        w[5] = page0
+        w[6] = page1
+        self.i2c.writeto(self.addr, w)
+        self.i2c.writevto(self.addr, (b'\x40', self._buf_mv[start:end]))
+        self._shadow_mv[start:end] = self._buf_mv[start:end]
+        self.frame_bytes += len(w) + 1 + end - start
+        self.frame_transactions += 2
+
+    def show(self, full=False):
+        """Send changed column ranges of changed pages to the panel"""
+        for _ in self.show_steps(full):
+            pass
+
+    def show_steps(self, full=False):
+        """Generator form of show(): yields after each window so a scheduler can run between transfers"""
+        self.frame_bytes = 0
+        self.frame_transactions = 0
+        width = self.width
+        if full or not self.shadow_valid:
+            self._send_window(0, width - 1, 0, self.pages - 1, 0, len(self.buffer))
+            self.shadow_valid = True
+            if not self.powered:
+                self.write_cmd(DISPLAY_ON)
+                self.powered = True
+        else:
+            for page in range(self.pages):
+                base = page * width
+                lo, hi = self._dirty_span(base, base + width)
+                if lo < 0:
+                    continue
+                self._send_window(lo - base, hi - base, page, page, lo, hi + 1)
+                yield
+        self.bytes_sent += self.frame_bytes
+        self.transactions += self.frame_transactions
+        self.frames += 1
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes_sent,
+            "transactions": self.transactions,
+            "frame_bytes": self.frame_bytes,
+            "frame_transactions": self.frame_transactions,
+        }
@@ -1,14 +1,165 @@
 # ssr.py
-from machine import Pin
+#
+# on()/off() drive the relay directly. set_duty() switches to time-proportional
+# output: each window turns on at its start and off after duty% of the window.
+# Both edges are scheduled by a one-shot machine.Timer, so the delivered
+# on-time no longer depends on how often the control loop gets to run.
+# set_duty_pm() takes the duty in per mille, all in integer math, for the
+# fixed-point pipeline (fixedpoint.py).
+#
+# With phase_ms set, windows start on a fixed grid (ticks_ms = phase_ms mod
+# window_ms) instead of whenever the duty driver was started. Several SSRs with
+# phases spread over the window never switch on together (see zones.py).
+
+from machine import Pin, Timer
+import utime
 
 class SSR:
-    def __init__(self, pin=16):
+    def __init__(self, pin=16, window_ms=1000, min_on_ms=50, mains_hz=0, phase_ms=None):
         self.control = Pin(pin, Pin.OUT)
+        self.window_ms = window_ms
+        self.min_on_ms = min_on_ms
+        self.phase_ms = phase_ms    # Window grid offset; None: windows start when the driver starts
+        # Zero-cross SSRs only switch at zero crossings; quantize edges to half-cycles
+        self.half_cycle_us = 500000 // mains_hz if mains_hz else 0
+
+        self.timer = Timer()
+        self.active = False         # Duty-cycle driver running
+        self.locked = False         # lockout(): output stays off for good
+        self.duty = 0
+        self.duty_pm = 0
+        self.next_on_ms = 0         # On-time latched at the next window start
+        self.window_on_ms = 0       # On-time commanded for the current window
+
+        # Delivered on-time measurement
+        self.on_at = None
+        self.window_at = 0
+        self.last_commanded_ms = 0
+        self.last_achieved_ms = 0
+        self.windows = 0
+
+        # Bound once so the timer callbacks don't allocate
+        self._start_cb = self._window_start
+        self._off_cb = self._window_off
         self.off()
 
     def on(self):
-        self.control.value(1)
+        if self.active:
+            self.stop()
+        if not self.locked:
+            self.control.value(1)
 
     def off(self):
+        if self.active:
+            self.stop()
+        self.control.value(0)
+
+    def stop(self):
+        """Stop the duty-cycle driver and leave the output off"""
+        self.active = False
+        self.timer.deinit()
+        self.control.value(0)
+        self.on_at = None
+
+    def lockout(self):
+        """Force the output off and ignore further commands (e.g. the control core stalled)"""
+        self.locked = True
+        self.stop()
+
+    def on_time_ms(self, duty, window_ms):
+        """Commanded on-time for a duty (0-100 %), after minimum and half-cycle limits"""
+        return self.on_time_ms_pm(duty * 10, window_ms)
+
+    def on_time_ms_pm(self, duty_pm, window_ms):
+        """on_time_ms() for a duty in per mille"""
+        on_ms = duty_pm * window_ms // 1000
+        if self.half_cycle_us:
+            hc = self.half_cycle_us
+            # Rounded back to ms: 6 half-cycles at 60 Hz are 50 ms, not 49
+            on_ms = (((on_ms * 1000 + hc // 2) // hc) * hc + 500) // 1000
+        if on_ms < self.min_on_ms:
+            return 0
+        if window_ms - on_ms < self.min_on_ms:
+            return window_ms
+        return on_ms
+
+    def set_duty(self, duty, window_ms=None):
+        """Command a duty cycle (%); takes effect at the next window boundary"""
+        # Scaled before rounding: 37.9 % is 379 per mille, not 370
+        self.set_duty_pm(int(max(0, min(100, duty)) * 10 + 0.5), window_ms)
+
+    def set_duty_pm(self, duty_pm, window_ms=None):
+        """Command a duty cycle in per mille (0-1000)"""
+        if window_ms is not None:
+            self.window_ms = window_ms
+        if self.locked:
+            return
+        duty_pm = 0 if duty_pm < 0 else 1000 if duty_pm > 1000 else duty_pm
+        self.duty_pm = duty_pm
+        self.duty = duty_pm // 10
+        self.next_on_ms = self.on_time_ms_pm(duty_pm, self.window_ms)
+        if not self.active:
+            self.active = True
+            self.windows = 0
+            wait = self._to_grid(utime.ticks_ms())
+            if wait:
+                self.control.value(0)
+                self.timer.init(mode=Timer.ONE_SHOT, period=wait, callback=self._start_cb)
+            else:
+                self._window_start(None)
+
+    def _to_grid(self, now):
+        """ms until the next window start on the phase grid (0: none, or due now)"""
+        if self.phase_ms is None:
+            return 0
+        return -(now - self.phase_ms) % self.window_ms
+
+    def _window_start(self, t):
+        if not self.active:
+            return
+        now = utime.ticks_ms()
+        self._close_window(now)
+        self.window_at = now
+        on_ms = self.next_on_ms
+        self.window_on_ms = on_ms
+        # A late callback shortens this window rather than shifting the grid
+        period = self._to_grid(now)
+        if period <= self.window_ms // 4:
+            period += self.window_ms
+        if on_ms <= 0:
+            self.control.value(0)
+            self.on_at = None
+            self.timer.init(mode=Timer.ONE_SHOT, period=period, callback=self._start_cb)
+        elif on_ms >= self.window_ms:
+            self.control.value(1)
+            self.on_at = now
+            self.timer.init(mode=Timer.ONE_SHOT, period=period, callback=self._start_cb)
+        else:
+            self.control.value(1)
+            self.on_at = now
+            self.timer.init(mode=Timer.ONE_SHOT, period=on_ms, callback=self._off_cb)
+
+    def _window_off(self, t):
+        if not self.active:
+            return
         self.control.value(0)
+        now = utime.ticks_ms()
+        self.last_achieved_ms = utime.ticks_diff(now, self.on_at)
+        self.on_at = None
+        remaining = self.window_ms - utime.ticks_diff(now, self.window_at)
+        self.timer.init(mode=Timer.ONE_SHOT, period=max(1, remaining), callback=self._start_cb)
+
+    def _close_window(self, now):
+        # Book-keeping for the window that just ended
+        if self.windows:
+            if self.on_at is not None:
+                # Output was still on at the boundary (100 % window)
+                self.last_achieved_ms = utime.ticks_diff(now, self.on_at)
+            elif self.window_on_ms == 0:
+                self.last_achieved_ms = 0
+            self.last_commanded_ms = self.window_on_ms
+        self.windows += 1
 
+    def achieved(self):
+        """(commanded_ms, achieved_ms) for the last completed window"""
+        return self.last_commanded_ms, self.last_achieved_ms
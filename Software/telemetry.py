@@ -0,0 +1,286 @@
+# telemetry.py - Live binary telemetry over the USB serial port
+#
+# Telemetry.poll() is called from a low-priority runtime task. Every
+# period_ms it packs the runtime's published state (temp, target, output,
+# ramp, stage, control step time) into a frame in a preallocated queue, then
+# writes queued frames only while the port reports room for them. A slow or
+# absent host never holds up the control loop: once the queue is full new
+# samples are dropped (and counted). The same task reads command frames from
+# the host and hands them to on_command(cmd, payload); the result goes back
+# as an ACK frame.
+#
+# Frame: 0xA5 0x5A, type, seq, payload length, payload, CRC-8 (poly 0x07)
+# over type..payload. host/monitor.py is the receiving end.
+
+from array import array
+from modes import CMD_SET, CMD_EXIT
+from runtime import S_TEMP, S_RATE, S_TARGET, S_OUTPUT, S_STAGE, S_STEP_US, STATE_SIZE
+import struct
+import sys
+import utime
+try:
+    import uselect as select
+except ImportError:
+    import select
+
+SYNC0 = 0xA5
+SYNC1 = 0x5A
+MAX_PAYLOAD = 64
+
+# Board -> host
+FR_SAMPLE = 0x01    # "<IhhhhBBH": t ms, temp, target, output (x10), ramp (x100), stage, flags, step us
+FR_ACK = 0x02       # "<BBB": command type, command seq, 1 = done / 0 = refused
+
+# Host -> board
+TM_SETPOINT = 0x10  # "<h": manual setpoint, C x10
+TM_START = 0x11     # Start a reflow from the menu
+TM_ABORT = 0x12     # Stop the running manual/reflow mode
+TM_PROFILE = 0x13   # "<HHH" per stage: duration s, lower C, upper C
+TM_RATE = 0x14      # "<H": sample period, ms
+
+SAMPLE_FMT = "<IhhhhBBH"
+SAMPLE_SIZE = 16
+FLAG_NO_READING = 0x01
+
+FRAME_SLOT = 24     # Queue slot: 5 header bytes + payload + CRC
+
+def _crc_table():
+    table = bytearray(256)
+    for i in range(256):
+        c = i
+        for _ in range(8):
+            c = ((c << 1) ^ 0x07) & 0xFF if c & 0x80 else (c << 1) & 0xFF
+        table[i] = c
+    return table
+
+CRC_TABLE = _crc_table()
+
+def crc8(data, start=0, end=None):
+    table = CRC_TABLE
+    c = 0
+    for i in range(start, len(data) if end is None else end):
+        c = table[c ^ data[i]]
+    return c
+
+def _scaled(v, scale):
+    if v != v:
+        return -32768
+    v = int(v * scale)
+    return 32767 if v > 32767 else -32767 if v < -32767 else v
+
+class Telemetry:
+    def __init__(self, source, out=None, inp=None, period_ms=100, queue=32, on_command=None):
+        self.source = source            # source(state) fills an array('f') of STATE_SIZE
+        self.out = out or sys.stdout.buffer
+        self.inp = inp or sys.stdin.buffer
+        self.period_ms = period_ms
+        self.on_command = on_command
+
+        self.state = array('f', [0.0] * STATE_SIZE)
+        self.poll_out = select.poll()
+        self.poll_out.register(self.out, select.POLLOUT)
+        self.poll_in = select.poll()
+        self.poll_in.register(self.inp, select.POLLIN)
+
+        # Outgoing frames: a ring of fixed-size slots
+        self.size = queue
+        self.slots = bytearray(queue * FRAME_SLOT)
+        self.mv = memoryview(self.slots)
+        self.lengths = bytearray(queue)
+        self.head = 0
+        self.count = 0
+        self.sent = 0               # Bytes of the head frame already written
+        self.seq = 0
+
+        # Incoming command frame
+        self.rx = bytearray(5 + MAX_PAYLOAD + 1)
+        self.rx_len = 0
+
+        self.t0 = utime.ticks_ms()
+        self.next_sample = self.t0
+
+        # Counters
+        self.samples = 0
+        self.dropped = 0
+        self.frames_sent = 0
+        self.commands = 0
+        self.rx_errors = 0
+
+    # ───── Outgoing ─────
+    def _slot(self, ftype, length):
+        """Offset of a fresh queue slot with its header written, or -1 when the queue is full"""
+        if self.count == self.size:
+            self.dropped += 1
+            return -1
+        i = (self.head + self.count) % self.size
+        o = i * FRAME_SLOT
+        s = self.slots
+        s[o] = SYNC0
+        s[o + 1] = SYNC1
+        s[o + 2] = ftype
+        s[o + 3] = self.seq
+        s[o + 4] = length
+        self.seq = (self.seq + 1) & 0xFF
+        self.lengths[i] = 6 + length
+        return o
+
+    def _commit(self, o, length):
+        self.slots[o + 5 + length] = crc8(self.slots, o + 2, o + 5 + length)
+        self.count += 1
+
+    def sample(self, now):
+        """Queue one sample frame of the source's current state"""
+        self.samples += 1
+        o = self._slot(FR_SAMPLE, SAMPLE_SIZE)
+        if o < 0:
+            return
+        st = self.state
+        self.source(st)
+        temp = st[S_TEMP]
+        struct.pack_into(SAMPLE_FMT, self.slots, o + 5, utime.ticks_diff(now, self.t0) & 0xFFFFFFFF,
+                         _scaled(temp, 10), _scaled(st[S_TARGET], 10), _scaled(st[S_OUTPUT], 10),
+                         _scaled(st[S_RATE], 100), int(st[S_STAGE]),
+                         FLAG_NO_READING if temp != temp else 0, min(65535, int(st[S_STEP_US])))
+        self._commit(o, SAMPLE_SIZE)
+
+    def ack(self, cmd, seq, ok):
+        o = self._slot(FR_ACK, 3)
+        if o < 0:
+            return
+        s = self.slots
+        s[o + 5] = cmd
+        s[o + 6] = seq
+        s[o + 7] = 1 if ok else 0
+        self._commit(o, 3)
+
+    def send(self):
+        """Write queued frames while the port has room; never waits for the host"""
+        while self.count and self.poll_out.poll(0):
+            o = self.head * FRAME_SLOT
+            n = self.lengths[self.head]
+            try:
+                written = self.out.write(self.mv[o + self.sent:o + n])
+            except OSError:
+                written = 0
+            if not written:
+                return
+            self.sent += written
+            if self.sent < n:
+                return
+            self.sent = 0
+            self.head = (self.head + 1) % self.size
+            self.count -= 1
+            self.frames_sent += 1
+
+    # ───── Incoming ─────
+    def receive(self):
+        """Read available bytes and dispatch complete command frames"""
+        rx = self.rx
+        while self.poll_in.poll(0):
+            try:
+                data = self.inp.read(1)
+            except OSError:
+                data = None
+            if not data:
+                return
+            b = data[0]
+            n = self.rx_len
+            if n == 0 and b != SYNC0:
+                continue
+            if n == 1 and b != SYNC1:
+                self.rx_len = 1 if b == SYNC0 else 0
+                continue
+            if n == 4 and b > MAX_PAYLOAD:
+                self.rx_errors += 1
+                self.rx_len = 0
+                continue
+            rx[n] = b
+            n += 1
+            self.rx_len = n
+            if n >= 5 and n == 6 + rx[4]:
+                self.rx_len = 0
+                if crc8(rx, 2, n - 1) != rx[n - 1]:
+                    self.rx_errors += 1
+                    continue
+                self.command(rx[2], rx[3], memoryview(rx)[5:n - 1])
+
+    def command(self, cmd, seq, payload):
+        self.commands += 1
+        if cmd == TM_RATE:
+            ok = len(payload) == 2
+            if ok:
+                self.period_ms = max(10, struct.unpack_from("<H", payload)[0])
+        else:
+            ok = self.on_command is not None and self.on_command(cmd, payload)
+        self.ack(cmd, seq, ok)
+
+    # ───── Task body ─────
+    def poll(self, now=None):
+        if now is None:
+            now = utime.ticks_ms()
+        if utime.ticks_diff(now, self.next_sample) >= 0:
+            self.next_sample = utime.ticks_add(self.next_sample, self.period_ms)
+            if utime.ticks_diff(now, self.next_sample) > 0:
+                self.next_sample = utime.ticks_add(now, self.period_ms)  # Fell behind: don't burst
+            self.sample(now)
+        self.receive()
+        self.send()
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "sent": self.frames_sent,
+            "dropped": self.dropped,
+            "queued": self.count,
+            "commands": self.commands,
+            "rx_errors": self.rx_errors,
+        }
+
+class RemoteControl:
+    """on_command handler mapping telemetry commands onto the runtime's modes"""
+    def __init__(self, runtime, profile, menu="MENU", manual="MANUAL", reflow="REFLOW"):
+        self.runtime = runtime
+        self.profile = profile
+        self.menu = menu
+        self.manual = manual
+        self.reflow = reflow
+
+    def __call__(self, cmd, payload):
+        rt = self.runtime
+        name = rt.mode_name
+        busy = rt.pending_mode is not None     # A mode change is under way
+        if cmd == TM_SETPOINT and len(payload) == 2:
+            setpoint = max(0, min(300, struct.unpack_from("<h", payload)[0] // 10))
+            manual = rt.modes[self.manual]
+            if name == self.manual and not busy:
+                manual.post(CMD_SET, setpoint)
+            else:
+                manual.setpoint = setpoint
+            return True
+        if cmd == TM_START:
+            if busy or name != self.menu:
+                return False
+            rt.request_mode(self.reflow)
+            return True
+        if cmd == TM_ABORT:
+            if busy or name not in (self.manual, self.reflow):
+                return False
+            rt.mode.post(CMD_EXIT)
+            return True
+        if cmd == TM_PROFILE:
+            return name != self.reflow and self.load_profile(payload)
+        return False
+
+    def load_profile(self, payload):
+        """Replace the stage durations/temperatures in place (same stage count, ProfileEditMode's limits)"""
+        if len(payload) != 6 * len(self.profile):
+            return False
+        stages = []
+        for i in range(len(self.profile)):
+            duration, lower, upper = struct.unpack_from("<HHH", payload, 6 * i)
+            if not (10 <= duration <= 300 and 0 <= lower <= upper <= 300):
+                return False
+            stages.append((duration, lower, upper))
+        for stage, values in zip(self.profile, stages):
+            stage[0], stage[1], stage[2] = values
+        return True
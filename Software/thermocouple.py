@@ -1,20 +1,93 @@
 # thermocouple.py
+#
+# Both converters share one interface:
+#   read()      -> status code, with the temperature left in .raw (0.25 C counts)
+#   read_temp() -> temperature in C, or None on any fault (older callers)
+#   CONVERSION_MS  how long the chip needs between reads for a fresh value
+#
+# Pass spi= to share one bus between several chips, each on its own CS pin
+# (see shared_spi() and zones.py); the clock/data pins are then unused.
+
 from machine import SPI, Pin
 import time
 
+# Read status codes
+TC_OK        = 0
+TC_OPEN      = 1    # Open thermocouple
+TC_SHORT_GND = 2
+TC_SHORT_VCC = 3
+TC_NO_DATA   = 4    # Chip missing or SPI returned garbage
+TC_STALE     = 5    # No fresh reading for too long (set by the sampler)
+
+# Short names, sized for an 8-character status field
+STATUS_NAMES = ("OK", "TC OPEN", "TC GND", "TC VCC", "NO DATA", "STALE")
+
+def shared_spi(sck=6, miso=4, bus=0):
+    """One SPI bus for several converters; both chips are read-only at up to 5 MHz, mode 0"""
+    return SPI(bus, baudrate=5000000, polarity=0, phase=0, sck=Pin(sck), miso=Pin(miso))
+
 class MAX6675:
-    def __init__(self, clk=2, cs=3, do=4):
+    CONVERSION_MS = 220
+
+    def __init__(self, clk=2, cs=3, do=4, spi=None):
         self.cs = Pin(cs, Pin.OUT)
         self.cs.value(1)
-        self.spi = SPI(0, baudrate=5000000, polarity=0, phase=0, sck=Pin(clk), mosi=Pin(0), miso=Pin(do))
+        self.spi = spi or SPI(0, baudrate=5000000, polarity=0, phase=0, sck=Pin(clk), mosi=Pin(0), miso=Pin(do))
+        self.buf = bytearray(2)
+        self.raw = 0
 
-    def read_temp(self):
+    def read(self):
         self.cs.value(0)
-        data = self.spi.read(2)
+        self.spi.readinto(self.buf)
         self.cs.value(1)
 
-        value = (data[0] << 8) | data[1]
+        value = (self.buf[0] << 8) | self.buf[1]
+        if value & 0x8000:  # Dummy bit D15 always reads 0; set means no chip on the bus
+            return TC_NO_DATA
         if value & 0x4:  # Open thermocouple error
+            return TC_OPEN
+        self.raw = value >> 3
+        return TC_OK
+
+    def read_temp(self):
+        if self.read() != TC_OK:
             return None
-        return (value >> 3) * 0.25  # Convert to Celsius
+        return self.raw * 0.25  # Convert to Celsius
+
+class MAX31855:
+    CONVERSION_MS = 100
 
+    def __init__(self, sck=6, cs=5, miso=4, spi=None):
+        self.cs = Pin(cs, Pin.OUT)
+        self.cs.value(1)
+        self.spi = spi or SPI(0, baudrate=5000000, polarity=0, phase=0, sck=Pin(sck), miso=Pin(miso))
+        self.buf = bytearray(4)
+        self.raw = 0
+
+    def read(self):
+        self.cs.value(0)
+        self.spi.readinto(self.buf)
+        self.cs.value(1)
+
+        b = self.buf
+        if b[0] == 0xFF and b[1] == 0xFF and b[2] == 0xFF and b[3] == 0xFF:
+            return TC_NO_DATA
+        if b[1] & 0x01:  # Fault bit (D16); details in D2..D0
+            if b[3] & 0x01:
+                return TC_OPEN
+            if b[3] & 0x02:
+                return TC_SHORT_GND
+            if b[3] & 0x04:
+                return TC_SHORT_VCC
+            return TC_NO_DATA
+        # D31..D18: signed 14-bit thermocouple temperature in 0.25 C steps
+        value = (b[0] << 6) | (b[1] >> 2)
+        if value & 0x2000:
+            value -= 0x4000
+        self.raw = value
+        return TC_OK
+
+    def read_temp(self):
+        if self.read() != TC_OK:
+            return None
+        return self.raw * 0.25
@@ -0,0 +1,2 @@
+# version.py - Firmware version, recorded in every run log header
+FIRMWARE_VERSION = "1.1.0"
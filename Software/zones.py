@@ -0,0 +1,151 @@
+# zones.py - Several heater/thermocouple pairs run from one control loop
+#
+# A Zone is one SSR plus one thermocouple, with its own sampler (so its own
+# estimator), controller and duty cycle. A ZoneSet polls and steps all of them
+# from the runtime's existing tasks, so the loop cost grows linearly with the
+# zone count and nothing else changes in the scheduler.
+#
+# The thermocouples share one SPI bus (thermocouple.shared_spi()), each on its
+# own CS pin; reads are sequential, so they never collide. SSR windows are
+# staggered: zone k's windows start k/N of a window after zone 0's (ssr.py
+# phase_ms). The heaters never switch on at the same moment, and at duties up
+# to 1/N no two of them are on at once, which keeps the peak mains current down.
+#
+# ZoneSet has the Sampler poll() and SSR off()/lockout() calls, so it can take
+# a single sampler's or SSR's place in the runtime and watchdog (main.py ZONES).
+
+from controller import PID, Controller, CTRL_OFF, CTRL_BANG
+from thermocouple import TC_OK
+
+class Zone:
+    def __init__(self, name, sampler, ssr, gains=(6.0, 0.3, 15.0), feedforward=40.0, hold_feedforward=0.28,
+                 integral_band=5.0, offset=0.0):
+        self.name = name
+        self.sampler = sampler
+        self.ssr = ssr
+        self.gains = gains
+        self.feedforward = feedforward
+        self.hold_feedforward = hold_feedforward
+        self.integral_band = integral_band
+        self.offset = offset            # C added to the shared target (e.g. an edge zone that runs cool)
+        self.controller = None
+        self.build_controller()
+
+        # Latest control-loop state
+        self.fault = TC_OK
+        self.temp = None                # Measured, for display and logging
+        self.target = 0.0
+        self.output = 0.0
+
+    def build_controller(self):
+        p, i, d = self.gains
+        self.controller = Controller(PID(p, i, d, kff=self.feedforward, k_hold=self.hold_feedforward,
+                                         i_band=self.integral_band))
+
+    def reset(self):
+        self.controller.pid.reset()
+        self.controller.select(CTRL_OFF)
+        self.controller.output = 0.0
+        self.output = 0.0
+
+    def step(self, control, target, dt_s, slope=0.0, window_ms=1000):
+        """One control step towards target with a CTRL_* controller; returns the output %"""
+        self.fault = self.sampler.state()
+        if self.fault != TC_OK:
+            # No trustworthy reading: this heater stays off, the others carry on
+            self.ssr.off()
+            self.output = 0.0
+            self.temp = None
+            return 0.0
+        est = self.sampler.estimator
+        self.temp = self.sampler.temp
+        target += self.offset
+        self.target = target
+        if control != self.controller.mode:
+            self.controller.select(control, target, est.temp)
+        output = self.controller.update(target, est.temp, dt_s, slope, est.rate)
+        if control == CTRL_BANG:
+            if output > 0:
+                self.ssr.on()
+            else:
+                self.ssr.off()
+        else:
+            # 0 too: the window grid keeps running (see ReflowMode.drive)
+            self.ssr.set_duty(output, window_ms)
+        self.output = output
+        return output
+
+class ZoneSet:
+    def __init__(self, zones, window_ms=1000):
+        self.zones = zones
+        self.window_ms = window_ms
+        n = len(zones)
+        for k, zone in enumerate(zones):
+            zone.ssr.window_ms = window_ms
+            zone.ssr.phase_ms = k * window_ms // n
+        self.period_ms = min(z.sampler.period_ms for z in zones)
+
+    def __len__(self):
+        return len(self.zones)
+
+    # ───── Sampler / SSR stand-in ─────
+    def poll(self, now=None):
+        """Sample task body: read each zone's chip whose conversion is due. True if any was new."""
+        fresh = False
+        for zone in self.zones:
+            if zone.sampler.poll(now):
+                fresh = True
+        return fresh
+
+    def off(self):
+        for zone in self.zones:
+            zone.ssr.off()
+            zone.output = 0.0
+
+    def lockout(self):
+        for zone in self.zones:
+            zone.ssr.lockout()
+
+    @property
+    def ssrs(self):
+        return [zone.ssr for zone in self.zones]
+
+    # ───── Control ─────
+    def state(self):
+        """TC_OK if every zone has a good reading, else the first fault"""
+        for zone in self.zones:
+            s = zone.sampler.state()
+            if s != TC_OK:
+                return s
+        return TC_OK
+
+    def coldest(self):
+        """Zone with the lowest filtered temperature among those with a good reading (None if none)"""
+        low = None
+        for zone in self.zones:
+            t = zone.sampler.estimator.temp
+            if zone.sampler.state() == TC_OK and t is not None and (low is None or t < low.sampler.estimator.temp):
+                low = zone
+        return low
+
+    def step(self, control, target, dt_s, slope=0.0):
+        """Step every zone towards the same target; returns the mean output %"""
+        total = 0.0
+        for zone in self.zones:
+            total += zone.step(control, target, dt_s, slope, self.window_ms)
+        return total / len(self.zones)
+
+    def reset(self):
+        for zone in self.zones:
+            zone.reset()
+
+    def apply_tuning(self, values):
+        for zone in self.zones:
+            p, i, d = zone.gains
+            zone.gains = (values.get("P", p), values.get("I", i), values.get("D", d))
+            zone.feedforward = values.get("feedforward", zone.feedforward)
+            zone.hold_feedforward = values.get("hold_feedforward", zone.hold_feedforward)
+            zone.build_controller()
+
+    def stats(self):
+        return {zone.name: (zone.sampler.reads, zone.sampler.faults, zone.ssr.duty) for zone in self.zones}